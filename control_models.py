@@ -0,0 +1,169 @@
+import io
+import re
+import json
+import zipfile
+from dataclasses import dataclass
+
+import numpy as np
+
+"""
+NumPy-only inference for the control models trained in
+notebooks/train_regression_and_classifier.ipynb. `export_models` reads
+the saved .keras archives (config.json + model.weights.h5, via h5py)
+and the fitted StandardScaler once, offline, and writes every weight,
+activation and scaler parameter into a single .npz. Serving loads that
+file with `ControlModels.load` and runs the dense layers as plain
+matrix products over a whole batch of sites or scenarios, so neither
+TensorFlow nor scikit-learn is imported on the serving path.
+
+`DenseNet.predict` and `ScalerParams.transform` take and return the
+same shapes as their Keras/sklearn counterparts, so the models can be
+handed straight to `twin.forecast_n_hours_ahead`.
+"""
+
+MODELS_DIR = "notebooks/models"
+MODEL_FILES = {
+    "heat": "classifier_heat_model.keras",
+    "vent": "classifier_vent_model.keras",
+    "regression": "regression_model.keras",
+}
+EXPORT_FILE = "control_models.npz"
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "sigmoid": lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),    # overflow-free logistic
+    "tanh": np.tanh,
+}
+
+@dataclass
+class DenseNet:
+    weights: list[np.ndarray]        # (inputs, units) per layer
+    biases: list[np.ndarray]         # (units,) per layer
+    activations: list[str]
+
+    def predict(self, X, verbose=0) -> np.ndarray:
+        """Forward pass over a batch: (batch, inputs) -> (batch, outputs)."""
+        a = np.asarray(X, dtype=float)
+        for W, b, name in zip(self.weights, self.biases, self.activations):
+            a = ACTIVATIONS[name](a @ W + b)
+        return a
+
+@dataclass
+class ScalerParams:
+    mean: np.ndarray
+    scale: np.ndarray
+    features: tuple[str, ...]
+
+    def transform(self, X) -> np.ndarray:
+        """StandardScaler.transform; DataFrames are reordered to `features` first."""
+        if hasattr(X, "columns"):
+            X = X[list(self.features)].to_numpy(dtype=float)
+        return (np.asarray(X, dtype=float) - self.mean) / self.scale
+
+@dataclass
+class ControlModels:
+    heat: DenseNet
+    vent: DenseNet
+    scaler: ScalerParams
+    regression: DenseNet | None = None
+
+    @property
+    def features(self) -> list[str]:
+        return list(self.scaler.features)
+
+    @classmethod
+    def load(cls, path: str = f"{MODELS_DIR}/{EXPORT_FILE}") -> "ControlModels":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = dict(data)
+        nets = {}
+        for name in MODEL_FILES:
+            if f"{name}/activations" not in arrays:
+                continue
+            activations = [str(a) for a in arrays[f"{name}/activations"]]
+            nets[name] = DenseNet(weights=[arrays[f"{name}/W{i}"] for i in range(len(activations))],
+                                  biases=[arrays[f"{name}/b{i}"] for i in range(len(activations))],
+                                  activations=activations)
+        scaler = ScalerParams(arrays["scaler/mean"], arrays["scaler/scale"],
+                              tuple(str(f) for f in arrays["scaler/features"]))
+        return cls(heat=nets["heat"], vent=nets["vent"], scaler=scaler, regression=nets.get("regression"))
+
+    def save(self, path: str) -> None:
+        arrays = {"scaler/mean": self.scaler.mean, "scaler/scale": self.scaler.scale,
+                  "scaler/features": np.array(self.scaler.features)}
+        for name in MODEL_FILES:
+            net = getattr(self, name)
+            if net is None:
+                continue
+            arrays[f"{name}/activations"] = np.array(net.activations)
+            for i, (W, b) in enumerate(zip(net.weights, net.biases)):
+                arrays[f"{name}/W{i}"] = W
+                arrays[f"{name}/b{i}"] = b
+        np.savez(path, **arrays)
+
+    def decide(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Heating and venting decisions (0/1 ints) for a batch of unscaled feature rows."""
+        X_scaled = self.scaler.transform(X)
+        heating = (self.heat.predict(X_scaled)[:, 0] > 0.5).astype(int)
+        venting = (self.vent.predict(X_scaled)[:, 0] > 0.5).astype(int)
+        return heating, venting
+
+# ────────────── EXPORT ───────────────────────────────────────────────────
+def read_keras_dense(path: str) -> DenseNet:
+    """
+    Weights of a Sequential stack of Dense layers from a Keras 3 .keras
+    archive, read with h5py. Layer order and activations come from the
+    archive's config.json; the weights file names layers dense, dense_1, …
+    """
+    import h5py
+
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = io.BytesIO(archive.read("model.weights.h5"))
+
+    layers = [layer for layer in config["config"]["layers"] if layer["class_name"] != "InputLayer"]
+    if any(layer["class_name"] != "Dense" for layer in layers):
+        raise ValueError(f"{path}: only Dense layers can be exported, got "
+                         f"{[layer['class_name'] for layer in layers]}")
+
+    def order(name):
+        suffix = re.search(r"_(\d+)$", name)
+        return int(suffix.group(1)) if suffix else 0
+
+    with h5py.File(weights_file, "r") as f:
+        groups = sorted(f["layers"].keys(), key=order)
+        weights = [f[f"layers/{g}/vars/0"][()].astype(float) for g in groups]
+        biases = [f[f"layers/{g}/vars/1"][()].astype(float) for g in groups]
+    return DenseNet(weights=weights, biases=biases,
+                    activations=[layer["config"]["activation"] for layer in layers])
+
+def export_models(models_dir: str = MODELS_DIR, out_path: str | None = None) -> ControlModels:
+    """Convert the .keras models and scaler.pkl in `models_dir` into one NumPy .npz."""
+    import joblib
+
+    scaler = joblib.load(f"{models_dir}/scaler.pkl")
+    models = ControlModels(
+        heat=read_keras_dense(f"{models_dir}/{MODEL_FILES['heat']}"),
+        vent=read_keras_dense(f"{models_dir}/{MODEL_FILES['vent']}"),
+        regression=read_keras_dense(f"{models_dir}/{MODEL_FILES['regression']}"),
+        scaler=ScalerParams(np.asarray(scaler.mean_, dtype=float), np.asarray(scaler.scale_, dtype=float),
+                            tuple(str(f) for f in scaler.feature_names_in_)),
+    )
+    models.save(out_path or f"{models_dir}/{EXPORT_FILE}")
+    return models
+
+
+if __name__ == "__main__":
+    import time
+
+    models = export_models()
+    print(f"Exported to {MODELS_DIR}/{EXPORT_FILE}; features {models.features}")
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(-10, 35, 100_000), rng.uniform(20, 100, 100_000),
+                         rng.uniform(5, 35, 100_000), rng.uniform(20, 100, 100_000),
+                         np.zeros(100_000), np.zeros(100_000)])
+    t0 = time.perf_counter()
+    heating, venting = models.decide(X)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(X):,} decisions in {elapsed * 1e3:.1f} ms ({heating.mean():.0%} heat, {venting.mean():.0%} vent)")
@@ -163,4 +163,77 @@ def forecast_n_hours_ahead(
         "predicted_venting": predicted_venting
     })
 
-    return df_forecast
\ No newline at end of file
+    return df_forecast
+
+def simulate_next_conditions_batch(
+    internal_temp, external_temp, internal_humidity, external_humidity, heating, venting
+):
+    """simulate_next_conditions over arrays of sites (heating/venting are 0/1 arrays)."""
+    heating = np.asarray(heating, dtype=bool)
+    venting = np.asarray(venting, dtype=bool)
+
+    temp = np.where(heating, internal_temp + 1.5, internal_temp)
+    temp = np.where(venting, temp + 0.75 * (external_temp - temp), temp)
+
+    heating_effect = np.where(heating, -0.5, 0.0)
+    venting_effect = np.where(venting, 0.3 * (external_humidity - internal_humidity), 0.0)
+    passive_gain = np.where(~venting & ~heating, 0.05 * (100 - internal_humidity), 0.0)
+
+    humidity = np.clip(internal_humidity + heating_effect + venting_effect + passive_gain, 0, 100)
+    temp = temp + 0.05 * (external_temp - temp)
+
+    return temp, humidity
+
+
+def forecast_n_hours_ahead_batch(
+        n,
+        start_internal_temps,
+        start_internal_humidities,
+        external_temp_forecasts,
+        external_humidity_forecasts,
+        models,
+        start_time=None
+):
+    """
+    forecast_n_hours_ahead for many sites at once with the NumPy models
+    from control_models.ControlModels: every hour is one batched model
+    call over all sites. Forecasts are (sites, n) arrays; returns a long
+    DataFrame with a `site` column and hourly timestamps from `start_time`.
+    """
+    cur_temp = np.atleast_1d(np.asarray(start_internal_temps, dtype=float))
+    cur_hum = np.broadcast_to(np.asarray(start_internal_humidities, dtype=float), cur_temp.shape).copy()
+    ext_temps = np.atleast_2d(np.asarray(external_temp_forecasts, dtype=float))
+    ext_hums = np.atleast_2d(np.asarray(external_humidity_forecasts, dtype=float))
+    n_sites = len(cur_temp)
+    if ext_temps.shape != (n_sites, n) or ext_hums.shape != (n_sites, n):
+        raise ValueError(f"Forecasts must be (sites, n) = ({n_sites}, {n}); "
+                         f"got {ext_temps.shape} and {ext_hums.shape}")
+
+    columns = {name: j for j, name in enumerate(models.features)}
+    X = np.zeros((n_sites, len(columns)))
+    temps = np.empty((n_sites, n))
+    heating = np.empty((n_sites, n), dtype=int)
+    venting = np.empty((n_sites, n), dtype=int)
+
+    for i in range(n):
+        X[:, columns["internal_temp"]] = cur_temp
+        X[:, columns["external_temp"]] = ext_temps[:, i]
+        X[:, columns["internal_humidity"]] = cur_hum
+        X[:, columns["external_humidity"]] = ext_hums[:, i]
+
+        heating[:, i], venting[:, i] = models.decide(X)
+        cur_temp, cur_hum = simulate_next_conditions_batch(
+            cur_temp, ext_temps[:, i], cur_hum, ext_hums[:, i], heating[:, i], venting[:, i]
+        )
+        temps[:, i] = cur_temp
+
+    start = pd.Timestamp(start_time or datetime.now()).floor("h")
+    timestamps = pd.date_range(start + timedelta(hours=1), periods=n, freq="h")
+
+    return pd.DataFrame({
+        "site": np.repeat(np.arange(n_sites), n),
+        "datetime": np.tile(timestamps, n_sites),
+        "predicted_internal_temp": temps.ravel(),
+        "predicted_heating": heating.ravel(),
+        "predicted_venting": venting.ravel()
+    })
@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+"""
+The GreenhouseCoefficients class holds the lumped thermal coefficients
+derived from a GreenhouseConfig. It is frozen and hashable so the
+engine, the controller and batch code can share it, and so results
+can be cached per configuration.
+"""
+
+@dataclass(frozen=True)
+class GreenhouseCoefficients:
+    ua_total_W_K: float          # conduction through all surfaces incl. glazing [W K⁻¹]
+    ua_envelope_W_K: float       # opaque wall/roof/floor only (heater sizing)   [W K⁻¹]
+    infiltration_W_K: float      # closed-house leakage                          [W K⁻¹]
+    vent_W_K_per_ach: float      # ventilation conductance per air change        [W K⁻¹ h]
+    vent_max_ach: float          # natural vents full-open                       [h⁻¹]
+    h_ma_W_K: float              # air ↔ mass film conductance                   [W K⁻¹]
+    C_air_J_K: float             # air heat capacity                             [J K⁻¹]
+    mass_kg: float               # lumped thermal mass                           [kg]
+    mass_c_p: float              # its specific heat                             [J kg⁻¹ K⁻¹]
+    heater_W: float              # heater output                                 [W]
+
+    @property
+    def C_mass_J_K(self) -> float:
+        return self.mass_kg * self.mass_c_p
+
+    @property
+    def C_total_J_K(self) -> float:
+        return self.C_air_J_K + self.C_mass_J_K
+
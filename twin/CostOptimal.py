@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field, replace
+
+from energy import DEFAULT_PLAN, FAN_W_PER_M3_H, TariffPlan
+from GreenhouseEngine import AIR_DENSITY, HEATER_EFFICIENCY
+
+"""
+The CostOptimal controller chooses heater part-load and vent rate for
+each hour by dynamic programming over a grid of air temperatures. It
+uses a one-node RC model like `Predictive`'s (lumped capacity C against
+conductance U, plus vent conductance per air change), prices
+heater and fan electricity with a TariffPlan, and charges a penalty for
+every °C·h outside the crop band. Because the whole horizon is priced,
+it will warm the house ahead of a peak window when that is cheaper than
+heating through it.
+
+It speaks the engine's controller protocol (`plan` / `decide_planned`,
+or `decide` with a horizon dict), re-solving the horizon every hour.
+In `simulate_ensemble` every member gets its own copy (see
+`ControllerFleet`). TOU hours are read on the tariff's clock when it
+has one (`from_coefficients(timezone=...)`), else on the forecast
+index's own.
+"""
+
+HEAT_LEVELS = (0.0, 0.25, 0.5, 0.75, 1.0)      # heater part-load choices
+VENT_LEVELS = (0.0, 0.5, 1.0)                  # fraction of vent_max_ach
+BAND_PENALTY_PER_K_H = 2.0                     # $ per °C·h outside the band
+
+@dataclass
+class CostPlan:
+    """Per-run forecast and prices, sliced into a window per decision."""
+    T_ext: np.ndarray
+    Q_sol: np.ndarray
+    rates: np.ndarray            # $/kWh for each forecast row
+    horizon: int
+
+@dataclass
+class CostOptimal:
+    C_J_K: float                 # lumped heat capacity  [J K⁻¹]
+    U_W_K: float                 # conductance (UA)      [W K⁻¹]
+    heater_W: float              # heater capacity       [W]
+    vent_max_ach: float          # max vent rate         [h⁻¹]
+    vent_W_K_per_ach: float      # vent conductance      [W K⁻¹ h]
+    dt_hr: float = 1.0           # simulation time-step  [h]
+    T_min: float = 16.5          # crop band low         [°C]
+    T_max: float = 26.0          # crop band high        [°C]
+    tariff: TariffPlan = field(default_factory=lambda: DEFAULT_PLAN)
+    band_penalty: float = BAND_PENALTY_PER_K_H
+    heater_efficiency: float = HEATER_EFFICIENCY
+    fan_W_per_ach: float = 0.0   # fan power per air change [W h]
+    grid_step: float = 0.25      # temperature grid spacing [°C]
+    heat_levels: tuple = HEAT_LEVELS
+    vent_levels: tuple = VENT_LEVELS
+
+    _heater_state: bool = False
+    _actions: tuple = field(init=False, repr=False)
+
+    def __post_init__(self):
+        part, vent = np.meshgrid(self.heat_levels, self.vent_levels, indexing="ij")
+        self._actions = (part.ravel(), vent.ravel() * self.vent_max_ach)
+
+    def fresh(self) -> "CostOptimal":
+        """Same settings with the decision memory reset, for a new run."""
+        return replace(self, _heater_state=False)
+
+    @classmethod
+    def from_coefficients(cls, coeffs, fan_W_per_m3_h: float = FAN_W_PER_M3_H, timezone: str | None = None,
+                          **settings) -> "CostOptimal":
+        """
+        One-node model of the house: air + mass capacity against the
+        conductance the engine actually loses heat through (all surfaces
+        and leakage). The mass film is internal storage, not a loss path.
+        `timezone` is the utility's clock for the tariff (default: the
+        forecast index's own).
+        """
+        if timezone is not None:
+            settings["tariff"] = settings.get("tariff", DEFAULT_PLAN).in_timezone(timezone)
+        volume_m3 = coeffs.vent_W_K_per_ach * 3600 / (AIR_DENSITY * 1005)
+        return cls(
+            C_J_K=coeffs.C_total_J_K,
+            U_W_K=coeffs.ua_total_W_K + coeffs.infiltration_W_K,
+            heater_W=coeffs.heater_W,
+            vent_max_ach=coeffs.vent_max_ach,
+            vent_W_K_per_ach=coeffs.vent_W_K_per_ach,
+            fan_W_per_ach=volume_m3 * fan_W_per_m3_h,
+            **settings,
+        )
+
+    def _grid(self, air_temp: float, T_ext: np.ndarray) -> np.ndarray:
+        lo = min(self.T_min, air_temp, T_ext.min()) - 1.0
+        hi = max(self.T_max, air_temp, T_ext.max()) + 1.0
+        return np.arange(lo, hi + self.grid_step, self.grid_step)
+
+    def _transitions(self, T: np.ndarray, T_ext: float, Q_sol: float, rate: float):
+        """End-of-step temperature (…, actions) and stage cost for every action."""
+        part, ach = self._actions
+        G = self.U_W_K + self.vent_W_K_per_ach * ach
+        decay = np.exp(-G * self.dt_hr * 3600 / self.C_J_K)
+        T_inf = T_ext + (Q_sol + part * self.heater_W * self.heater_efficiency) / G
+        T_next = T_inf + (np.asarray(T)[..., None] - T_inf) * decay
+
+        energy_cost = rate * (part * self.heater_W + ach * self.fan_W_per_ach) * self.dt_hr / 1000
+        outside = np.maximum(self.T_min - T_next, 0.0) + np.maximum(T_next - self.T_max, 0.0)
+        return T_next, energy_cost + self.band_penalty * outside * self.dt_hr
+
+    def solve(self, air_temp: float, T_ext, Q_sol, rates):
+        """
+        Optimal schedule over the window from `air_temp`. Returns
+        (part_load, vent_ach, T_air) with one entry per hour (T_air has
+        one more, starting at `air_temp`).
+        """
+        T_ext = np.asarray(T_ext, dtype=float)
+        Q_sol = np.asarray(Q_sol, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        H = len(T_ext)
+        grid = self._grid(air_temp, T_ext)
+
+        # backward pass: value[k] = cheapest cost-to-go from each grid temperature at hour k
+        value = np.zeros((H + 1, grid.size))
+        for k in range(H - 1, -1, -1):
+            T_next, stage = self._transitions(grid, T_ext[k], Q_sol[k], rates[k])
+            value[k] = (stage + np.interp(T_next, grid, value[k + 1])).min(axis=1)
+
+        # forward pass from the actual temperature
+        part_out, vent_out, T_out = np.empty(H), np.empty(H), np.empty(H + 1)
+        T_out[0] = air_temp
+        part, ach = self._actions
+        for k in range(H):
+            T_next, stage = self._transitions(T_out[k], T_ext[k], Q_sol[k], rates[k])
+            a = int(np.argmin(stage + np.interp(T_next, grid, value[k + 1])))
+            part_out[k], vent_out[k], T_out[k + 1] = part[a], ach[a], T_next[a]
+        return part_out, vent_out, T_out
+
+    def _act(self, air_temp, T_ext, Q_sol, rates):
+        part, ach, _ = self.solve(air_temp, T_ext, Q_sol, rates)
+        heater_on = bool(part[0] > 0)
+        self._heater_state = heater_on
+        return heater_on, float(part[0]), float(ach[0])
+
+    def _rates(self, times, n: int) -> np.ndarray:
+        """TOU rates at `times`; the tariff's mean rate when there are no timestamps to price."""
+        if isinstance(times, pd.DatetimeIndex) and len(times) == n:
+            return self.tariff.rates_at(times)
+        return np.full(n, self.tariff.rates.mean())
+
+    def decide(self, air_temp, forecast_df):
+        """
+        `forecast_df` holds "temp" and "Q_solar" for the horizon and may
+        hold "rate" ($/kWh); without it the rates come from its
+        DatetimeIndex, or are the tariff's mean when it has none.
+        """
+        T_ext = np.asarray(forecast_df["temp"], dtype=float)
+        Q_sol = np.asarray(forecast_df["Q_solar"], dtype=float)
+        rates = (np.asarray(forecast_df["rate"], dtype=float) if "rate" in forecast_df
+                 else self._rates(getattr(forecast_df, "index", None), len(T_ext)))
+        return self._act(air_temp, T_ext, Q_sol, rates)
+
+    def plan(self, T_ext, Q_sol, horizon: int, times=None) -> CostPlan:
+        """Price the run once; `times` (the forecast index) selects TOU rates when it is a DatetimeIndex."""
+        T_ext = np.asarray(T_ext, dtype=float)
+        return CostPlan(T_ext, np.asarray(Q_sol, dtype=float), self._rates(times, len(T_ext)), horizon)
+
+    def decide_planned(self, air_temp, i: int, plan: CostPlan):
+        window = slice(i, i + plan.horizon)
+        return self._act(air_temp, plan.T_ext[window], plan.Q_sol[window], plan.rates[window])
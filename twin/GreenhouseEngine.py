@@ -1,20 +1,20 @@
 import os
-from dotenv import load_dotenv
+import copy
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
-import pvlib
-from typing import cast
+from typing import cast, Sequence
+from dataclasses import dataclass, replace
 import logging
-from Predictive import Predictive
-from ThermalMass import ThermalMass
+from Predictive import Predictive, PredictiveBatch
+from Coefficients import GreenhouseCoefficients
+from ThermalMass import (DEEP_GROUND_TEMP_C, GROUND_DEPTH_M, GROUND_LAYERS, LayeredGround,
+                         ThermalMass)
 
-from forecast import get_geocode, get_hourly_forecast, get_hourly_solar, get_hourly_weather
 """
 The GreenhouseConfig class sets up the constants 
 of the greenhouse based on user defined values.
 """
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ────────────── CONSTANTS (SI) ──────────────────────────────────────────
@@ -30,6 +30,69 @@ LIGHT_TRANSMISSION     = 0.80
 ALBEDO                 = 0.20
 R_IP_TO_SI             = 5.678263        # divide IP R by this to get m² K W-1
 AIR_DENSITY            = 1.225
+H_MASS_AIR_W_K         = 1500            # air ↔ mass film conductance (W K-1)
+SOLAR_TO_MASS_FRAC     = 0.8             # share of solar gain absorbed by the mass
+WIND_COEFF             = 0.05            # infiltration/film multiplier per m s-1
+HEATER_EFFICIENCY      = 0.90
+SUB_DT_S               = 0.25 * 3600     # 15-minute physics interval
+INTEGRATORS            = ("euler", "exact")
+
+# ────────────── EXACT DISCRETIZATION ───────────────────────────────────
+def exact_step_coefficients(C_air, C_mass, h_ma, G_W_K, T_ext, Q_solar, dt_s):
+    """
+    Zero-order-hold discretization of the linear air/mass RC pair
+
+        C_air  dTa/dt = (1-f)·Q_solar + Q_heat + h(Tm - Ta) - G(Ta - T_ext)
+        C_mass dTm/dt =     f·Q_solar          + h(Ta - Tm)
+
+    over one step of `dt_s` seconds, with h = `h_ma` and
+    f = SOLAR_TO_MASS_FRAC. The state then advances exactly as
+    x' = x_ss + Φ (x - x_ss), where x_ss = x_free + Q_heat · g.
+
+    This is not the model the Euler path integrates: there the air
+    balance is divided by C_total (air and mass together), which slows
+    the air node down, and vent exchange is dropped when the outside is
+    warmer. Here the air node has its own capacity and G is linear in
+    ΔT. With C_air alone the air time constant is about 100 s, so over
+    an hourly step the air is practically at its quasi-steady value and
+    follows the heater's on/off decisions from one hour to the next.
+
+    All arguments broadcast, so one call covers every hour or member.
+    Returns (Φ11, Φ12, Φ21, Φ22, air_free, mass_free, g_air, g_mass).
+    """
+    h = h_ma
+    a   = -(G_W_K + h) / C_air
+    b12 = h / C_air
+    c21 = h / C_mass
+    d   = -h / C_mass
+
+    # Eigenvalues are real and negative for any positive conductances,
+    # so the Sylvester form below never overflows, whatever the step.
+    s = (a + d) / 2
+    q = np.sqrt(((a - d) / 2) ** 2 + b12 * c21)
+    l1, l2 = s + q, s - q
+    e1, e2 = np.exp(l1 * dt_s), np.exp(l2 * dt_s)
+    p11 = (e1 * (a - l2) - e2 * (a - l1)) / (2 * q)
+    p12 = b12 * (e1 - e2) / (2 * q)
+    p21 = c21 * (e1 - e2) / (2 * q)
+    p22 = (e1 * (d - l2) - e2 * (d - l1)) / (2 * q)
+
+    det = a * d - b12 * c21
+    b_air  = ((1 - SOLAR_TO_MASS_FRAC) * Q_solar + G_W_K * T_ext) / C_air
+    b_mass = SOLAR_TO_MASS_FRAC * Q_solar / C_mass
+    air_free  = -(d * b_air - b12 * b_mass) / det
+    mass_free = -(-c21 * b_air + a * b_mass) / det
+    g_air  = -d / det / C_air
+    g_mass = c21 / det / C_air
+    return p11, p12, p21, p22, air_free, mass_free, g_air, g_mass
+
+def check_step_hours(index, dt_hr: float) -> None:
+    """Reject a `dt_hr` that disagrees with the spacing of a DatetimeIndex (other indexes are trusted)."""
+    if isinstance(index, pd.DatetimeIndex) and len(index) > 1:
+        spacing_hr = np.diff(index.asi8) / 3.6e12
+        if not np.allclose(spacing_hr, dt_hr, rtol=1e-6, atol=0.0):
+            raise ValueError(f"dt_hr={dt_hr} does not match the forecast spacing "
+                             f"({np.median(spacing_hr):g} h between rows)")
 
 # ────────────── GREENHOUSE CONFIG ──────────────────────────────────────
 class GreenhouseConfig:
@@ -70,6 +133,9 @@ class GreenhouseConfig:
         self.design_vent_ach = 2.0           # natural vents full-open
 
         # ── Thermal mass (kg) ──────────────────────────────────────────
+        self.num_footings  = num_footings
+        self.soil_coupling = SOIL_COUPLING_FACTOR
+        self.h_ma_W_K      = H_MASS_AIR_W_K
         self.mass_kg = self._build_thermal_mass_KG(num_footings)
         self.mass_c_p = SPECIFIC_HEAT_J_PER_KG
         self.ua_envelope = (
@@ -89,9 +155,21 @@ class GreenhouseConfig:
         concrete_V = num_footings * (12 * 0.0283168)
         concrete_m = concrete_V * CONCRETE_DENSITY_KG_M3
         soil_V     = self.floor_A * 0.61     # 2 ft = 0.61 m depth
-        soil_m     = soil_V * SOIL_DENSITY_KG_M3 * SOIL_COUPLING_FACTOR
+        soil_m     = soil_V * SOIL_DENSITY_KG_M3 * self.soil_coupling
         return concrete_m + soil_m + BAMBOO_MASS_KG
 
+    def layered_ground(self, layers: int = GROUND_LAYERS, depth_m: float = GROUND_DEPTH_M,
+                       deep_temp_C: float = DEEP_GROUND_TEMP_C) -> LayeredGround:
+        """
+        Soil column under the floor, for `simulate_ensemble(ground=...)`.
+        The footings and bench mass sit in the surface layer; the soil
+        is modelled in full instead of through `soil_coupling`.
+        """
+        concrete_m = self.num_footings * (12 * 0.0283168) * CONCRETE_DENSITY_KG_M3
+        return LayeredGround(self.floor_A, LayeredGround.graded(depth_m, layers),
+                             surface_extra_J_K=(concrete_m + BAMBOO_MASS_KG) * self.mass_c_p,
+                             deep_temp_C=deep_temp_C)
+
     def _build_heater_sizing_W(self) -> int:
 
         Q_cond = self.ua_envelope * self.design_dT  
@@ -101,21 +179,32 @@ class GreenhouseConfig:
         return int((Q_cond + Q_vent) * safety)
 
     def _build_controller(self) -> Predictive:
-        leak_U = AIR_DENSITY * self.volume_m3 * self.leak_ach / 3600 * 1005 
-        h_ma = 1500
-        
-        sim_C_J_K = self.mass_kg * self.mass_c_p + AIR_DENSITY * self.volume_m3 * 1005
-        sim_U_W_K = self.ua_envelope + leak_U + h_ma
+        return Predictive.from_coefficients(self.coefficients(), dt_hr=1.0)
 
-        controller = Predictive(
-            C_J_K=sim_C_J_K,
-            U_W_K=sim_U_W_K,
-            heater_W=self.heater_W,
+    def coefficients(self) -> GreenhouseCoefficients:
+        """
+        Compile the current geometry and fabric into the lumped thermal
+        coefficients used by the engine and controller. Call again after
+        changing any attribute; the result is frozen and hashable.
+        """
+        ua_envelope = (
+            self.wall_A / self.wall_R +
+            self.roof_A / self.roof_R +
+            self.floor_A / self.floor_R
+        )
+        vent_W_K_per_ach = AIR_DENSITY * self.volume_m3 / 3600 * 1005
+        return GreenhouseCoefficients(
+            ua_total_W_K=ua_envelope + self.glazing_A / self.glazing_R,
+            ua_envelope_W_K=ua_envelope,
+            infiltration_W_K=vent_W_K_per_ach * self.leak_ach,
+            vent_W_K_per_ach=vent_W_K_per_ach,
             vent_max_ach=self.design_vent_ach,
-            dt_hr=1.0
+            h_ma_W_K=self.h_ma_W_K,
+            C_air_J_K=self.rho_cp_V,
+            mass_kg=self.mass_kg,
+            mass_c_p=self.mass_c_p,
+            heater_W=self.heater_W,
         )
-
-        return controller
     
     def get_summary(self):
         """Return summary of greenhouse configuration."""
@@ -130,14 +219,173 @@ class GreenhouseConfig:
             'heater_capacity_W': self.heater_W
         }
     
+@dataclass
+class EnsembleResult:
+    """
+    Output of `GreenhouseThermalEngine.simulate_ensemble`. Every entry
+    in `fields` is a (members x hours) array sharing the same `index`.
+    """
+    index: pd.Index
+    fields: dict
+    ground_profile: np.ndarray | None = None    # (members x layers) at the end, layered-ground runs only
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    @property
+    def members(self) -> int:
+        return self.fields["T_air"].shape[0]
+
+    def member(self, i: int) -> pd.DataFrame:
+        """Return one member in the same layout as `simulate_step`."""
+        df = pd.DataFrame({name: arr[i] for name, arr in self.fields.items()}, index=self.index)
+        df.index.name = "datetime"
+        return df
+
+class ControllerFleet:
+    """
+    One copy of a scalar controller per member behind `PredictiveBatch`'s
+    `plan` / `decide_planned` interface, for controllers that have no
+    batched form (e.g. `CostOptimal`). Decisions are taken member by
+    member, and the copies keep the originals' timers untouched.
+    """
+    def __init__(self, controllers: Sequence):
+        self.controllers = [copy.copy(c) for c in controllers]
+
+    def fresh(self) -> "ControllerFleet":
+        """The same members with their decision memory reset, for a new run."""
+        return ControllerFleet([c.fresh() for c in self.controllers])
+
+    def plan(self, T_ext, Q_sol, horizon: int, times=None) -> list:
+        T_ext, Q_sol = np.asarray(T_ext, dtype=float), np.asarray(Q_sol, dtype=float)
+        window = {"temp": T_ext, "Q_solar": Q_sol, "horizon": horizon}
+        return [c.plan(T_ext, Q_sol, horizon, times=times) if hasattr(c, "plan") else window
+                for c in self.controllers]
+
+    def decide_planned(self, air_temps, i: int, plans: list):
+        decisions = []
+        for c, air, plan in zip(self.controllers, np.asarray(air_temps, dtype=float).tolist(), plans):
+            if hasattr(c, "plan"):
+                decisions.append(c.decide_planned(air, i, plan))
+            else:
+                window = slice(i, i + plan["horizon"])
+                decisions.append(c.decide(air, {"temp": plan["temp"][window], "Q_solar": plan["Q_solar"][window]}))
+        heater_on, part_load, vent_ach = zip(*decisions)
+        return (np.array(heater_on, dtype=bool), np.array(part_load, dtype=float),
+                np.array(vent_ach, dtype=float))
+
+@dataclass
+class EngineState:
+    """Live state of one greenhouse, advanced in place by `GreenhouseThermalEngine.step`."""
+    air_temp: float
+    mass_temp: float
+    time: pd.Timestamp | None = None
+    steps: int = 0
+    heater_on: bool = False
+    part_load: float = 0.0
+    vent_ach: float = 0.0
+
+@dataclass
+class EngineSnapshot:
+    """Copy of an engine's state and its controller's memory (see `snapshot`)."""
+    state: EngineState
+    controller: dict
+
+# controller attributes that carry memory between decisions
+CONTROLLER_STATE = ("_heater_state", "_on_timer", "_off_timer")
+
 class GreenhouseThermalEngine:
-    def __init__(self, config: GreenhouseConfig, air_temp_init_C: float):
+    def __init__(self, config: GreenhouseConfig, air_temp_init_C: float, mass_temp_init_C: float | None = None):
         self.cfg = config
-        self.air_temp = air_temp_init_C            
+        self.coeffs = config.coefficients()
+        # the engine owns its controller, so engines sharing a config never share timers;
+        # settings are taken from the config here, memory is reset at the start of every run
+        self.controller = config.controller.fresh()
+        self.state = EngineState(air_temp_init_C,
+                                 air_temp_init_C if mass_temp_init_C is None else mass_temp_init_C)
         self.mass = ThermalMass(config.mass_kg, config.mass_c_p)
 
         logger.info(f"Thermal engine initialized with T_air={air_temp_init_C:.1f}°C")
 
+    @property
+    def air_temp(self) -> float:
+        return self.state.air_temp
+
+    @air_temp.setter
+    def air_temp(self, value: float) -> None:
+        if "state" not in self.__dict__:
+            raise AttributeError("Engine has no state to set air_temp on; build it with __init__ "
+                                 "or assign an EngineState first")
+        self.state.air_temp = value
+
+    # ────────────── INCREMENTAL API ────────────────────────────────────
+    def step(self, obs: dict, forecast_window, dt_hr: float = 1.0) -> dict:
+        """
+        Advance the live state by one interval of `dt_hr` hours.
+
+        `obs` holds this interval's exterior "temp", "wind_speed" and
+        "Q_solar" (missing keys are read from the first row of
+        `forecast_window`), optionally a measured interior "T_air" that
+        replaces the modelled air temperature before deciding, and an
+        optional "time". `forecast_window` is the controller's look-ahead
+        ("temp" and "Q_solar" arrays), as passed to `Predictive.decide`.
+
+        The air/mass pair advances with the exact update, so the cost of
+        a tick does not depend on the step length or on how long the
+        engine has been running. Returns the interval as one result row.
+        """
+        state, coeffs = self.state, self.coeffs
+        if obs.get("T_air") is not None:
+            state.air_temp = float(obs["T_air"])
+
+        def current(name):
+            value = obs.get(name)
+            return float(value if value is not None else forecast_window[name][0])
+
+        ext_temp, wind, Q_solar = current("temp"), current("wind_speed"), current("Q_solar")
+        heater_on, part_load, vent_ach = self.controller.decide(state.air_temp, forecast_window)
+        Q_heat = self.calculate_heating_gain_W(heater_on, part_load)
+
+        G = (coeffs.ua_total_W_K + coeffs.infiltration_W_K) * (1 + WIND_COEFF * wind) \
+            + coeffs.vent_W_K_per_ach * vent_ach
+        p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = exact_step_coefficients(
+            coeffs.C_air_J_K, coeffs.C_mass_J_K, coeffs.h_ma_W_K, G, ext_temp, Q_solar, dt_hr * 3600)
+        air_ss = air_free + Q_heat * g_air
+        mass_ss = mass_free + Q_heat * g_mass
+        d_air, d_mass = state.air_temp - air_ss, state.mass_temp - mass_ss
+        state.air_temp = float(air_ss + p11 * d_air + p12 * d_mass)
+        state.mass_temp = float(mass_ss + p21 * d_air + p22 * d_mass)
+
+        state.steps += 1
+        state.time = obs.get("time", state.time)
+        state.heater_on, state.part_load, state.vent_ach = bool(heater_on), float(part_load), float(vent_ach)
+
+        dT = state.air_temp - ext_temp
+        return {
+            "T_air"     : state.air_temp,
+            "T_mass"    : state.mass_temp,
+            "heater_on" : state.heater_on,
+            "part_load" : state.part_load,
+            "vent_ach"  : state.vent_ach,
+            "Q_solar"   : Q_solar,
+            "Q_heat"    : Q_heat,
+            "Q_loss"    : self.calculate_heat_loss_W(state.air_temp, ext_temp, wind),
+            "Q_vent"    : coeffs.vent_W_K_per_ach * vent_ach * dT,
+            "Q_exchange": coeffs.h_ma_W_K * (state.mass_temp - state.air_temp),
+        }
+
+    def snapshot(self) -> EngineSnapshot:
+        """Copy of the live state and the controller's timers, for `restore`."""
+        controller = self.controller
+        memory = {name: getattr(controller, name) for name in CONTROLLER_STATE if hasattr(controller, name)}
+        return EngineSnapshot(replace(self.state), memory)
+
+    def restore(self, snapshot: EngineSnapshot) -> None:
+        """Return the engine and its controller to a `snapshot`."""
+        self.state = replace(snapshot.state)
+        for name, value in snapshot.controller.items():
+            setattr(self.controller, name, value)
+
     def calculate_heat_loss_W(self, air_temp: float, ext_tempemp: float, wind_m_s: float) -> float:
         """
         Calculates the amount of energy lost due to conduction
@@ -146,19 +394,12 @@ class GreenhouseThermalEngine:
         dT = air_temp - ext_tempemp
 
         # 1. Conduction (W)
-        Q_cond = (
-            self.cfg.wall_A   / self.cfg.wall_R   +
-            self.cfg.roof_A   / self.cfg.roof_R   +
-            self.cfg.floor_A  / self.cfg.floor_R  +
-            self.cfg.glazing_A / self.cfg.glazing_R
-        ) * dT
+        Q_cond = self.coeffs.ua_total_W_K * dT
 
         # 2. Infiltration (W) 
-        m_dot = self.cfg.volume_m3 * self.cfg.leak_ach / 3600 * 1.2
-        Q_inf = m_dot * 1005 * dT
+        Q_inf = self.coeffs.infiltration_W_K * dT
 
         # 3. Wind multiplier
-        WIND_COEFF = 0.05      
         Q_total = (Q_cond + Q_inf) * (1 + WIND_COEFF * wind_m_s)
 
         return Q_total
@@ -171,10 +412,7 @@ class GreenhouseThermalEngine:
         if vent_ach == 0 or dT < 0:
             return 0.0
         
-        CP_AIR = 1005
-        volumetric_flow = self.cfg.volume_m3 * (vent_ach / 3600)
-        mass_flow = AIR_DENSITY * volumetric_flow
-        Q_vent = mass_flow * CP_AIR * (air_temp - ext_tempemp)
+        Q_vent = self.coeffs.vent_W_K_per_ach * vent_ach * dT
 
         return Q_vent
 
@@ -185,73 +423,312 @@ class GreenhouseThermalEngine:
         if not heater_on:
             return 0.0
 
-        EFFICIENCY =  0.90
         partial = max(0.0, min(1.0, partial))
-        Q_heat = partial * self.cfg.heater_W * EFFICIENCY
+        Q_heat = partial * self.coeffs.heater_W * HEATER_EFFICIENCY
         return Q_heat
 
-    def simulate_step(self, initial_air_temp, initial_mass_temp, forecast_df, start_i:int=0, steps:int=12, horizon:int=12):
+    def simulate_step(self, initial_air_temp, initial_mass_temp, forecast_df, start_i:int=0, steps:int=12, horizon:int=12,
+                      integrator: str = "euler", dt_hr: float = 1.0, carry_controller: bool = False):
         # solar gain + heating gain - (venting loss + heat loss)
-        simulated = []
-        h_ma = 1500
+        results = self.simulate_arrays(initial_air_temp, initial_mass_temp, forecast_df,
+                                       start_i=start_i, steps=steps, horizon=horizon,
+                                       integrator=integrator, dt_hr=dt_hr, carry_controller=carry_controller)
+        index = forecast_df.index[start_i : start_i + steps]
+        simulated_df = pd.DataFrame(results, index=index)
+        simulated_df.index.name = "datetime"
+        return simulated_df
+
+    def simulate_arrays(self, initial_air_temp, initial_mass_temp, forecast_df,
+                        start_i: int = 0, steps: int = 12, horizon: int = 12,
+                        integrator: str = "euler", dt_hr: float = 1.0, checkpoints: list | None = None,
+                        carry_controller: bool = False) -> dict:
+        """
+        Array form of `simulate_step`: returns a dict of per-hour arrays
+        with the same keys as the DataFrame columns. The forecast columns
+        are read once, so no pandas indexing happens inside the loop.
+
+        integrator="euler" reproduces the original four 15-minute sub-steps
+        per hourly forecast row. integrator="exact" advances the two-node
+        air/mass model with its matrix exponential, one update per row of
+        length `dt_hr`, stable for any step size; its model differs from
+        the Euler one (see `exact_step_coefficients`). `dt_hr` must match
+        the spacing of the forecast rows.
+
+        When a `checkpoints` list is given, (air temp, mass temp, controller
+        memory) is appended before every step and once after the last, so
+        a later run can resume from any hour (see `incremental.py`).
+
+        The controller's memory (heater state, min on/off timers) is reset
+        at the start of the run unless `carry_controller` is set, which
+        continues from the memory left by the previous run or restored
+        from a checkpoint.
+        """
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Unknown integrator {integrator!r}; expected one of {INTEGRATORS}")
+        if integrator == "euler" and dt_hr != 1.0:
+            raise ValueError("integrator='euler' steps hourly rows; use integrator='exact' for other intervals")
+        check_step_hours(forecast_df.index[start_i : start_i + steps + horizon - 1], dt_hr)
+        temp_all  = forecast_df["temp"].to_numpy(dtype=float)
+        wind_all  = forecast_df["wind_speed"].to_numpy(dtype=float)
+        solar_all = forecast_df["Q_solar"].to_numpy(dtype=float)
+        # plain floats are much cheaper than NumPy scalars in the physics below
+        temp_seq, wind_seq, solar_seq = temp_all.tolist(), wind_all.tolist(), solar_all.tolist()
+
+        T_air_out  = np.empty(steps)
+        T_mass_out = np.empty(steps)
+        heater_out = np.empty(steps, dtype=bool)
+        part_out   = np.empty(steps)
+        vent_out   = np.empty(steps)
+        heat_out   = np.empty(steps)
+        loss_out   = np.empty(steps)
+        venting_out = np.empty(steps)
+
+        if not carry_controller:
+            self.controller = self.controller.fresh()
+        coeffs = self.coeffs = self.cfg.coefficients()
+        ua = coeffs.ua_total_W_K
+        inf_W_K = coeffs.infiltration_W_K
+        vent_W_K_per_ach = coeffs.vent_W_K_per_ach
+        h_ma = coeffs.h_ma_W_K
+        C_total = coeffs.C_total_J_K
+        controller = self.controller
+        update_mass = self.mass.update_temperature
+
+        if integrator == "exact":
+            G_env_all = (ua + inf_W_K) * (1 + WIND_COEFF * wind_all)
+            exact_by_vent = {}      # vent_ach -> per-row coefficient lists
+
+            def exact_coefficients(vent_ach):
+                if vent_ach not in exact_by_vent:
+                    step = exact_step_coefficients(coeffs.C_air_J_K, coeffs.C_mass_J_K, h_ma,
+                                                   G_env_all + vent_W_K_per_ach * vent_ach,
+                                                   temp_all, solar_all, dt_hr * 3600)
+                    exact_by_vent[vent_ach] = [c.tolist() for c in step]
+                return exact_by_vent[vent_ach]
+
+        # every decision window of the run, predicted up front when supported
+        window = slice(start_i, start_i + steps + horizon - 1)
+        plan = (controller.plan(temp_all[window], solar_all[window], horizon, times=forecast_df.index[window])
+                if hasattr(controller, "plan") else None)
 
         air_temp = initial_air_temp
         mass_temp = initial_mass_temp
-        mass_fac = 0.8
-        for k in range(start_i, start_i + steps):            
-            horizon_df = forecast_df.iloc[k : k + horizon]
-            horizon_dict = {
-                "temp"   : horizon_df["temp"].to_numpy(),
-                "Q_solar": horizon_df["Q_solar"].to_numpy(),
-            }
-            heater_on, part_load, vent_ach = self.cfg.controller.decide(air_temp, horizon_dict)
-
-            row = forecast_df.iloc[k]
-            ext_temp = row["temp"]
-            wind_speed = row["wind_speed"]
-            Q_solar_hr = row.Q_solar
+        memory = [name for name in CONTROLLER_STATE if hasattr(controller, name)]
+        for j, k in enumerate(range(start_i, start_i + steps)):
+            if checkpoints is not None:
+                checkpoints.append((air_temp, mass_temp, {name: getattr(controller, name) for name in memory}))
+            if plan is not None:
+                heater_on, part_load, vent_ach = controller.decide_planned(air_temp, j, plan)
+            else:
+                horizon_dict = {
+                    "temp"   : temp_all[k : k + horizon],
+                    "Q_solar": solar_all[k : k + horizon],
+                }
+                heater_on, part_load, vent_ach = controller.decide(air_temp, horizon_dict)
+
+            ext_temp   = temp_seq[k]
+            wind_fac   = 1 + WIND_COEFF * wind_seq[k]
+            Q_solar_hr = solar_seq[k]
             Q_heat_hr  = self.calculate_heating_gain_W(heater_on, part_load)
+            vent_W_K   = vent_W_K_per_ach * vent_ach
+
+            if integrator == "exact":
+                # --- one exact step; vent exchange is linear in ΔT here ----
+                p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = exact_coefficients(vent_ach)
+                air_ss  = air_free[k]  + Q_heat_hr * g_air[k]
+                mass_ss = mass_free[k] + Q_heat_hr * g_mass[k]
+                d_air, d_mass = air_temp - air_ss, mass_temp - mass_ss
+                air_temp  = air_ss  + p11[k] * d_air + p12[k] * d_mass
+                mass_temp = mass_ss + p21[k] * d_air + p22[k] * d_mass
+                dT = air_temp - ext_temp
+                Q_vent_hr = vent_W_K * dT
+            else:
+                # --- 4 sub‑steps of 15 min each ---------------------------
+                Q_solar_sub = Q_solar_hr / 4.0
+                Q_heat_sub  = Q_heat_hr  / 4.0
+                q_to_mass = SOLAR_TO_MASS_FRAC * Q_solar_sub
+                q_to_air  = (1 - SOLAR_TO_MASS_FRAC) * Q_solar_sub
+                for _ in range(4):
+                    # losses at current air temp
+                    dT = air_temp - ext_temp
+                    Q_loss = (ua * dT + inf_W_K * dT) * wind_fac / 4.0
+                    Q_vent = vent_W_K * dT / 4.0 if dT >= 0 else 0.0
+
+                    mass_temp = update_mass(q_to_mass, air_temp, mass_temp)
+
+                    q_exchange = h_ma * (mass_temp - air_temp)
+                    q_net_air  = q_to_air + Q_heat_sub + q_exchange - Q_loss - Q_vent
+                    air_temp += q_net_air * SUB_DT_S / C_total
+
+                dT = air_temp - ext_temp
+                Q_vent_hr = vent_W_K * dT if dT >= 0 else 0.0
+
+            T_air_out[j]   = air_temp
+            T_mass_out[j]  = mass_temp
+            heater_out[j]  = heater_on
+            part_out[j]    = part_load
+            vent_out[j]    = vent_ach
+            heat_out[j]    = Q_heat_hr
+            loss_out[j]    = (ua * dT + inf_W_K * dT) * wind_fac
+            venting_out[j] = Q_vent_hr
+
+        if checkpoints is not None:
+            checkpoints.append((air_temp, mass_temp, {name: getattr(controller, name) for name in memory}))
+        if steps:
+            logger.info(f"Simulation completed: {steps} steps, "
+                        f"T_air range: {T_air_out.min():.1f}-{T_air_out.max():.1f}°C")
+        else:
+            logger.info("Simulation completed: 0 steps")
+        return {
+            "T_air"     : T_air_out,
+            "T_mass"    : T_mass_out,
+            "heater_on" : heater_out,
+            "part_load" : part_out,
+            "vent_ach"  : vent_out,
+            "Q_solar"   : solar_all[start_i : start_i + steps].copy(),
+            "Q_heat"    : heat_out,
+            "Q_loss"    : loss_out,
+            "Q_vent"    : venting_out,
+            "Q_exchange": h_ma * (T_mass_out - T_air_out),
+        }
 
-            # --- 4 sub‑steps of 15 min each -------------------------------
-            Q_solar_sub = Q_solar_hr / 4.0
-            Q_heat_sub  = Q_heat_hr  / 4.0
-            for _ in range(4):
-                # losses at current air temp
-                Q_loss = self.calculate_heat_loss_W(air_temp, ext_temp, wind_speed) / 4.0
-                Q_vent = self.calculate_venting_loss_W(air_temp, ext_temp, vent_ach) / 4.0
-
-                # split solar, update mass
-                q_to_mass = mass_fac * Q_solar_sub
-                q_to_air  = (1 - mass_fac) * Q_solar_sub
-                mass_temp = self.mass.update_temperature(q_to_mass, air_temp, mass_temp)
-
-                q_exchange = h_ma * (mass_temp - air_temp)
-                q_net_air  = q_to_air + Q_heat_sub + q_exchange - Q_loss - Q_vent
-
-                SUB_DT_HR = 0.25               # 15‑minute physics interval
-                SUB_DT_S  = SUB_DT_HR * 3600
-                air_temp += q_net_air * SUB_DT_S / (self.cfg.rho_cp_V + self.cfg.mass_kg*self.cfg.mass_c_p)
-
-
-
-            simulated.append({
-                "datetime"  : row.name,
-                "T_air"     : air_temp,
-                "T_mass"    : mass_temp,
-                "heater_on" : heater_on,
-                "part_load" : part_load,
-                "vent_ach"  : vent_ach,
-                "Q_solar"   : Q_solar_hr,
-                "Q_heat"    : Q_heat_hr,
-                "Q_loss"    : self.calculate_heat_loss_W(air_temp, ext_temp, wind_speed),
-                "Q_vent"    : self.calculate_venting_loss_W(air_temp, ext_temp, vent_ach),
-                "Q_exchange": h_ma * (mass_temp - air_temp),
-            })
-            
-        simulated_df = pd.DataFrame(simulated).set_index("datetime")
-        logger.info(f"Simulation completed: {steps} steps, "
-                        f"T_air range: {simulated_df['T_air'].min():.1f}-{simulated_df['T_air'].max():.1f}°C")
-        return simulated_df
+    def simulate_ensemble(self, initial_air_temps, initial_mass_temps, forecast_df,
+                          start_i: int = 0, steps: int = 12, horizon: int = 12,
+                          configs: Sequence[GreenhouseConfig] | None = None,
+                          integrator: str = "euler", dt_hr: float = 1.0,
+                          ground: LayeredGround | None = None) -> EnsembleResult:
+        """
+        Advance many greenhouses along one forecast together.
+
+        Each member starts from its own air/mass temperature and may use its
+        own `GreenhouseConfig` (envelope, heater, controller set-points); when
+        `configs` is omitted every member shares this engine's config. The
+        physics and control rule are those of `simulate_step`, evaluated on
+        arrays, and the controllers' timers are copied rather than mutated.
+        `Predictive` controllers decide together as a `PredictiveBatch`;
+        any other kind (e.g. `CostOptimal`) decides member by member.
+        `integrator` and `dt_hr` select the time stepping as in `simulate_arrays`.
+
+        With a `ground` column (see `GreenhouseConfig.layered_ground`) the
+        lumped mass is replaced by the layered soil: air and layers step
+        implicitly together in 15-minute sub-steps, `initial_mass_temps`
+        sets the surface layer, and T_mass reports the surface layer.
+        The final profiles are returned in `ground_profile`.
+        """
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Unknown integrator {integrator!r}; expected one of {INTEGRATORS}")
+        if integrator == "euler" and ground is None and dt_hr != 1.0:
+            raise ValueError("integrator='euler' steps hourly rows; use integrator='exact' for other intervals")
+        check_step_hours(forecast_df.index[start_i : start_i + steps + horizon - 1], dt_hr)
+        air_temp  = np.atleast_1d(np.asarray(initial_air_temps, dtype=float)).copy()
+        mass_temp = np.broadcast_to(np.asarray(initial_mass_temps, dtype=float), air_temp.shape).copy()
+        members = air_temp.size
+
+        if configs is None:
+            configs = [self.cfg] * members
+            controllers = [self.controller] * members
+        else:
+            controllers = [c.controller for c in configs]
+        controllers = [c.fresh() for c in controllers]
+        if len(configs) != members:
+            raise ValueError(f"Expected {members} configs, got {len(configs)}")
+
+        member_coeffs = [c.coefficients() for c in configs]
+
+        def col(name):
+            return np.array([getattr(k, name) for k in member_coeffs], dtype=float)
+
+        ua       = col("ua_total_W_K")
+        inf_W_K  = col("infiltration_W_K")
+        vent_W_K_per_ach = col("vent_W_K_per_ach")
+        h_ma     = col("h_ma_W_K")
+        heater_W = col("heater_W")
+        C_air    = col("C_air_J_K")
+        C_mass   = col("C_mass_J_K")
+        C_total  = col("C_total_J_K")
+        mass = ThermalMass(col("mass_kg"), col("mass_c_p"))
+        if all(isinstance(c, Predictive) for c in controllers):
+            controller = PredictiveBatch.from_controllers(controllers)
+        else:
+            controller = ControllerFleet(controllers)
+
+        temp_all  = forecast_df["temp"].to_numpy(dtype=float)
+        wind_all  = forecast_df["wind_speed"].to_numpy(dtype=float)
+        solar_all = forecast_df["Q_solar"].to_numpy(dtype=float)
+
+        names = ("T_air", "T_mass", "heater_on", "part_load", "vent_ach",
+                 "Q_solar", "Q_heat", "Q_loss", "Q_vent", "Q_exchange")
+        out = {name: np.empty((members, steps)) for name in names}
+        out["heater_on"] = np.empty((members, steps), dtype=bool)
+
+        def heat_loss(air, ext, wind):
+            dT = air - ext
+            return (ua * dT + inf_W_K * dT) * (1 + WIND_COEFF * wind)
+
+        def venting_loss(air, ext, vent_ach):
+            dT = air - ext
+            return np.where(dT < 0, 0.0, vent_W_K_per_ach * vent_ach * dT)
+
+        window = slice(start_i, start_i + steps + horizon - 1)
+        plan = controller.plan(temp_all[window], solar_all[window], horizon, times=forecast_df.index[window])
+        profile = ground.initial_profile(mass_temp) if ground is not None else None
+        ground_substeps = max(1, round(dt_hr * 3600 / SUB_DT_S))
+
+        for j, k in enumerate(range(start_i, start_i + steps)):
+            heater_on, part_load, vent_ach = controller.decide_planned(air_temp, j, plan)
+
+            ext_temp, wind_speed, Q_solar_hr = temp_all[k], wind_all[k], solar_all[k]
+            Q_heat_hr = np.where(heater_on, np.clip(part_load, 0.0, 1.0) * heater_W * HEATER_EFFICIENCY, 0.0)
+
+            if ground is not None:
+                G = (ua + inf_W_K) * (1 + WIND_COEFF * wind_speed) + vent_W_K_per_ach * vent_ach
+                for _ in range(ground_substeps):
+                    air_temp, profile = ground.step(air_temp, profile, C_air, h_ma, G, ext_temp,
+                                                    (1 - SOLAR_TO_MASS_FRAC) * Q_solar_hr + Q_heat_hr,
+                                                    SOLAR_TO_MASS_FRAC * Q_solar_hr,
+                                                    dt_hr * 3600 / ground_substeps)
+                mass_temp = profile[0]
+            elif integrator == "exact":
+                G = (ua + inf_W_K) * (1 + WIND_COEFF * wind_speed) + vent_W_K_per_ach * vent_ach
+                p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = exact_step_coefficients(
+                    C_air, C_mass, h_ma, G, ext_temp, Q_solar_hr, dt_hr * 3600)
+                air_ss  = air_free  + Q_heat_hr * g_air
+                mass_ss = mass_free + Q_heat_hr * g_mass
+                d_air, d_mass = air_temp - air_ss, mass_temp - mass_ss
+                air_temp  = air_ss  + p11 * d_air + p12 * d_mass
+                mass_temp = mass_ss + p21 * d_air + p22 * d_mass
+            else:
+                Q_solar_sub = Q_solar_hr / 4.0
+                Q_heat_sub  = Q_heat_hr  / 4.0
+                for _ in range(4):
+                    Q_loss = heat_loss(air_temp, ext_temp, wind_speed) / 4.0
+                    Q_vent = venting_loss(air_temp, ext_temp, vent_ach) / 4.0
+
+                    q_to_mass = SOLAR_TO_MASS_FRAC * Q_solar_sub
+                    q_to_air  = (1 - SOLAR_TO_MASS_FRAC) * Q_solar_sub
+                    mass_temp = mass.update_temperature(q_to_mass, air_temp, mass_temp)
+
+                    q_exchange = h_ma * (mass_temp - air_temp)
+                    q_net_air  = q_to_air + Q_heat_sub + q_exchange - Q_loss - Q_vent
+                    air_temp   = air_temp + q_net_air * SUB_DT_S / C_total
+
+            out["T_air"][:, j]      = air_temp
+            out["T_mass"][:, j]     = mass_temp
+            out["heater_on"][:, j]  = heater_on
+            out["part_load"][:, j]  = part_load
+            out["vent_ach"][:, j]   = vent_ach
+            out["Q_solar"][:, j]    = Q_solar_hr
+            out["Q_heat"][:, j]     = Q_heat_hr
+            out["Q_loss"][:, j]     = heat_loss(air_temp, ext_temp, wind_speed)
+            if integrator == "exact" or ground is not None:
+                out["Q_vent"][:, j] = vent_W_K_per_ach * vent_ach * (air_temp - ext_temp)
+            else:
+                out["Q_vent"][:, j] = venting_loss(air_temp, ext_temp, vent_ach)
+            out["Q_exchange"][:, j] = h_ma * (mass_temp - air_temp)
+
+        index = forecast_df.index[start_i : start_i + steps]
+        logger.info(f"Ensemble simulation completed: {members} members x {steps} steps")
+        return EnsembleResult(index=index, fields=out, ground_profile=None if profile is None else profile.T)
     
 # load_dotenv()
 # WEATHER_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
@@ -301,6 +778,9 @@ def create_example_config(city: str = "Pittsburgh", state: str = "PA", country:
 
 
 if __name__ == "__main__":
+    from forecast import get_geocode, get_hourly_forecast
+    logging.basicConfig(level=logging.INFO)
+
     # ------------------------------------------------------------------
     # 0 · Dummy 5-hour forecast  ---------------------------------------
     # ------------------------------------------------------------------
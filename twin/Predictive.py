@@ -1,5 +1,58 @@
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+@lru_cache(maxsize=256)
+def _one_node_step(U_W_K: float, C_J_K: float, dt_hr: float) -> tuple[float, float, float]:
+    """
+    Collapse the controller's one-step update into T' = beta·T + u, with
+    u = (1 - beta)·T_ext + gain·Q_solar. Returns (alpha, beta, gain).
+    """
+    dt_s = dt_hr * 3600
+    alpha = float(np.exp(-U_W_K * dt_s / C_J_K))
+    gain = dt_s / C_J_K
+    return alpha, alpha - U_W_K * gain, gain
+
+
+def free_response(beta: float, gain: float, T_ext, Q_sol, horizon: int):
+    """
+    No-heat trajectories for every decision window in one pass.
+
+    Row i of the returned `F` is the forced part of the prediction that
+    starts at hour i, so the trajectory from air temperature T0 is
+    `T0 * powers + F[i]`. Windows that run past the end of the forecast
+    are shortened, with NaN in the missing slots; `T_ext_min[i]` is the
+    coldest exterior temperature inside window i.
+    """
+    T_ext = np.asarray(T_ext, dtype=float)
+    Q_sol = np.asarray(Q_sol, dtype=float)
+    n = len(T_ext)
+    pad = np.zeros(horizon - 1)
+
+    u = np.concatenate([(1 - beta) * T_ext + gain * Q_sol, pad])
+    windows = sliding_window_view(u, horizon)[:n]
+
+    # lower-triangular Toeplitz filter: F[:, k] = Σ_{j<k} beta^(k-1-j) u[j]
+    powers = beta ** np.arange(horizon)
+    lag = np.arange(horizon)[:, None] - 1 - np.arange(horizon)[None, :]
+    kernel = np.where(lag >= 0, beta ** np.maximum(lag, 0), 0.0)
+    F = windows @ kernel.T
+
+    valid = np.arange(horizon)[None, :] < (n - np.arange(n))[:, None]
+    F[~valid] = np.nan
+    T_ext_min = sliding_window_view(np.concatenate([T_ext, pad + np.inf]), horizon)[:n].min(axis=1)
+    return F, powers, T_ext_min
+
+
+@dataclass
+class FreeResponsePlan:
+    """Precomputed no-heat predictions for a run (see `free_response`)."""
+    F: np.ndarray                # (windows, H) or (groups, windows, H)
+    powers: np.ndarray           # (H,) or (groups, H)
+    T_ext_min: np.ndarray        # (windows,)
+    group: np.ndarray | None = None   # member -> row of F, batch plans only
 
 @dataclass
 class Predictive:
@@ -12,19 +65,38 @@ class Predictive:
     deadband: float = 3.0        # ± band around set-point
     safety_margin: float = 0.5   # extra °C buffer
 
+    min_on_steps: int = 3        # minimum run once switched on    [steps]
+    min_off_steps: int = 3       # minimum rest once switched off  [steps]
+
+    # decision memory; owned by one run (see `fresh`)
     _heater_state: bool = False  # remembers last heater ON/OFF
+    _on_timer: int = 0
+    _off_timer: int = 0
 
-    min_on_steps = 3
-    min_off_steps = 3
-    _on_timer = 0
-    _off_timer = 0
+    @classmethod
+    def from_coefficients(cls, coeffs, **settings) -> "Predictive":
+        """
+        Build the controller's one-node model from a GreenhouseCoefficients
+        block: air + mass capacity against envelope, leakage and mass film.
+        """
+        return cls(
+            C_J_K=coeffs.C_total_J_K,
+            U_W_K=coeffs.ua_envelope_W_K + coeffs.infiltration_W_K + coeffs.h_ma_W_K,
+            heater_W=coeffs.heater_W,
+            vent_max_ach=coeffs.vent_max_ach,
+            **settings,
+        )
+
+    def fresh(self) -> "Predictive":
+        """Same settings with the decision memory reset, for a new run."""
+        return replace(self, _heater_state=False, _on_timer=0, _off_timer=0)
 
     def decide(self, air_temp, forecast_df):
         T_ext = forecast_df["temp"]
         Q_sol = forecast_df["Q_solar"]
         H = len(T_ext)
         dt_s = self.dt_hr * 3600
-        alpha  = np.exp(-self.U_W_K * dt_s / self.C_J_K)
+        alpha, _, _ = _one_node_step(self.U_W_K, self.C_J_K, self.dt_hr)
 
         # Simplified thermal physics prediction
         T_pred_off = np.empty(H)
@@ -40,13 +112,26 @@ class Predictive:
                 (T_pred_off[k-1] - T_ext[k-1]) * alpha +
                 net_W * dt_s / self.C_J_K
             )
-        
+
+        return self._decide_from_prediction(air_temp, T_pred_off, T_ext.min())
+
+    def plan(self, T_ext, Q_sol, horizon: int, times=None) -> FreeResponsePlan:
+        """Precompute the no-heat prediction for every window of a run (`times` is unused)."""
+        _, beta, gain = _one_node_step(self.U_W_K, self.C_J_K, self.dt_hr)
+        return FreeResponsePlan(*free_response(beta, gain, T_ext, Q_sol, horizon))
+
+    def decide_planned(self, air_temp, i: int, plan: FreeResponsePlan):
+        """Same as `decide` for window `i` of `plan`, without the horizon loop."""
+        T_pred_off = air_temp * plan.powers + plan.F[i]
+        return self._decide_from_prediction(air_temp, T_pred_off, plan.T_ext_min[i])
+
+    def _decide_from_prediction(self, air_temp, T_pred_off, T_ext_min):
         low_band = self.T_set - self.deadband / 2 - self.safety_margin
         drop_idx = np.argmax(T_pred_off < low_band)
         need_heat: bool = bool(drop_idx != 0)
 
         # Warm up 
-        tau = self.C_J_K / (self.U_W_K + self.heater_W / (self.T_set - T_ext.min() + 1e-6))
+        tau = self.C_J_K / (self.U_W_K + self.heater_W / (self.T_set - T_ext_min + 1e-6))
         lead_steps = int(np.ceil(tau / self.dt_hr))
 
         # decision
@@ -78,3 +163,124 @@ class Predictive:
         vent_ach = self.vent_max_ach if need_vent else 0.0
 
         return heater_on, part_load, vent_ach
+
+
+@dataclass
+class PredictiveBatch:
+    """
+    Runs the `Predictive.decide` rule for many controllers at once.
+    Every parameter and timer is an array with one entry per member,
+    so an ensemble advances with a handful of NumPy operations per hour.
+    """
+    C_J_K: np.ndarray
+    U_W_K: np.ndarray
+    heater_W: np.ndarray
+    vent_max_ach: np.ndarray
+    dt_hr: np.ndarray
+    T_set: np.ndarray
+    deadband: np.ndarray
+    safety_margin: np.ndarray
+    min_on_steps: np.ndarray
+    min_off_steps: np.ndarray
+
+    heater_state: np.ndarray
+    on_timer: np.ndarray
+    off_timer: np.ndarray
+
+    @classmethod
+    def from_controllers(cls, controllers: list[Predictive]) -> "PredictiveBatch":
+        """Stack scalar controllers, copying their current timer state."""
+        def col(name, dtype=float):
+            return np.array([getattr(c, name) for c in controllers], dtype=dtype)
+
+        return cls(
+            C_J_K=col("C_J_K"),
+            U_W_K=col("U_W_K"),
+            heater_W=col("heater_W"),
+            vent_max_ach=col("vent_max_ach"),
+            dt_hr=col("dt_hr"),
+            T_set=col("T_set"),
+            deadband=col("deadband"),
+            safety_margin=col("safety_margin"),
+            min_on_steps=col("min_on_steps", int),
+            min_off_steps=col("min_off_steps", int),
+            heater_state=col("_heater_state", bool),
+            on_timer=col("_on_timer", int),
+            off_timer=col("_off_timer", int),
+        )
+
+    def fresh(self) -> "PredictiveBatch":
+        """Same settings with every member's decision memory reset, for a new run."""
+        shape = np.shape(self.T_set)
+        return replace(self, heater_state=np.zeros(shape, dtype=bool), on_timer=np.zeros(shape, dtype=int),
+                       off_timer=np.zeros(shape, dtype=int))
+
+    def decide(self, air_temps, forecast_df):
+        T_ext = np.asarray(forecast_df["temp"], dtype=float)
+        Q_sol = np.asarray(forecast_df["Q_solar"], dtype=float)
+        H = len(T_ext)
+        dt_s = self.dt_hr * 3600
+        alpha = np.exp(-self.U_W_K * dt_s / self.C_J_K)
+
+        # Same open-loop prediction as the scalar rule, one column per hour
+        T_pred_off = np.empty((len(air_temps), H))
+        T_pred_off[:, 0] = air_temps
+        for k in range(1, H):
+            net_W = Q_sol[k-1] - self.U_W_K * (T_pred_off[:, k-1] - T_ext[k-1])
+            T_pred_off[:, k] = (
+                T_ext[k-1] +
+                (T_pred_off[:, k-1] - T_ext[k-1]) * alpha +
+                net_W * dt_s / self.C_J_K
+            )
+
+        return self._decide_from_prediction(air_temps, T_pred_off, T_ext.min())
+
+    def plan(self, T_ext, Q_sol, horizon: int, times=None) -> FreeResponsePlan:
+        """
+        Precompute no-heat predictions for every window (`times` is unused). Members whose
+        one-node model is identical share a single row of trajectories.
+        """
+        steps = [_one_node_step(U, C, dt) for U, C, dt in zip(self.U_W_K, self.C_J_K, self.dt_hr)]
+        beta_gain = np.array([(beta, gain) for _, beta, gain in steps])
+        unique, group = np.unique(beta_gain, axis=0, return_inverse=True)
+
+        F, powers = [], []
+        for beta, gain in unique:
+            F_g, powers_g, T_ext_min = free_response(beta, gain, T_ext, Q_sol, horizon)
+            F.append(F_g)
+            powers.append(powers_g)
+        return FreeResponsePlan(np.stack(F), np.stack(powers), T_ext_min, group.ravel())
+
+    def decide_planned(self, air_temps, i: int, plan: FreeResponsePlan):
+        """Same as `decide` for window `i` of `plan`, without the horizon loop."""
+        T_pred_off = air_temps[:, None] * plan.powers[plan.group] + plan.F[plan.group, i]
+        return self._decide_from_prediction(air_temps, T_pred_off, plan.T_ext_min[i])
+
+    def _decide_from_prediction(self, air_temps, T_pred_off, T_ext_min):
+        low_band = self.T_set - self.deadband / 2 - self.safety_margin
+        drop_idx = np.argmax(T_pred_off < low_band[:, None], axis=1)
+        need_heat = drop_idx != 0
+
+        with np.errstate(divide="ignore"):
+            tau = self.C_J_K / (self.U_W_K + self.heater_W / (self.T_set - T_ext_min + 1e-6))
+        lead_steps = np.ceil(tau / self.dt_hr)
+
+        heater_on = need_heat & (drop_idx <= lead_steps)
+
+        was_on = self.heater_state
+        self.on_timer  = np.where(was_on, self.on_timer + 1, 0)
+        self.off_timer = np.where(was_on, 0, self.off_timer + 1)
+        heater_on = np.where(was_on & (self.on_timer < self.min_on_steps), True, heater_on)
+        heater_on = np.where(~was_on & (self.off_timer < self.min_off_steps), False, heater_on)
+
+        heater_on = np.where(was_on & (air_temps > self.T_set + self.deadband / 2), False, heater_on)
+        heater_on = np.where(~was_on & (air_temps < self.T_set - self.deadband / 2), True, heater_on)
+
+        self.heater_state = heater_on
+        part_load = heater_on.astype(float)
+
+        hi_band = self.T_set + self.deadband / 2 + 5
+        need_vent = (T_pred_off > hi_band[:, None]).any(axis=1)
+        vent_ach = np.where(need_vent, self.vent_max_ach, 0.0)
+
+        return heater_on, part_load, vent_ach
@@ -5,6 +5,14 @@ import numpy as np
 """
 The ThermalMass class calculates the changes in internal
 temperature based on the heat exchange at the given step intervals.
+
+The LayeredGround class replaces the single mass node with a 1-D column
+of soil under the floor: thin layers at the surface growing with depth
+down to a boundary held at the deep-ground temperature. The surface
+layer also carries the footings and benches and exchanges heat with the
+air through the mass film conductance. Air and layers form one chain, so
+each implicit step is a tridiagonal solve (`thomas_solve`) that costs
+O(layers) per member and runs for every ensemble member at once.
 """
 
 # Constants
@@ -12,7 +20,8 @@ HEAT_EXCHANGE_RATE = 50.0 # Watts/Kelvin
 
 class ThermalMass:
     def __init__(self, mass_kg, specific_heat, initial_temp: float = 20.0):
-        assert mass_kg > 0 and specific_heat > 0
+        # arrays are accepted so one instance can carry an ensemble of masses
+        assert np.all(np.asarray(mass_kg) > 0) and np.all(np.asarray(specific_heat) > 0)
 
         self.mass_kg = mass_kg
         self.specific_heat = specific_heat
@@ -25,3 +34,124 @@ class ThermalMass:
         total_heat_input_joules = heat_input_watts * step_seconds + heat_exchange_joules
         temp_change_C = total_heat_input_joules / (self.mass_kg * self.specific_heat)
         return air_temp + temp_change_C
+
+# ────────────── LAYERED GROUND ──────────────────────────────────────────
+SOIL_CONDUCTIVITY_W_M_K = 1.2           # moist soil
+SOIL_HEAT_J_M3_K        = 1600 * 920    # density × specific heat
+DEEP_GROUND_TEMP_C      = 10.0          # ≈ annual mean air temperature
+GROUND_DEPTH_M          = 10.0          # below the annual penetration depth
+GROUND_LAYERS           = 24
+LAYER_GROWTH            = 1.25          # thickness ratio of neighbouring layers
+
+def thomas_solve(lower, diag, upper, rhs):
+    """
+    Solve tridiagonal systems along the last axis; leading axes are
+    independent systems. lower[..., 0] and upper[..., -1] are ignored.
+    """
+    n = diag.shape[-1]
+    c = np.empty(np.broadcast_shapes(diag.shape, rhs.shape))
+    d = np.empty_like(c)
+    c[..., 0] = upper[..., 0] / diag[..., 0]
+    d[..., 0] = rhs[..., 0] / diag[..., 0]
+    for i in range(1, n):
+        denom = diag[..., i] - lower[..., i] * c[..., i - 1]
+        c[..., i] = upper[..., i] / denom if i < n - 1 else 0.0
+        d[..., i] = (rhs[..., i] - lower[..., i] * d[..., i - 1]) / denom
+    x = d
+    for i in range(n - 2, -1, -1):
+        x[..., i] -= c[..., i] * x[..., i + 1]
+    return x
+
+class LayeredGround:
+    def __init__(self, area_m2: float, thicknesses, conductivity: float = SOIL_CONDUCTIVITY_W_M_K,
+                 heat_J_m3_K: float = SOIL_HEAT_J_M3_K, surface_extra_J_K: float = 0.0,
+                 deep_temp_C: float = DEEP_GROUND_TEMP_C):
+        self.thicknesses = np.asarray(thicknesses, dtype=float)
+        self.depths = np.cumsum(self.thicknesses) - self.thicknesses / 2      # layer centres [m]
+        self.C = heat_J_m3_K * area_m2 * self.thicknesses
+        self.C[0] += surface_extra_J_K
+        # between layer centres, and from the last centre to the deep boundary
+        self.g = conductivity * area_m2 / ((self.thicknesses[:-1] + self.thicknesses[1:]) / 2)
+        self.g_deep = conductivity * area_m2 / (self.thicknesses[-1] / 2)
+        self.deep_temp_C = deep_temp_C
+        self._factor_key = None
+
+    @staticmethod
+    def graded(depth_m: float = GROUND_DEPTH_M, layers: int = GROUND_LAYERS, growth: float = LAYER_GROWTH):
+        """Layer thicknesses growing by `growth` per layer and summing to `depth_m`."""
+        scale = growth ** np.arange(layers)
+        return depth_m * scale / scale.sum()
+
+    def __len__(self) -> int:
+        return len(self.C)
+
+    @property
+    def C_total_J_K(self) -> float:
+        return float(self.C.sum())
+
+    def initial_profile(self, surface_temp, members: int | None = None) -> np.ndarray:
+        """(layers, members) profile from the surface temperature down to the deep temperature."""
+        surface = np.atleast_1d(np.asarray(surface_temp, dtype=float))
+        if members is not None:
+            surface = np.broadcast_to(surface, (members,))
+        bottom = self.depths[-1] + self.thicknesses[-1] / 2
+        frac = (self.depths - self.depths[0]) / (bottom - self.depths[0])
+        return surface[None, :] * (1 - frac[:, None]) + self.deep_temp_C * frac[:, None]
+
+    def _factor(self, h_ma, dt_s: float, members: int):
+        """
+        Thomas forward-elimination factors of the ground block (layers
+        with the air link on the surface), which only changes with h_ma
+        and dt, plus its response z = A⁻¹·e₁ to a unit surface source.
+        """
+        key = (dt_s, members, np.asarray(h_ma, dtype=float).tobytes())
+        if self._factor_key != key:
+            n = len(self.C)
+            lower = np.concatenate([[0.0], -self.g])[:, None] * np.ones(members)
+            upper = np.concatenate([-self.g, [0.0]])[:, None] * np.ones(members)
+            diag = (self.C / dt_s + np.concatenate([[0.0], self.g]) + np.concatenate([self.g, [self.g_deep]]))[:, None] \
+                + np.zeros(members)
+            diag[0] += h_ma
+            c, inv = np.empty((n, members)), np.empty((n, members))
+            inv[0] = 1 / diag[0]
+            c[0] = upper[0] * inv[0]
+            for i in range(1, n):
+                inv[i] = 1 / (diag[i] - lower[i] * c[i - 1])
+                c[i] = upper[i] * inv[i]
+            self._factor_key, self._factors = key, (lower, c, inv)
+            unit = np.zeros((n, members))
+            unit[0] = 1.0
+            self._z = self._sweep(unit)
+        return self._z
+
+    def _sweep(self, rhs: np.ndarray) -> np.ndarray:
+        """Solve the factored ground block for `rhs` (layers, members): the two Thomas sweeps."""
+        lower, c, inv = self._factors
+        x = np.empty_like(rhs)
+        x[0] = rhs[0] * inv[0]
+        for i in range(1, len(x)):
+            x[i] = (rhs[i] - lower[i] * x[i - 1]) * inv[i]
+        for i in range(len(x) - 2, -1, -1):
+            x[i] -= c[i] * x[i + 1]
+        return x
+
+    def step(self, air_temp, profile, C_air, h_ma, G_ext, T_ext, Q_air, Q_surface, dt_s: float):
+        """
+        One backward-Euler step of air + ground for every member. Air
+        gains Q_air, loses G_ext (W K⁻¹) to T_ext and exchanges h_ma with
+        the surface layer, which also absorbs Q_surface; `profile` is
+        (layers, members) and the other arguments broadcast to
+        (members,). The air row is eliminated against the factored
+        ground block (see `_factor`), so a step is two Thomas sweeps.
+        Returns the new (air_temp, profile).
+        """
+        z = self._factor(h_ma, dt_s, profile.shape[1])
+        rhs = (self.C / dt_s)[:, None] * profile
+        rhs[0] += Q_surface
+        rhs[-1] += self.g_deep * self.deep_temp_C
+        y = self._sweep(rhs)
+
+        # air row: (C_air/dt + G + h)·Ta - h·T1 = C_air/dt·Ta⁰ + G·T_ext + Q_air, with T = y + h·Ta·z
+        air = (C_air / dt_s * air_temp + G_ext * T_ext + Q_air + h_ma * y[0]) \
+            / (C_air / dt_s + G_ext + h_ma - h_ma * h_ma * z[0])
+        return air, y + (h_ma * air) * z
@@ -0,0 +1,333 @@
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from GreenhouseEngine import (AIR_DENSITY, BAMBOO_MASS_KG, HEATER_EFFICIENCY, SOLAR_TO_MASS_FRAC, WIND_COEFF,
+                              ControllerFleet, GreenhouseConfig)
+from Predictive import PredictiveBatch
+
+"""
+The ThermalNetwork class is a multi-zone version of the engine's
+air/mass model. Every node has a heat capacity; nodes are joined by
+conductances, and some nodes also exchange heat with the exterior
+through wind-dependent, fixed and per-air-change (vent) conductances.
+`from_config` builds one from GreenhouseConfig geometry: zones along
+the house, stacked air layers in each, wall and roof glazing, the floor
+slab and the benches. `two_node` builds the lumped air/mass pair, so the
+current engine is the one-zone, one-layer special case.
+
+Each step is implicit (backward Euler) and solved with a sparse LU
+factorization of (C/dt + K + G_ext). The matrix only changes with wind
+and vent opening. Wind is continuous, so the matrix is factored only at
+wind speeds on a WIND_GRID_M_S grid; the small diagonal remainder
+between the grid point and the actual wind is moved to the right-hand
+side and removed with a few back-substitutions (CORRECTION_SWEEPS), each
+of which shrinks the error by that remainder's share of the diagonal,
+a few percent. A forecast therefore needs one factorization per (grid
+wind, vent opening, dt) pair, reused across hours, sub-steps and
+ensemble members, which are solved together as columns of one
+right-hand side. For a network with a bounded number of neighbours per
+node the factor has near-linear size, so the per-step cost grows about
+linearly with the node count.
+"""
+
+logger = logging.getLogger(__name__)
+
+# ────────────── CONSTANTS (SI) ──────────────────────────────────────────
+AIR_MIX_W_M2_K        = 100.0        # convective mixing between adjacent air layers/zones
+GLAZING_HEAT_J_M2_K   = 5_000.0      # glazing sheet heat capacity per area
+BENCH_AREA_FRAC       = 0.40         # bench top area / floor area
+CP_AIR_J_KG_K         = 1005
+FACTOR_CACHE_SIZE     = 64
+WIND_GRID_M_S         = 1.0          # wind speeds at which the step matrix is factored
+CORRECTION_SWEEPS     = 3            # back-substitutions for the off-grid wind remainder
+
+@dataclass
+class NetworkResult:
+    index: pd.Index
+    names: list[str]
+    T: np.ndarray                # (steps, nodes, members) node temperatures at the end of each step
+    T_air: np.ndarray            # (steps, members) sensed air temperature
+    part_load: np.ndarray        # (steps, members)
+    vent_ach: np.ndarray         # (steps, members)
+
+    def node(self, name: str) -> np.ndarray:
+        """(steps, members) temperature of one node."""
+        return self.T[:, self.names.index(name)]
+
+    def frame(self, member: int = 0) -> pd.DataFrame:
+        """One member as a DataFrame: a column per node plus T_air, part_load and vent_ach."""
+        df = pd.DataFrame(self.T[:, :, member], index=self.index, columns=self.names)
+        df["T_air"] = self.T_air[:, member]
+        df["part_load"] = self.part_load[:, member]
+        df["vent_ach"] = self.vent_ach[:, member]
+        df.index.name = "datetime"
+        return df
+
+class ThermalNetwork:
+    def __init__(self):
+        self.names: list[str] = []
+        self._C: list[float] = []
+        self._edges: list[tuple[int, int, float]] = []
+        self._G_wind: list[float] = []     # to exterior, scaled by (1 + WIND_COEFF·wind)
+        self._G_vent: list[float] = []     # to exterior per air change per hour
+        self._solar: list[float] = []      # share of solar gain
+        self._heater: list[float] = []     # share of heater output
+        self._sensor: list[float] = []     # weight in the sensed air temperature
+        self._compiled = None
+        self._factors: OrderedDict = OrderedDict()
+
+    # ────────────── ASSEMBLY ─────────────────────────────────────────────
+    def add_node(self, name: str, C_J_K: float, G_ext_W_K: float = 0.0, G_vent_W_K_per_ach: float = 0.0,
+                 solar_share: float = 0.0, heater_share: float = 0.0, sensor_weight: float = 0.0) -> int:
+        if name in self.names:
+            raise ValueError(f"Duplicate node {name!r}")
+        if C_J_K <= 0:
+            raise ValueError(f"Node {name!r} needs a positive heat capacity, got {C_J_K}")
+        self.names.append(name)
+        self._C.append(C_J_K)
+        self._G_wind.append(G_ext_W_K)
+        self._G_vent.append(G_vent_W_K_per_ach)
+        self._solar.append(solar_share)
+        self._heater.append(heater_share)
+        self._sensor.append(sensor_weight)
+        self._compiled = None
+        return len(self.names) - 1
+
+    def connect(self, a: str, b: str, G_W_K: float) -> None:
+        """Conductance between two nodes."""
+        self._edges.append((self.names.index(a), self.names.index(b), G_W_K))
+        self._compiled = None
+
+    def _compile(self):
+        if self._compiled is None:
+            n = len(self.names)
+            i, j, g = (np.array(v) for v in zip(*self._edges)) if self._edges else (np.zeros(0, int),) * 2 + (np.zeros(0),)
+            # conductance Laplacian: +g on both diagonals, -g off the diagonal
+            K = sp.coo_matrix((np.concatenate([g, g, -g, -g]),
+                               (np.concatenate([i, j, i, j]), np.concatenate([i, j, j, i]))), shape=(n, n)).tocsc()
+            sensor = np.array(self._sensor, dtype=float)
+            self._compiled = {
+                "C": np.array(self._C, dtype=float), "K": K,
+                "G_wind": np.array(self._G_wind, dtype=float), "G_vent": np.array(self._G_vent, dtype=float),
+                "solar": np.array(self._solar, dtype=float), "heater": np.array(self._heater, dtype=float),
+                "sensor": sensor / sensor.sum() if sensor.sum() else sensor,
+            }
+            self._factors.clear()
+        return self._compiled
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ────────────── BUILDERS ─────────────────────────────────────────────
+    @classmethod
+    def two_node(cls, coeffs) -> "ThermalNetwork":
+        """The engine's lumped air/mass pair from a GreenhouseCoefficients block."""
+        net = cls()
+        net.add_node("air", coeffs.C_air_J_K, G_ext_W_K=coeffs.ua_total_W_K + coeffs.infiltration_W_K,
+                     G_vent_W_K_per_ach=coeffs.vent_W_K_per_ach, solar_share=1 - SOLAR_TO_MASS_FRAC,
+                     heater_share=1.0, sensor_weight=1.0)
+        net.add_node("mass", coeffs.C_mass_J_K, solar_share=SOLAR_TO_MASS_FRAC)
+        net.connect("air", "mass", coeffs.h_ma_W_K)
+        return net
+
+    @classmethod
+    def from_config(cls, cfg: GreenhouseConfig, zones: int = 1, air_layers: int = 3) -> "ThermalNetwork":
+        """
+        Network for `cfg`: `zones` slices along the length, each with
+        `air_layers` stacked air nodes, a wall-glazing node per layer, a
+        roof-glazing node above the top layer, and floor and bench mass
+        nodes under the bottom layer. Totals (envelope UA, leakage, vent
+        conductance, heat capacities, film conductance) match
+        `cfg.coefficients()`; glazing sits between an inner and an outer
+        half of its R-value, and only the outer half feels the wind.
+        """
+        k = cfg.coefficients()
+        net = cls()
+        nz, nl = zones, air_layers
+        share = 1 / (nz * nl)                                   # of the air volume per air node
+        zone_floor_A = cfg.floor_A / nz
+        layer_h = cfg.volume_m3 / cfg.floor_A / nl
+        bench_A = BENCH_AREA_FRAC * zone_floor_A
+        floor_frac = zone_floor_A / (zone_floor_A + bench_A)
+        concrete_soil_kg = k.mass_kg - BAMBOO_MASS_KG
+
+        for z in range(nz):
+            for l in range(nl):
+                air = f"air_z{z}_l{l}"
+                opaque = cfg.wall_A / cfg.wall_R * share
+                if l == nl - 1:
+                    opaque += cfg.roof_A / cfg.roof_R / nz
+                if l == 0:
+                    opaque += cfg.floor_A / cfg.floor_R / nz
+                net.add_node(air, AIR_DENSITY * cfg.volume_m3 * share * CP_AIR_J_KG_K,
+                             G_ext_W_K=opaque + k.infiltration_W_K * share,
+                             G_vent_W_K_per_ach=k.vent_W_K_per_ach * share,
+                             solar_share=(1 - SOLAR_TO_MASS_FRAC) * share,
+                             heater_share=share, sensor_weight=share)
+
+                wall_A = cfg.wall_A * share
+                glazing = f"wall_glazing_z{z}_l{l}"
+                net.add_node(glazing, GLAZING_HEAT_J_M2_K * wall_A, G_ext_W_K=2 * wall_A / cfg.glazing_R)
+                net.connect(air, glazing, 2 * wall_A / cfg.glazing_R)
+                if l:
+                    net.connect(air, f"air_z{z}_l{l - 1}", AIR_MIX_W_M2_K * zone_floor_A)
+                if z:
+                    net.connect(air, f"air_z{z - 1}_l{l}", AIR_MIX_W_M2_K * cfg.width * layer_h)
+
+            roof_A = cfg.roof_A / nz
+            net.add_node(f"roof_glazing_z{z}", GLAZING_HEAT_J_M2_K * roof_A, G_ext_W_K=2 * roof_A / cfg.glazing_R)
+            net.connect(f"air_z{z}_l{nl - 1}", f"roof_glazing_z{z}", 2 * roof_A / cfg.glazing_R)
+
+            net.add_node(f"floor_z{z}", concrete_soil_kg / nz * k.mass_c_p,
+                         solar_share=SOLAR_TO_MASS_FRAC * floor_frac / nz)
+            net.add_node(f"bench_z{z}", BAMBOO_MASS_KG / nz * k.mass_c_p,
+                         solar_share=SOLAR_TO_MASS_FRAC * (1 - floor_frac) / nz)
+            net.connect(f"air_z{z}_l0", f"floor_z{z}", k.h_ma_W_K / nz * floor_frac)
+            net.connect(f"air_z{z}_l0", f"bench_z{z}", k.h_ma_W_K / nz * (1 - floor_frac))
+        return net
+
+    # ────────────── SOLVER ───────────────────────────────────────────────
+    def _factor(self, dt_s: float, wind_factor: float, vent_ach: float):
+        """LU of (C/dt + K + G_ext) for one exterior state on the wind grid, cached."""
+        key = (dt_s, wind_factor, vent_ach)
+        if key in self._factors:
+            self._factors.move_to_end(key)
+            return self._factors[key]
+        m = self._compile()
+        G_ext = m["G_wind"] * wind_factor + m["G_vent"] * vent_ach
+        lu = splu((m["K"] + sp.diags(m["C"] / dt_s + G_ext)).tocsc())
+        self._factors[key] = (lu, G_ext)
+        if len(self._factors) > FACTOR_CACHE_SIZE:
+            self._factors.popitem(last=False)
+        return lu, G_ext
+
+    def step(self, T, T_ext: float, wind: float, Q_solar: float, Q_heat, vent_ach, dt_s: float) -> np.ndarray:
+        """
+        Advance node temperatures `T` (nodes, members) by `dt_s` seconds.
+        `Q_heat` and `vent_ach` are per member; members sharing a vent
+        opening share one factorization and are solved together.
+        """
+        m = self._compile()
+        grid_wind = WIND_GRID_M_S * round(wind / WIND_GRID_M_S)
+        wind_factor = 1 + WIND_COEFF * grid_wind
+        # conductance the grid factor leaves out; exact when the wind is on the grid
+        G_rest = m["G_wind"] * (WIND_COEFF * (wind - grid_wind))
+        vent_ach = np.broadcast_to(np.asarray(vent_ach, dtype=float), T.shape[1:])
+        Q_heat = np.broadcast_to(np.asarray(Q_heat, dtype=float), T.shape[1:])
+        rhs = (m["C"] / dt_s)[:, None] * T + m["solar"][:, None] * Q_solar + m["heater"][:, None] * Q_heat
+        rhs += (G_rest * T_ext)[:, None]
+        out = np.empty_like(T)
+        for ach in np.unique(vent_ach):
+            cols = vent_ach == ach
+            lu, G_ext = self._factor(dt_s, wind_factor, float(ach))
+            b = rhs[:, cols] + (G_ext * T_ext)[:, None]
+            x = lu.solve(b)
+            if G_rest.any():
+                for _ in range(CORRECTION_SWEEPS):
+                    x = lu.solve(b - G_rest[:, None] * x)
+            out[:, cols] = x
+        return out
+
+    def simulate(self, forecast_df: pd.DataFrame, initial_temps, steps: int | None = None, part_load=None,
+                 vent_ach=None, controller=None, heater_W: float = 0.0, horizon: int = 12,
+                 substeps: int = 4, dt_hr: float = 1.0) -> NetworkResult:
+        """
+        Run the network along a forecast. `initial_temps` is a scalar, a
+        (nodes,) vector or a (nodes, members) array. Actuation is either
+        prescribed (`part_load`, `vent_ach`: scalars, per step or per step
+        and member) or chosen each step by `controller` on the sensed air
+        temperature, the engine's way (`plan`/`decide_planned` when
+        available, else `decide`); with several members it must decide
+        for all of them at once (`PredictiveBatch` or `ControllerFleet`).
+        The run uses a `fresh()` copy, so the caller's controller keeps its
+        memory and every run starts from reset timers.
+        Each step is split into `substeps` implicit sub-steps.
+        """
+        m = self._compile()
+        n = len(self.names)
+        T = np.asarray(initial_temps, dtype=float)
+        T = np.broadcast_to(T if T.ndim != 1 else T[:, None], (n, 1) if T.ndim < 2 else T.shape).copy()
+        members = T.shape[1]
+        steps = len(forecast_df) if steps is None else steps
+        if controller is None and part_load is None and vent_ach is None:
+            raise ValueError("Give prescribed part_load/vent_ach or a controller")
+        if controller is not None and members > 1 and not isinstance(controller, (PredictiveBatch, ControllerFleet)):
+            raise TypeError(f"{members} members need a PredictiveBatch or ControllerFleet, "
+                            f"not a single {type(controller).__name__}")
+
+        def per_member(values):
+            values = np.asarray(0.0 if values is None else values, dtype=float)
+            return np.broadcast_to(values if values.ndim == 2 else np.broadcast_to(values, (steps,))[:, None],
+                                   (steps, members))
+
+        temp_all = forecast_df["temp"].to_numpy(dtype=float)
+        wind_all = forecast_df["wind_speed"].to_numpy(dtype=float)
+        solar_all = forecast_df["Q_solar"].to_numpy(dtype=float)
+        plan = None
+        if controller is not None:
+            controller = controller.fresh()
+            window = slice(0, steps + horizon - 1)
+            if hasattr(controller, "plan"):
+                plan = controller.plan(temp_all[window], solar_all[window], horizon, times=forecast_df.index[window])
+        else:
+            part_load, vent_ach = per_member(part_load), per_member(vent_ach)
+
+        out_T = np.empty((steps, n, members))
+        out_air = np.empty((steps, members))
+        out_part = np.empty((steps, members))
+        out_vent = np.empty((steps, members))
+        dt_s = dt_hr * 3600 / substeps
+        for k in range(steps):
+            air = m["sensor"] @ T
+            if controller is None:
+                part, vent = part_load[k], vent_ach[k]
+            else:
+                sensed = air if members > 1 else float(air[0])
+                if plan is not None:
+                    on, part, vent = controller.decide_planned(sensed, k, plan)
+                else:
+                    on, part, vent = controller.decide(sensed, {"temp": temp_all[k : k + horizon],
+                                                                "Q_solar": solar_all[k : k + horizon]})
+                part = np.where(on, np.clip(part, 0.0, 1.0), 0.0) * np.ones(members)
+                vent = np.asarray(vent, dtype=float) * np.ones(members)
+            Q_heat = part * heater_W * HEATER_EFFICIENCY
+            for _ in range(substeps):
+                T = self.step(T, temp_all[k], wind_all[k], solar_all[k], Q_heat, vent, dt_s)
+            out_T[k] = T
+            out_air[k] = m["sensor"] @ T
+            out_part[k] = part
+            out_vent[k] = vent
+
+        logger.info(f"Network simulation completed: {n} nodes x {members} members x {steps} steps")
+        return NetworkResult(index=forecast_df.index[:steps], names=list(self.names), T=out_T, T_air=out_air,
+                             part_load=out_part, vent_ach=out_vent)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    hours = 24 * 7
+    times = pd.date_range("2025-01-01", periods=hours + 12, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    forecast_df = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "wind_speed": np.abs(np.random.default_rng(0).normal(3, 1.5, len(times))),
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+    }, index=times)
+    cfg = GreenhouseConfig(40.44, -79.99)
+    heat_on = ((hour < 7) | (hour > 19)).astype(float)[:hours]
+
+    for zones, layers in [(1, 1), (4, 4), (10, 8), (25, 10), (50, 10)]:
+        net = ThermalNetwork.from_config(cfg, zones=zones, air_layers=layers)
+        t0 = time.perf_counter()
+        result = net.simulate(forecast_df, 15.0, steps=hours, part_load=heat_on, heater_W=cfg.heater_W)
+        elapsed = time.perf_counter() - t0
+        stratification = result.node(f"air_z0_l{layers - 1}") - result.node("air_z0_l0")
+        print(f"{len(net):5d} nodes: {elapsed / (hours * 4) * 1e6:7.1f} µs per sub-step, "
+              f"{len(net._factors)} factorizations, mean top-bottom ΔT {stratification.mean():+.2f} K")
@@ -0,0 +1,177 @@
+import time
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from energy import DEFAULT_PLAN, TariffPlan, energy_kwh
+from forecast import solar_gain
+
+"""
+Streaming backtests. Historical weather is read in chunks, solar gain is
+added per chunk with the same model as the live forecast, and the engine
+is stepped through chunk after chunk. Only one chunk (plus the controller
+look-ahead that overlaps the next one) is held at a time, so memory stays
+flat however many years are replayed.
+
+The air/mass temperatures carry over between chunks and the controller
+object is reused, so its heater timers carry over too; the result is the
+same as one `simulate_step` call over the whole record.
+"""
+
+HOURS_PER_YEAR = 8760
+WEATHER_COLUMNS = ("temp", "humidity", "wind_speed", "cloud_cover")
+
+def read_weather_csv(path: str, timezone: str = "UTC", chunk_hours: int = HOURS_PER_YEAR) -> Iterator[pd.DataFrame]:
+    """
+    Hourly weather from a CSV with a `datetime` column (UTC, or with an
+    offset) plus WEATHER_COLUMNS, yielded `chunk_hours` rows at a time
+    in the layout `get_hourly_weather` returns, indexed by local time.
+    """
+    for chunk in pd.read_csv(path, usecols=["datetime", *WEATHER_COLUMNS], chunksize=chunk_hours):
+        times = pd.DatetimeIndex(pd.to_datetime(chunk.pop("datetime"), utc=True)).tz_convert(timezone)
+        chunk.index = times.rename("datetime")
+        yield chunk
+
+def with_solar(chunks: Iterable[pd.DataFrame], lat: float, lon: float, cfg,
+               use_table: bool = True) -> Iterator[pd.DataFrame]:
+    """Join solar gain onto each weather chunk (see `forecast.solar_gain`)."""
+    for weather in chunks:
+        solar = solar_gain(lat, lon, weather.index, weather["cloud_cover"], cfg, use_table)
+        yield weather.join(solar, how="left")
+
+def backtest(engine, chunks: Iterable[pd.DataFrame], initial_air_temp: float, initial_mass_temp: float,
+             horizon: int = 12, integrator: str = "exact", dt_hr: float = 1.0) -> Iterator[pd.DataFrame]:
+    """
+    Run `engine` over a stream of forecast chunks, yielding one
+    `simulate_step` frame per chunk. The last `horizon - 1` rows of each
+    chunk are held back and simulated with the next one, so every
+    decision sees a full look-ahead; only the final rows of the stream
+    decide on a shortened window, as they would in a single run.
+    """
+    carry, started = None, False
+    air_temp, mass_temp = initial_air_temp, initial_mass_temp
+    for chunk in chunks:
+        frame = chunk if carry is None else pd.concat([carry, chunk])
+        steps = len(frame) - (horizon - 1)
+        if steps <= 0:
+            carry = frame
+            continue
+        out = engine.simulate_step(air_temp, mass_temp, frame, steps=steps, horizon=horizon,
+                                   integrator=integrator, dt_hr=dt_hr, carry_controller=started)
+        started = True
+        air_temp, mass_temp = out["T_air"].iloc[-1], out["T_mass"].iloc[-1]
+        carry = frame.iloc[steps:]
+        yield out
+
+    if carry is not None and len(carry):
+        yield engine.simulate_step(air_temp, mass_temp, carry, steps=len(carry), horizon=horizon,
+                                   integrator=integrator, dt_hr=dt_hr, carry_controller=started)
+
+# ────────────── RUNNING AGGREGATES ──────────────────────────────────────
+@dataclass
+class BacktestTotals:
+    hours: float = 0.0                 # simulated time, steps x dt_hr
+    heater_hours: float = 0.0
+    heater_kwh: float = 0.0
+    fan_kwh: float = 0.0
+    cost: float = 0.0
+    T_air_sum: float = 0.0
+    T_air_min: float = np.inf
+    T_air_max: float = -np.inf
+    below_band_K_h: float = 0.0        # °C·h under T_min
+    above_band_K_h: float = 0.0        # °C·h over T_max
+    end: pd.Timestamp | None = None    # last hour folded in
+    steps: int = 0
+
+    @property
+    def T_air_mean(self) -> float:
+        return self.T_air_sum / self.steps if self.steps else float("nan")
+
+    def update(self, out: pd.DataFrame, coeffs, plan: TariffPlan = DEFAULT_PLAN,
+               T_min: float = 16.5, T_max: float = 26.0, dt_hr: float = 1.0) -> None:
+        """Fold one result chunk into the totals."""
+        T_air = out["T_air"].to_numpy()
+        heat_kwh, fan_kwh = energy_kwh(out, coeffs, dt_hr)
+        self.hours += len(out) * dt_hr
+        self.steps += len(out)
+        self.heater_hours += float(out["part_load"].to_numpy().sum()) * dt_hr
+        self.heater_kwh += float(heat_kwh.sum())
+        self.fan_kwh += float(fan_kwh.sum())
+        self.cost += float((heat_kwh + fan_kwh) @ plan.rates_at(out.index))
+        self.T_air_sum += float(T_air.sum())
+        self.T_air_min = min(self.T_air_min, float(T_air.min()))
+        self.T_air_max = max(self.T_air_max, float(T_air.max()))
+        self.below_band_K_h += float(np.maximum(T_min - T_air, 0.0).sum()) * dt_hr
+        self.above_band_K_h += float(np.maximum(T_air - T_max, 0.0).sum()) * dt_hr
+        self.end = out.index[-1]
+
+def summarize(results: Iterable[pd.DataFrame], coeffs, plan: TariffPlan = DEFAULT_PLAN,
+              T_min: float = 16.5, T_max: float = 26.0, dt_hr: float = 1.0,
+              timezone: str | None = None) -> Iterator[BacktestTotals]:
+    """
+    Running totals after each result chunk (rows `dt_hr` hours apart);
+    each yield is a snapshot. `timezone` is the utility's clock for
+    `plan` (default: the results' own index).
+    """
+    if timezone is not None:
+        plan = plan.in_timezone(timezone)
+    totals = BacktestTotals()
+    for out in results:
+        totals.update(out, coeffs, plan, T_min, T_max, dt_hr)
+        yield replace(totals)
+
+def backtest_sites(sites: dict, horizon: int = 12, integrator: str = "exact",
+                   plan: TariffPlan = DEFAULT_PLAN, dt_hr: float = 1.0,
+                   timezones: dict[str, str] | None = None) -> dict[str, BacktestTotals]:
+    """
+    Final totals per site. `sites` maps a name to (engine, chunks,
+    initial_air_temp, initial_mass_temp); sites run one after another,
+    each streaming its own chunks, so memory does not grow with the fleet.
+    `timezones` maps a site to its utility's clock for `plan`.
+    """
+    totals = {}
+    for name, (engine, chunks, air_temp, mass_temp) in sites.items():
+        results = backtest(engine, chunks, air_temp, mass_temp, horizon=horizon, integrator=integrator,
+                           dt_hr=dt_hr)
+        site_totals = BacktestTotals()
+        for site_totals in summarize(results, engine.cfg.coefficients(), plan, dt_hr=dt_hr,
+                                     timezone=(timezones or {}).get(name)):
+            pass
+        totals[name] = site_totals
+    return totals
+
+
+if __name__ == "__main__":
+    import logging
+    import os
+    import tempfile
+
+    from GreenhouseEngine import GreenhouseConfig, GreenhouseThermalEngine
+
+    logging.basicConfig(level=logging.WARNING)
+    years = 20
+    times = pd.date_range("2000-01-01", periods=years * HOURS_PER_YEAR, freq="h", tz="UTC")
+    rng = np.random.default_rng(0)
+    day, hour = times.dayofyear.to_numpy(), times.hour.to_numpy()
+    weather = pd.DataFrame({
+        "datetime": times,
+        "temp": 10 - 12 * np.cos(2 * np.pi * day / 365) + 5 * np.sin(2 * np.pi * (hour - 9) / 24)
+                + rng.normal(0, 2, len(times)),
+        "humidity": 70.0,
+        "wind_speed": np.abs(rng.normal(3, 1.5, len(times))),
+        "cloud_cover": rng.uniform(0, 100, len(times)),
+    })
+    path = os.path.join(tempfile.mkdtemp(), "weather.csv")
+    weather.to_csv(path, index=False)
+
+    cfg = GreenhouseConfig(40.44, -79.99)
+    engine = GreenhouseThermalEngine(cfg, 18.0)
+    t0 = time.perf_counter()
+    chunks = with_solar(read_weather_csv(path, "US/Eastern"), cfg.latitude, cfg.longitude, cfg)
+    for totals in summarize(backtest(engine, chunks, 18.0, 18.0), cfg.coefficients(), timezone="US/Eastern"):
+        pass
+    elapsed = time.perf_counter() - t0
+    print(f"{years} years in {elapsed:.1f} s: {totals.heater_kwh:,.0f} kWh, ${totals.cost:,.0f}, "
+          f"mean {totals.T_air_mean:.1f} °C")
@@ -0,0 +1,215 @@
+import copy
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from GreenhouseEngine import (GreenhouseConfig, HEATER_EFFICIENCY, INTEGRATORS, SOLAR_TO_MASS_FRAC, SUB_DT_S,
+                              WIND_COEFF, exact_step_coefficients)
+from ThermalMass import ThermalMass
+
+"""
+Calibration of the thermal model against a sensor log. The log gives
+interior air temperature, exterior weather and the heater/vent actuation
+that was actually applied; the fit adjusts the mass film conductance,
+leak rate, soil coupling and envelope R-values until the simulated air
+temperature tracks the log.
+
+Candidates are scored as one batch: their coefficients are stacked into
+arrays and the air/mass update runs for every candidate at once, so
+each iteration costs one vectorized pass over the log. The update is
+the engine's own for the chosen `integrator`; the two integrators are
+different models (see `exact_step_coefficients`), so a fit is only
+valid when the engine is run with the integrator it was fitted with.
+"exact" takes logs at any interval; "euler" needs hourly rows. The search is a cross-entropy method in log-parameter
+space: sample a population, keep the best few, refit the sampling
+distribution to them, repeat.
+"""
+
+# config attribute -> (low, high) search bounds
+PARAMETER_BOUNDS = {
+    "h_ma_W_K":      (100.0, 6000.0),    # W K⁻¹
+    "leak_ach":      (0.05, 2.0),        # h⁻¹
+    "soil_coupling": (0.02, 1.0),        # fraction of soil mass linked
+    "wall_R":        (0.1, 2.0),         # m² K W⁻¹
+    "roof_R":        (0.1, 1.5),
+    "floor_R":       (0.3, 4.0),
+    "glazing_R":     (0.1, 0.8),
+}
+LOG_COLUMNS = ("T_air", "temp", "wind_speed", "Q_solar", "part_load", "vent_ach")
+
+def config_with(cfg: GreenhouseConfig, params: dict) -> GreenhouseConfig:
+    """Copy of `cfg` with calibration parameters applied and the mass and controller rebuilt."""
+    fitted = copy.copy(cfg)
+    for name, value in params.items():
+        if name not in PARAMETER_BOUNDS:
+            raise ValueError(f"Unknown calibration parameter {name!r}")
+        setattr(fitted, name, float(value))
+    fitted.mass_kg = fitted._build_thermal_mass_KG(fitted.num_footings)
+    fitted.controller = fitted._build_controller()
+    return fitted
+
+def log_arrays(log: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Columns of a sensor log as float arrays. `part_load` may be given as
+    a boolean `heater_on` instead; missing `vent_ach` means vents shut.
+    """
+    arrays = {name: log[name].to_numpy(dtype=float) for name in ("T_air", "temp", "wind_speed", "Q_solar")}
+    if "part_load" in log.columns:
+        arrays["part_load"] = np.clip(log["part_load"].to_numpy(dtype=float), 0.0, 1.0)
+    else:
+        arrays["part_load"] = log["heater_on"].to_numpy(dtype=float)
+    arrays["vent_ach"] = log["vent_ach"].to_numpy(dtype=float) if "vent_ach" in log.columns else np.zeros(len(log))
+    return arrays
+
+def simulate_prescribed(configs: list[GreenhouseConfig], arrays: dict, dt_hr: float,
+                        T_air0: float, T_mass0, integrator: str = "exact") -> np.ndarray:
+    """
+    Air temperature (members x steps) for each config under the logged
+    weather and actuation, advanced as `simulate_arrays` does with the
+    same `integrator`. Row k is the state at the end of step k.
+    """
+    if integrator not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator {integrator!r}; expected one of {INTEGRATORS}")
+    coeffs = [c.coefficients() for c in configs]
+
+    def col(name):
+        return np.array([getattr(k, name) for k in coeffs], dtype=float)[:, None]
+
+    if integrator == "euler":
+        if dt_hr != 1.0:
+            raise ValueError("integrator='euler' steps hourly rows; use integrator='exact' for other intervals")
+        return _simulate_prescribed_euler(col, arrays, T_air0, T_mass0)
+
+    G = (col("ua_total_W_K") + col("infiltration_W_K")) * (1 + WIND_COEFF * arrays["wind_speed"]) \
+        + col("vent_W_K_per_ach") * arrays["vent_ach"]
+    p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = exact_step_coefficients(
+        col("C_air_J_K"), col("C_mass_J_K"), col("h_ma_W_K"), G, arrays["temp"], arrays["Q_solar"], dt_hr * 3600)
+    Q_heat = arrays["part_load"] * col("heater_W") * HEATER_EFFICIENCY
+    air_ss = (air_free + Q_heat * g_air).T             # (steps, members) so each step is one row
+    mass_ss = (mass_free + Q_heat * g_mass).T
+    p11, p12, p21, p22 = (np.ascontiguousarray(np.broadcast_to(p, G.shape).T) for p in (p11, p12, p21, p22))
+
+    steps, members = air_ss.shape
+    air = np.full(members, float(T_air0))
+    mass = np.broadcast_to(np.asarray(T_mass0, dtype=float), (members,)).copy()
+    T_air = np.empty((steps, members))
+    for k in range(steps):
+        d_air, d_mass = air - air_ss[k], mass - mass_ss[k]
+        air = air_ss[k] + p11[k] * d_air + p12[k] * d_mass
+        mass = mass_ss[k] + p21[k] * d_air + p22[k] * d_mass
+        T_air[k] = air
+    return T_air.T
+
+def _simulate_prescribed_euler(col, arrays: dict, T_air0: float, T_mass0) -> np.ndarray:
+    """The engine's four 15-minute sub-steps per hourly row, for every member at once."""
+    ua, inf_W_K = col("ua_total_W_K")[:, 0], col("infiltration_W_K")[:, 0]
+    vent_W_K_per_ach, h_ma, C_total = col("vent_W_K_per_ach")[:, 0], col("h_ma_W_K")[:, 0], col("C_total_J_K")[:, 0]
+    Q_heat = arrays["part_load"] * col("heater_W") * HEATER_EFFICIENCY
+    mass_model = ThermalMass(col("mass_kg")[:, 0], col("mass_c_p")[:, 0])
+
+    members, steps = Q_heat.shape
+    air = np.full(members, float(T_air0))
+    mass = np.broadcast_to(np.asarray(T_mass0, dtype=float), (members,)).copy()
+    T_air = np.empty((members, steps))
+    for k in range(steps):
+        ext_temp = arrays["temp"][k]
+        wind_fac = 1 + WIND_COEFF * arrays["wind_speed"][k]
+        vent_W_K = vent_W_K_per_ach * arrays["vent_ach"][k]
+        Q_heat_sub = Q_heat[:, k] / 4.0
+        q_to_mass = SOLAR_TO_MASS_FRAC * arrays["Q_solar"][k] / 4.0
+        q_to_air = (1 - SOLAR_TO_MASS_FRAC) * arrays["Q_solar"][k] / 4.0
+        for _ in range(4):
+            dT = air - ext_temp
+            Q_loss = (ua * dT + inf_W_K * dT) * wind_fac / 4.0
+            Q_vent = np.where(dT >= 0, vent_W_K * dT / 4.0, 0.0)
+            mass = mass_model.update_temperature(q_to_mass, air, mass)
+            q_exchange = h_ma * (mass - air)
+            air = air + (q_to_air + Q_heat_sub + q_exchange - Q_loss - Q_vent) * SUB_DT_S / C_total
+        T_air[:, k] = air
+    return T_air
+
+@dataclass
+class CalibrationResult:
+    params: dict
+    rmse: float                              # °C over the scored part of the log
+    config: GreenhouseConfig                 # valid under the engine with `integrator`
+    T_mass0: float                           # fitted initial mass temperature
+    history: list = field(default_factory=list)   # best RMSE per iteration
+    elapsed_s: float = 0.0
+    integrator: str = "exact"
+
+def calibrate(cfg: GreenhouseConfig, log: pd.DataFrame, parameters=tuple(PARAMETER_BOUNDS),
+              population: int = 64, elite: int = 8, iterations: int = 30, warmup_hr: float = 6.0,
+              smoothing: float = 0.7, seed: int | None = 0, integrator: str = "exact") -> CalibrationResult:
+    """
+    Fit `parameters` of `cfg` to a sensor log (a DataFrame on a regular
+    time index with LOG_COLUMNS; see `log_arrays`). The first `warmup_hr`
+    hours are simulated but not scored, and the initial mass temperature
+    is fitted alongside, since it is rarely logged. The fitted config
+    reproduces the log when simulated with the same `integrator`.
+    """
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    arrays = log_arrays(log)
+    dt_hr = (log.index[1] - log.index[0]) / pd.Timedelta(hours=1)
+    scored = np.arange(len(log)) * dt_hr >= warmup_hr
+    scored &= ~np.isnan(arrays["T_air"])
+    T_air0 = arrays["T_air"][0]
+
+    # search space: log-scaled config parameters plus a linear mass offset
+    lo = np.array([np.log(PARAMETER_BOUNDS[p][0]) for p in parameters] + [-10.0])
+    hi = np.array([np.log(PARAMETER_BOUNDS[p][1]) for p in parameters] + [10.0])
+    start = [np.log(np.clip(getattr(cfg, p), *PARAMETER_BOUNDS[p])) for p in parameters]
+    mean = np.array(start + [0.0])
+    std = (hi - lo) / 4
+
+    def decode(x):
+        return {p: float(np.exp(v)) for p, v in zip(parameters, x[:-1])}
+
+    best_x, best_rmse, history = mean.copy(), np.inf, []
+    for _ in range(iterations):
+        X = np.clip(rng.normal(mean, std, size=(population, len(mean))), lo, hi)
+        X[0] = best_x                                           # keep the incumbent
+        configs = [config_with(cfg, decode(x)) for x in X]
+        T_sim = simulate_prescribed(configs, arrays, dt_hr, T_air0, T_air0 + X[:, -1], integrator)
+        rmse = np.sqrt(np.mean((T_sim[:, scored] - arrays["T_air"][scored]) ** 2, axis=1))
+
+        order = np.argsort(rmse)
+        if rmse[order[0]] < best_rmse:
+            best_x, best_rmse = X[order[0]].copy(), float(rmse[order[0]])
+        history.append(best_rmse)
+
+        elite_X = X[order[:elite]]
+        mean = smoothing * elite_X.mean(axis=0) + (1 - smoothing) * mean
+        std = smoothing * elite_X.std(axis=0) + (1 - smoothing) * std
+
+    params = decode(best_x)
+    return CalibrationResult(params=params, rmse=best_rmse, config=config_with(cfg, params),
+                             T_mass0=float(T_air0 + best_x[-1]), history=history,
+                             elapsed_s=time.perf_counter() - t0, integrator=integrator)
+
+
+if __name__ == "__main__":
+    # a week of 5-minute data from a house with known parameters, plus sensor noise
+    steps = 7 * 24 * 12
+    times = pd.date_range("2025-01-06", periods=steps, freq="5min", tz="UTC")
+    hour = (times.hour + times.minute / 60).to_numpy()
+    rng = np.random.default_rng(1)
+    log = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi) + rng.normal(0, 0.3, steps),
+        "wind_speed": np.abs(rng.normal(3, 1, steps)),
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+        "part_load": ((hour < 7) | (hour > 19)).astype(float) * 0.8,
+        "vent_ach": ((hour > 12) & (hour < 15)).astype(float) * 1.0,
+    }, index=times)
+    truth = {"h_ma_W_K": 900.0, "leak_ach": 0.6, "soil_coupling": 0.5}
+    house = config_with(GreenhouseConfig(40.44, -79.99), truth)
+    log["T_air"] = simulate_prescribed([house], log_arrays(log.assign(T_air=0.0)), 5 / 60, 15.0, 15.0)[0] \
+        + rng.normal(0, 0.1, steps)
+
+    result = calibrate(GreenhouseConfig(40.44, -79.99), log, parameters=tuple(truth))
+    print(f"{steps} steps calibrated in {result.elapsed_s:.2f} s, RMSE {result.rmse:.3f} °C")
+    for name, value in result.params.items():
+        print(f"  {name:14s} fitted {value:8.3f}   true {truth[name]:8.3f}")
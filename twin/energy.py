@@ -1,36 +1,168 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
+from dataclasses import dataclass, field, replace
+from typing import Callable, Iterable, Sequence
+
+from Coefficients import GreenhouseCoefficients
+from GreenhouseEngine import AIR_DENSITY, HEATER_EFFICIENCY
+
+"""
+Tariffs and energy accounting. A TariffPlan compiles its time-of-use
+rule once into a rate table indexed by (weekday, hour, season, holiday),
+so pricing a result is a handful of array lookups whatever its length.
+Energy comes from the simulated heater output and vent airflow, and
+several plans can be priced against the same result in one product.
+"""
 
 TOU_RATES = {
     "peak": 0.3065,
     "off_peak": 0.1243,
     "super_off_peak": 0.0787
 }
+FAN_W_PER_M3_H = 0.05       # exhaust fan specific power [W per m³ h⁻¹]
 
-def get_rate(dt: datetime) -> tuple[str, float]:
-    weekday = dt.weekday() < 5
-    hour    = dt.hour
-    if weekday and 15 <= hour <= 21:
-        return ("peak", TOU_RATES["peak"])
+def _tou_period(weekday: int, hour: int) -> str:
+    if weekday < 5 and 15 <= hour <= 21:
+        return "peak"
     elif hour >= 23 or hour <= 6:
-        return ("super off peak", TOU_RATES["super_off_peak"])
+        return "super_off_peak"
     else:
-        return ("off_peak", TOU_RATES["off_peak"])
+        return "off_peak"
+
+def get_rate(dt: datetime) -> tuple[str, float]:
+    period = _tou_period(dt.weekday(), dt.hour)
+    label = "super off peak" if period == "super_off_peak" else period
+    return (label, TOU_RATES[period])
+
+# ────────────── TARIFF PLANS ─────────────────────────────────────────────
+@dataclass
+class TariffPlan:
+    """
+    A compiled TOU schedule. `codes[weekday, hour, season, holiday]` is
+    the index of the billing period into `periods`; `rate_table` holds
+    the matching $/kWh.
+    """
+    name: str
+    periods: tuple[str, ...]
+    rates: np.ndarray                               # $/kWh per period
+    codes: np.ndarray                               # (7, 24, n_seasons, 2) int
+    season_of_month: np.ndarray                     # (12,) season index per month
+    seasons: tuple[str, ...] = ("all",)
+    holidays: np.ndarray = field(default_factory=lambda: np.array([], dtype="datetime64[D]"))
+    timezone: str | None = None                     # the schedule's clock; None: the index's own
+
+    @classmethod
+    def compile(cls, name: str, rates: dict[str, float],
+                period_of: Callable[[int, int, str, bool], str],
+                seasons: dict[int, str] | None = None,
+                holidays: Iterable = (), timezone: str | None = None) -> "TariffPlan":
+        """
+        Build a plan from a rule `period_of(weekday, hour, season, holiday)`
+        returning a key of `rates`. `seasons` maps month (1-12) to a season
+        name; months left out, or no mapping at all, fall in season "all".
+        Hours are on the clock of `timezone` (the utility's); timezone-aware
+        indexes are converted to it before the lookup. Without one, hours
+        are read on each index's own clock.
+        """
+        month_season = [(seasons or {}).get(m, "all") for m in range(1, 13)]
+        season_names = tuple(dict.fromkeys(month_season))
+        periods = tuple(rates)
+        codes = np.empty((7, 24, len(season_names), 2), dtype=np.int8)
+        for w in range(7):
+            for h in range(24):
+                for s, season in enumerate(season_names):
+                    for hol in (0, 1):
+                        codes[w, h, s, hol] = periods.index(period_of(w, h, season, bool(hol)))
+        return cls(
+            name=name,
+            periods=periods,
+            rates=np.array([rates[p] for p in periods], dtype=float),
+            codes=codes,
+            season_of_month=np.array([season_names.index(s) for s in month_season]),
+            seasons=season_names,
+            holidays=np.array(sorted(pd.to_datetime(list(holidays)).values.astype("datetime64[D]")),
+                              dtype="datetime64[D]"),
+            timezone=timezone,
+        )
+
+    @property
+    def rate_table(self) -> np.ndarray:
+        return self.rates[self.codes]
+
+    def period_codes(self, index: pd.DatetimeIndex) -> np.ndarray:
+        """
+        Billing period index for each timestamp, read on the plan's clock
+        (naive timestamps are taken to be on it already).
+        """
+        if index.tz is not None and self.timezone is not None:
+            index = index.tz_convert(self.timezone)
+        local = index.tz_localize(None) if index.tz is not None else index
+        holiday = np.isin(local.values.astype("datetime64[D]"), self.holidays)
+        season = self.season_of_month[local.month.to_numpy() - 1]
+        return self.codes[local.dayofweek.to_numpy(), local.hour.to_numpy(), season, holiday.astype(int)]
+
+    def in_timezone(self, timezone: str | None) -> "TariffPlan":
+        """The same schedule read on the clock of `timezone`."""
+        return replace(self, timezone=timezone)
+
+    def rates_at(self, index: pd.DatetimeIndex) -> np.ndarray:
+        return self.rates[self.period_codes(index)]
+
+    def period_names(self, index: pd.DatetimeIndex) -> np.ndarray:
+        return np.asarray(self.periods, dtype=object)[self.period_codes(index)]
+
+DEFAULT_PLAN = TariffPlan.compile("tou", TOU_RATES, lambda w, h, season, holiday: _tou_period(w, h))
+
+# ────────────── ENERGY ───────────────────────────────────────────────────
+def _times(sim_df: pd.DataFrame) -> pd.DatetimeIndex:
+    if "datetime" in sim_df.columns:
+        return pd.DatetimeIndex(sim_df["datetime"])
+    return pd.DatetimeIndex(sim_df.index)
+
+def energy_kwh(result, coeffs: GreenhouseCoefficients, dt_hr: float = 1.0,
+               fan_W_per_m3_h: float = FAN_W_PER_M3_H) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Electrical (heater kWh, fan kWh) per step for a simulation result:
+    a `simulate_step` frame, a `simulate_arrays` dict or an
+    `EnsembleResult`. Heater input is delivered Q_heat over the heater
+    efficiency; fans move `vent_ach` volumes of the house per hour.
+    """
+    volume_m3 = coeffs.vent_W_K_per_ach * 3600 / (AIR_DENSITY * 1005)
+    Q_heat = np.asarray(result["Q_heat"], dtype=float)
+    vent_ach = np.asarray(result["vent_ach"], dtype=float)
+    heat_kwh = Q_heat / HEATER_EFFICIENCY * dt_hr / 1000
+    fan_kwh = vent_ach * volume_m3 * fan_W_per_m3_h * dt_hr / 1000
+    return heat_kwh, fan_kwh
+
+def compare_plans(kwh: np.ndarray, index: pd.DatetimeIndex,
+                  plans: Sequence[TariffPlan] = (DEFAULT_PLAN,)) -> pd.DataFrame:
+    """
+    Total cost of `kwh` (steps, or members/sites x steps, on a shared
+    `index`) under every plan at once. One row per member, one column
+    per plan.
+    """
+    kwh = np.atleast_2d(np.asarray(kwh, dtype=float))
+    rates = np.stack([plan.rates_at(index) for plan in plans])     # (plans, steps)
+    return pd.DataFrame(kwh @ rates.T, columns=[plan.name for plan in plans])
 
 def estimate_energy(sim_df: pd.DataFrame,
                     heat_kwh_hourly: float = 2.0,
-                    vent_kwh_hourly:  float = 0.5):
-    """Add kWh & cost columns and return totals."""
-    energy     = []
-    total_cost = 0.0
-    total_kwh  = 0.0
-    for _, row in sim_df.iterrows():
-        _, rate = get_rate(row["datetime"])
-        kwh  = row["heating"] * heat_kwh_hourly + row["venting"] * vent_kwh_hourly
-        cost = kwh * rate
-        total_cost += cost
-        total_kwh  += kwh
-        energy.append({"energy_kwh": kwh, "energy_cost": cost})
-    joined = pd.concat([sim_df.reset_index(drop=True),
-                        pd.DataFrame(energy)], axis=1)
-    return joined, total_kwh, total_cost
\ No newline at end of file
+                    vent_kwh_hourly:  float = 0.5,
+                    coeffs: GreenhouseCoefficients | None = None,
+                    plan: TariffPlan = DEFAULT_PLAN):
+    """
+    Add kWh & cost columns and return totals. With `coeffs`, kWh comes
+    from the simulated `Q_heat`/`vent_ach`; otherwise from the flat
+    hourly figures times the `heating`/`venting` flags.
+    """
+    if coeffs is not None:
+        heat_kwh, fan_kwh = energy_kwh(sim_df, coeffs)
+        kwh = heat_kwh + fan_kwh
+    else:
+        kwh = (sim_df["heating"].to_numpy(dtype=float) * heat_kwh_hourly +
+               sim_df["venting"].to_numpy(dtype=float) * vent_kwh_hourly)
+    cost = kwh * plan.rates_at(_times(sim_df))
+    joined = sim_df.reset_index(drop="datetime" in sim_df.columns)
+    joined = joined.assign(energy_kwh=kwh, energy_cost=cost)
+    return joined, float(kwh.sum()), float(cost.sum())
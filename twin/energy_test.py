@@ -0,0 +1,48 @@
+# tests/test_energy.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from energy import DEFAULT_PLAN, TariffPlan, compare_plans, estimate_energy, get_rate
+
+
+# ------------------------------------------------------------------
+# 1 · Tariff plans --------------------------------------------------
+# ------------------------------------------------------------------
+def test_default_plan_matches_get_rate():
+    index = pd.date_range("2024-03-01", periods=24 * 14, freq="h", tz="US/Eastern")
+    expected = [get_rate(dt)[1] for dt in index]
+    assert np.array_equal(DEFAULT_PLAN.rates_at(index), expected)
+
+def test_seasons_and_holidays_compile_into_lookup():
+    plan = TariffPlan.compile(
+        "summer-peak", {"peak": 0.45, "off": 0.10},
+        lambda w, h, season, holiday: "peak" if season == "summer" and not holiday and w < 5 and 14 <= h < 20 else "off",
+        seasons={6: "summer", 7: "summer", 8: "summer"},
+        holidays=["2024-07-04"],
+    )
+    index = pd.DatetimeIndex(["2024-07-04 15:00", "2024-07-05 15:00", "2024-07-06 15:00", "2024-01-05 15:00"])
+    assert plan.period_names(index).tolist() == ["off", "peak", "off", "off"]
+
+
+# ------------------------------------------------------------------
+# 2 · Energy and cost -----------------------------------------------
+# ------------------------------------------------------------------
+def test_estimate_energy_flat_rates():
+    index = pd.date_range("2024-01-01", periods=48, freq="h")
+    sim_df = pd.DataFrame({"datetime": index, "heating": 1, "venting": 0})
+    joined, kwh, cost = estimate_energy(sim_df, heat_kwh_hourly=2.0)
+
+    assert kwh == pytest.approx(96.0)
+    assert cost == pytest.approx(sum(2.0 * get_rate(dt)[1] for dt in index))
+    assert joined["energy_cost"].sum() == pytest.approx(cost)
+
+def test_compare_plans_prices_every_member_at_once():
+    index = pd.date_range("2024-01-01", periods=24 * 7, freq="h")
+    kwh = np.vstack([np.ones(len(index)), 2 * np.ones(len(index))])
+    flat = TariffPlan.compile("flat", {"flat": 0.15}, lambda *_: "flat")
+    out = compare_plans(kwh, index, [DEFAULT_PLAN, flat])
+
+    assert out.shape == (2, 2)
+    assert out.loc[0, "flat"] == pytest.approx(0.15 * len(index))
+    assert out.loc[1, "tou"] == pytest.approx(2 * DEFAULT_PLAN.rates_at(index).sum())
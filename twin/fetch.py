@@ -0,0 +1,186 @@
+import json
+import time
+import hashlib
+import random
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+import pandas as pd
+
+import forecast
+
+"""
+Concurrent forecast fetching for many sites. Requests share keep-alive
+sessions (one per worker thread), run with bounded concurrency, are
+retried with exponential backoff, and pass through a token bucket so a
+fleet stays under the provider's rate limit.
+"""
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+@dataclass(frozen=True)
+class Site:
+    name: str
+    lat: float
+    lon: float
+    timezone: str = "UTC"
+
+class FetchSitesError(Exception):
+    """Some sites failed; the frames of the others are kept in `results`."""
+    def __init__(self, results: dict[str, pd.DataFrame], errors: dict[str, BaseException]):
+        self.results = results
+        self.errors = errors
+        detail = "; ".join(f"{name}: {error!r}" for name, error in errors.items())
+        super().__init__(f"{len(errors)} of {len(results) + len(errors)} sites failed ({detail})")
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate_per_s` refill, bursts up to `capacity`."""
+    def __init__(self, rate_per_s: float, capacity: float | None = None):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_s)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate_per_s
+            time.sleep(wait_s)
+
+class ForecastFetcher:
+    def __init__(self, max_workers: int = 8, rate_per_s: float = 10.0, burst: float | None = None,
+                 retries: int = 3, backoff_s: float = 0.5, use_cache: bool = True,
+                 forecast_url: str = forecast.FORECAST_BASE_URL, api_key: str | None = None):
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.use_cache = use_cache
+        self.forecast_url = forecast_url
+        self.api_key = api_key if api_key is not None else forecast.get_api_key()
+
+    def get_json(self, url: str, params: dict):
+        """GET through the rate limiter, retrying transient failures."""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                response = forecast.http_session().get(url, params=params, timeout=forecast.REQUEST_TIMEOUT_S)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    raise Exception(f"Failed to fetch data ({response.status_code}): {response.text[:200]}")
+            time.sleep(self.backoff_s * 2 ** attempt * (1 + random.random()))
+
+    def fetch_payload(self, site: Site, count: int = 24) -> dict:
+        if not self.api_key:
+            raise ValueError("API key not found. Check .env file")
+        params = {"lat": site.lat, "lon": site.lon, "appid": self.api_key, "cnt": count, "units": "metric"}
+        fetch = lambda: self.get_json(self.forecast_url, params)
+        if self.use_cache:
+            return forecast.get_forecast_cache().get_or_fetch(site.lat, site.lon, count, fetch,
+                                                              source=self.cache_source)
+        return fetch()
+
+    @property
+    def cache_source(self) -> str:
+        """Cache tag of `forecast_url`; empty for the default endpoint, shared with `get_hourly_weather`."""
+        if self.forecast_url == forecast.FORECAST_BASE_URL:
+            return ""
+        return "src-" + hashlib.sha256(self.forecast_url.encode()).hexdigest()[:12]
+
+    def fetch_site(self, site: Site, cfg, count: int = 24) -> pd.DataFrame:
+        """Weather + solar for one site, as `get_hourly_forecast` returns it."""
+        payload = self.fetch_payload(site, count)
+        weather_df = forecast._parse_hourly_payload(payload, site.timezone).set_index("datetime")
+        solar_df = forecast.get_hourly_solar(site.lat, site.lon, weather_df, cfg, site.timezone, count)
+        return weather_df.join(solar_df, how="left")
+
+    def fetch_sites(self, sites: list[Site], cfg, count: int = 24,
+                    return_exceptions: bool = False) -> dict[str, pd.DataFrame | BaseException]:
+        """
+        Fetch every site concurrently. `cfg` is one GreenhouseConfig for all
+        sites or a mapping of site name to config.
+
+        Every site runs to completion whatever happens to the others. With
+        `return_exceptions` a failed site maps to its exception; otherwise
+        any failure raises `FetchSitesError`, which still carries the
+        frames of the sites that succeeded.
+        """
+        def config_for(site):
+            return cfg[site.name] if isinstance(cfg, dict) else cfg
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {site.name: pool.submit(self.fetch_site, site, config_for(site), count) for site in sites}
+            results, errors = {}, {}
+            for name, future in futures.items():
+                error = future.exception()
+                if error is None:
+                    results[name] = future.result()
+                else:
+                    errors[name] = error
+
+        if return_exceptions:
+            return {name: results.get(name, errors.get(name)) for name in futures}
+        if errors:
+            raise FetchSitesError(results, errors)
+        return results
+
+# ────────────── OFFLINE STUB SERVER ─────────────────────────────────────
+class _StubForecastHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like the real API
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        count = int(params.get("cnt", ["24"])[0])
+        start = int(time.time()) // 3600 * 3600 + 3600
+        body = json.dumps({"list": [
+            {"dt": start + 3600 * i,
+             "main": {"temp": 10.0 - 0.3 * i, "humidity": 70},
+             "wind": {"speed": 3.0},
+             "clouds": {"all": 40},
+             "weather": [{"main": "Clouds", "description": "scattered clouds"}]}
+            for i in range(count)
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve_stub_forecast(handler=_StubForecastHandler) -> tuple[ThreadingHTTPServer, str]:
+    """Start a local OpenWeather look-alike; returns (server, forecast URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/forecast/hourly?"
+
+
+if __name__ == "__main__":
+    from GreenhouseEngine import GreenhouseConfig
+
+    server, url = serve_stub_forecast()
+    sites = [Site(f"site-{i}", 35 + i * 0.1, -80 - i * 0.1, "US/Eastern") for i in range(64)]
+    fetcher = ForecastFetcher(max_workers=16, rate_per_s=1000, use_cache=False, forecast_url=url, api_key="stub")
+
+    t0 = time.perf_counter()
+    results = fetcher.fetch_sites(sites, GreenhouseConfig(40.0, -80.0), count=48)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(results)} sites in {elapsed:.2f} s ({len(results) / elapsed:.1f} sites/s)")
+    server.shutdown()
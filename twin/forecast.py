@@ -1,37 +1,228 @@
 import os
-import requests
+import json
+import time
+import logging
+import tempfile
+import threading
 import pandas as pd
-from dotenv import load_dotenv
-import pvlib
 from datetime import datetime, timedelta
-from typing import cast
+from typing import cast, Callable, TYPE_CHECKING
+from functools import lru_cache
 import numpy as np
 import math
+from geocode import get_geocode_store
+from solar_table import get_solar_table
 
-load_dotenv()
-WEATHER_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+if TYPE_CHECKING:
+    import requests
+
+# requests, pvlib and python-dotenv are imported on first use so that
+# importing this module (and the engine) stays fast and side-effect-free.
+@lru_cache(maxsize=1)
+def get_api_key() -> str | None:
+    """OpenWeather key from the environment, loading .env on first call."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("OPENWEATHERMAP_API_KEY")
+
+def __getattr__(name: str):
+    # keeps `forecast.WEATHER_API_KEY` working without reading .env at import
+    if name == "WEATHER_API_KEY":
+        return get_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+logger = logging.getLogger(__name__)
 
 FORECAST_BASE_URL = "https://pro.openweathermap.org/data/2.5/forecast/hourly?"
 WEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5/weather?"
 GEOCODE_BASE_URL = "http://api.openweathermap.org/geo/1.0/direct?"
 
+REQUEST_TIMEOUT_S = 10
+
+# ────────────── HTTP SESSIONS ───────────────────────────────────────────
+_session_local = threading.local()
+
+def http_session() -> "requests.Session":
+    """
+    Keep-alive session for the calling thread. Sessions are not shared
+    across threads, but each one pools its connections per host.
+    """
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        import requests
+        import requests.adapters
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session_local.session = session
+    return session
+
+# ────────────── FORECAST CACHE ──────────────────────────────────────────
+FORECAST_CACHE_DIR = os.getenv("FORECAST_CACHE_DIR",
+                               os.path.join(os.path.expanduser("~"), ".cache", "sankofa_twin", "forecast"))
+FORECAST_CACHE_TTL_S   = float(os.getenv("FORECAST_CACHE_TTL_S", 30 * 60))
+FORECAST_CACHE_STALE_S = float(os.getenv("FORECAST_CACHE_STALE_S", 60 * 60))
+
+def _atomic_write_json(path: str, payload) -> None:
+    """Write to a temp file in the same directory, then rename over `path`."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(payload, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ForecastCache:
+    """
+    Disk-backed cache of raw OpenWeather hourly payloads, shared by every
+    process pointing at the same directory.
+
+    Entries are keyed by rounded lat/lon, count and the UTC hour the
+    forecast was issued. Within `ttl_s` an entry is served as is; for a
+    further `stale_s` it is still served while a background thread fetches
+    a replacement. Writes go through a temp file and `os.replace`, so
+    readers never see a partial file, and each write deletes the entries
+    that have outlived `ttl_s + stale_s`.
+    """
+    def __init__(self, directory: str = FORECAST_CACHE_DIR, ttl_s: float = FORECAST_CACHE_TTL_S,
+                 stale_s: float = FORECAST_CACHE_STALE_S, precision: int = 2):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.precision = precision
+        self._lock = threading.Lock()
+        self._refreshing: dict[str, threading.Thread] = {}
+
+    def key(self, lat: float, lon: float, count: int, issue_hour: int, source: str = "") -> str:
+        """File stem for one forecast; `source` tags payloads from an endpoint other than the default."""
+        site = f"{lat:.{self.precision}f}_{lon:.{self.precision}f}_{count}_{issue_hour}"
+        return f"{source}_{site}" if source else site
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _store(self, key: str, fetch: Callable[[], dict], fetched_at: float) -> dict:
+        payload = fetch()
+        _atomic_write_json(self._path(key), {"fetched_at": fetched_at, "payload": payload})
+        self.prune(fetched_at)
+        return payload
+
+    def prune(self, now: float | None = None) -> int:
+        """
+        Delete entries that can no longer be served. An entry issued in
+        hour h was fetched by the end of that hour, so it is expired once
+        the end of h is more than `ttl_s + stale_s` ago. Returns the count.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name.startswith(".tmp-") or not name.endswith(".json"):
+                continue
+            try:
+                issue_hour = int(name[: -len(".json")].rsplit("_", 1)[1])
+            except (IndexError, ValueError):
+                continue
+            if (issue_hour + 1) * 3600 <= now - (self.ttl_s + self.stale_s):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+                except FileNotFoundError:      # another process got there first
+                    pass
+        return removed
+
+    def _refresh(self, key: str, fetch: Callable[[], dict], fetched_at: float) -> None:
+        try:
+            self._store(key, fetch, fetched_at)
+        except Exception:
+            logger.exception(f"Background refresh of forecast {key} failed; the stale entry stays in use")
+
+    def _revalidate(self, key: str, fetch: Callable[[], dict], fetched_at: float) -> None:
+        with self._lock:
+            running = self._refreshing.get(key)
+            if running is not None and running.is_alive():
+                return
+            thread = threading.Thread(target=self._refresh, args=(key, fetch, fetched_at), daemon=True)
+            self._refreshing[key] = thread
+        thread.start()
+
+    def wait(self) -> None:
+        """Block until background refreshes started by this instance finish."""
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join()
+
+    def get_or_fetch(self, lat: float, lon: float, count: int, fetch: Callable[[], dict],
+                     now: float | None = None, source: str = "") -> dict:
+        now = time.time() if now is None else now
+        issue_hour = int(now // 3600)
+        key = self.key(lat, lon, count, issue_hour, source)
+
+        # the previous hour's forecast may still serve while this hour's is fetched
+        for candidate in (key, self.key(lat, lon, count, issue_hour - 1, source)):
+            entry = self._read(candidate)
+            if entry is None:
+                continue
+            age = now - entry["fetched_at"]
+            if candidate == key and age < self.ttl_s:
+                return entry["payload"]
+            if age < self.ttl_s + self.stale_s:
+                self._revalidate(key, fetch, now)
+                return entry["payload"]
+
+        return self._store(key, fetch, now)
+
+_forecast_cache: ForecastCache | None = None
+
+def get_forecast_cache() -> ForecastCache:
+    """Module-wide cache configured from the FORECAST_CACHE_* environment."""
+    global _forecast_cache
+    if _forecast_cache is None:
+        _forecast_cache = ForecastCache()
+    return _forecast_cache
+
 def has_value(json, key:str):
     """
     Helper to check if a key has a value in the JSON response.
     """
     return json.get(key) is not None
 
-def get_geocode(city:str, state:str, country:str):
+def get_geocode(city:str, state:str, country:str, offline: bool = False):
     """
     Helper to get the latitude and longitude of the selected city.
+    Lookups are remembered in the geocode store; with `offline=True`
+    only stored or gazetteer entries are used.
     """
+    fetch = None if offline else (lambda: _fetch_geocode(city, state, country))
+    return get_geocode_store().lookup(city, state, country, fetch)
+
+def _fetch_geocode(city:str, state:str, country:str):
     params = {
         "q": (city, state, country),
-        "appid": WEATHER_API_KEY,
+        "appid": get_api_key(),
         "limit":1
     }
 
-    response = requests.get(GEOCODE_BASE_URL, params=params)
+    response = http_session().get(GEOCODE_BASE_URL, params=params, timeout=REQUEST_TIMEOUT_S)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch data: {response.json()}")
         
@@ -39,17 +230,17 @@ def get_geocode(city:str, state:str, country:str):
     return (data[0]["lat"], data[0]["lon"])
 
 def get_current_weather(my_lat:float, my_lon:float, timezone:str):
-    if not WEATHER_API_KEY:
+    if not get_api_key():
         raise ValueError("API key not found. Check .env file")
 
     params = {
         "lat": my_lat,
         "lon":my_lon,
-        "appid":WEATHER_API_KEY,
+        "appid":get_api_key(),
         "units":"metric"
     }
 
-    response = requests.get(WEATHER_BASE_URL, params=params)
+    response = http_session().get(WEATHER_BASE_URL, params=params, timeout=REQUEST_TIMEOUT_S)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch data: {response.json()}")
     
@@ -81,48 +272,74 @@ def get_current_weather(my_lat:float, my_lon:float, timezone:str):
 
     return df
 
-def get_hourly_solar(my_lat, my_lon, weather_df, cfg, timezone:str, count:int = 24):
+def get_hourly_solar(my_lat, my_lon, weather_df, cfg, timezone:str, count:int = 24, use_table: bool = True):
+    """
+    Hourly solar gain for the next `count` hours. With `use_table` the
+    sun position and clear-sky irradiance come from the site's
+    precomputed `SolarTable`; otherwise pvlib computes them here.
+    """
     now   = pd.Timestamp.now(timezone) 
     start = (now + pd.Timedelta(hours=1)).floor("h")   
     times_local = pd.date_range(start=start,
                                 periods=count,        
                                 freq="h",
                                 tz=timezone)
+    cloud_cover = weather_df.reindex(times_local)["cloud_cover"].to_numpy(dtype=float)
+    return solar_gain(my_lat, my_lon, times_local, cloud_cover, cfg, use_table)
 
-    sol = pvlib.solarposition.get_solarposition(times_local.tz_convert("UTC"), my_lat, my_lon)
-    sol = cast(pd.DataFrame, sol)
-    sol = sol.tz_convert(timezone)
+def solar_gain(my_lat, my_lon, times_local: pd.DatetimeIndex, cloud_cover, cfg, use_table: bool = True,
+               irradiance: tuple | None = None):
+    """
+    Solar gain at explicit `times_local` given cloud cover (%) for each
+    of them. This is `get_hourly_solar` without the "from now" clock, so
+    historical weather can be run through it chunk by chunk. Measured
+    (ghi, dni, dhi), e.g. from a weather file, replace the cloud-corrected
+    clear-sky estimate when given as `irradiance`.
+    """
+    import pvlib
+
+    timezone = times_local.tz
+    if use_table:
+        geometry = get_solar_table(my_lat, my_lon, altitude=250).rows(times_local)
+        zen, azimuth, ghi_clear = geometry[:, 0], geometry[:, 1], geometry[:, 2]
+    else:
+        sol = pvlib.solarposition.get_solarposition(times_local.tz_convert("UTC"), my_lat, my_lon)
+        sol = cast(pd.DataFrame, sol)
+        sol = sol.tz_convert(timezone)
+
+        site = pvlib.location.Location(my_lat, my_lon,
+                                       tz=timezone,
+                                       altitude=250) ## hardcoded for pittsburgh
+        
+        clearsky = site.get_clearsky(times_local.tz_convert("UTC"))
+        sky_df = cast(pd.DataFrame, clearsky)
+        sky_df = sky_df.tz_convert(timezone)
 
-    site = pvlib.location.Location(my_lat, my_lon,
-                                   tz=timezone,
-                                   altitude=250) ## hardcoded for pittsburgh
-    
-    clearsky = site.get_clearsky(times_local.tz_convert("UTC"))
-    sky_df = cast(pd.DataFrame, clearsky)
-    sky_df = sky_df.tz_convert(timezone)
+        zen = sol["apparent_zenith"].to_numpy()
+        azimuth = sol["azimuth"].to_numpy() % 360
+        ghi_clear = sky_df["ghi"].to_numpy()
     
-    cloud_frac = (
-        weather_df.reindex(times_local)["cloud_cover"]
-        .to_numpy(dtype=float) / 100.0
-    )
+    if irradiance is not None:
+        ghi_adj, dni_adj, dhi_adj = (np.asarray(x, dtype=float) for x in irradiance)
+    else:
+        cloud_frac = np.asarray(cloud_cover, dtype=float) / 100.0
 
-    # Simple empirical factor (WMO, Duffie-Beckman): (1-0.75·CF^3)
-    trans = 1.0 - 0.75 * cloud_frac**3
-    trans = np.clip(trans, 0.0, 1.0)
+        # Simple empirical factor (WMO, Duffie-Beckman): (1-0.75·CF^3)
+        trans = 1.0 - 0.75 * cloud_frac**3
+        trans = np.clip(trans, 0.0, 1.0)
 
-    ghi_adj = clearsky["ghi"].to_numpy() * trans
+        ghi_adj = ghi_clear * trans
 
-    zen = sol["apparent_zenith"].to_numpy()
-    ghi_series = pd.Series(ghi_adj, index=times_local)
+        ghi_series = pd.Series(ghi_adj, index=times_local)
 
-    erbs = pvlib.irradiance.erbs(ghi_series, zen, times_local)
-    dni_adj = erbs["dni"].to_numpy()
-    dhi_adj = erbs["dhi"].to_numpy()
+        erbs = pvlib.irradiance.erbs(ghi_series, zen, times_local)
+        dni_adj = erbs["dni"].to_numpy()
+        dhi_adj = erbs["dhi"].to_numpy()
 
     solar_df = pd.DataFrame(
         {
             "apparent_zenith": zen,
-            "azimuth": (sol["azimuth"].to_numpy() % 360),
+            "azimuth": azimuth,
             "ghi": ghi_adj,
             "dni": dni_adj,
             "dhi": dhi_adj,
@@ -148,24 +365,25 @@ def get_hourly_solar(my_lat, my_lon, weather_df, cfg, timezone:str, count:int =
     solar_df.index.name = "datetime"
     return solar_df
 
-def get_hourly_weather(my_lat:float, my_lon:float, timezone:str, count=24):
-    if not WEATHER_API_KEY:
+def _fetch_hourly_payload(my_lat:float, my_lon:float, count:int) -> dict:
+    if not get_api_key():
         raise ValueError("API key not found. Check .env file")
 
     params = {
         "lat":my_lat,
         "lon":my_lon,
-        "appid":WEATHER_API_KEY,
+        "appid":get_api_key(),
         "cnt": count,
         "units": "metric"
     }
 
-    response = requests.get(FORECAST_BASE_URL, params=params)
+    response = http_session().get(FORECAST_BASE_URL, params=params, timeout=REQUEST_TIMEOUT_S)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch data: {response.json()}")
     
-    data = response.json()
+    return response.json()
 
+def _parse_hourly_payload(data: dict, timezone:str) -> pd.DataFrame:
     forecast_weather = []   
     for entry in data["list"]:
         rain_val = 0
@@ -190,6 +408,18 @@ def get_hourly_weather(my_lat:float, my_lon:float, timezone:str, count=24):
 
     return df
 
+def get_hourly_weather(my_lat:float, my_lon:float, timezone:str, count=24, use_cache: bool = True):
+    """
+    Hourly forecast for the site. Set `use_cache=False` to bypass the
+    shared on-disk cache (see `ForecastCache`).
+    """
+    fetch = lambda: _fetch_hourly_payload(my_lat, my_lon, count)
+    if use_cache:
+        data = get_forecast_cache().get_or_fetch(my_lat, my_lon, count, fetch)
+    else:
+        data = fetch()
+    return _parse_hourly_payload(data, timezone)
+
 def get_hourly_forecast(my_lat, my_lon, cfg, timezone, count=24):
     weather_df = get_hourly_weather(my_lat, my_lon, timezone, count).set_index("datetime")
     solar_df = get_hourly_solar(my_lat, my_lon, weather_df, cfg, timezone, count)
@@ -198,6 +428,7 @@ def get_hourly_forecast(my_lat, my_lon, cfg, timezone, count=24):
     return combined_df
 
 
-latitude, longitude = get_geocode("Pittsburgh", "PA", "US")
-test_df = get_hourly_weather(latitude, longitude, "US/Eastern")
-print(test_df)
\ No newline at end of file
+if __name__ == "__main__":
+    latitude, longitude = get_geocode("Pittsburgh", "PA", "US")
+    test_df = get_hourly_weather(latitude, longitude, "US/Eastern")
+    print(test_df)
@@ -0,0 +1,397 @@
+# tests/test_forecast.py
+import os
+
+from forecast import ForecastCache
+
+
+# ------------------------------------------------------------------
+# 1 · Forecast cache ------------------------------------------------
+# ------------------------------------------------------------------
+class CountingFetch:
+    """Stand-in for the OpenWeather call that counts invocations."""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"list": [], "version": self.calls}
+
+
+HOUR = 3600 * 480_000    # any whole hour
+
+
+def test_fresh_entry_is_served_without_fetching(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_s=600, stale_s=600)
+    fetch = CountingFetch()
+
+    first = cache.get_or_fetch(40.4406, -79.9959, 24, fetch, now=HOUR + 10)
+    again = cache.get_or_fetch(40.4411, -79.9961, 24, fetch, now=HOUR + 300)   # rounds to same key
+
+    assert first == again
+    assert fetch.calls == 1
+    assert [f for f in os.listdir(tmp_path) if f.startswith(".tmp")] == []
+
+
+def test_stale_entry_is_served_while_revalidating(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_s=600, stale_s=600)
+    fetch = CountingFetch()
+    cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR)
+
+    stale = cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + 900)
+    cache.wait()
+    assert stale["version"] == 1
+    assert fetch.calls == 2
+
+    # the refresh landed on disk under the current hour's key
+    refreshed = cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + 901)
+    assert refreshed["version"] == 2
+
+
+def test_previous_hour_bridges_the_hour_boundary(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_s=600, stale_s=600)
+    fetch = CountingFetch()
+    cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + 3500)
+
+    bridged = cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + 3700)
+    cache.wait()
+    assert bridged["version"] == 1
+    assert fetch.calls == 2
+
+
+def test_expired_entry_is_fetched_synchronously(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_s=60, stale_s=60)
+    fetch = CountingFetch()
+    cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR)
+
+    fresh = cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + 500)
+    assert fresh["version"] == 2
+
+
+def test_expired_entries_are_pruned_on_write(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_s=600, stale_s=600)
+    fetch = CountingFetch()
+    for hour in range(5):
+        cache.get_or_fetch(40.0, -80.0, 24, fetch, now=HOUR + hour * 3600 + 10)
+
+    # only the current hour's entry and the previous one (still in its stale window) remain
+    assert sorted(os.listdir(tmp_path)) == [f"{cache.key(40.0, -80.0, 24, HOUR // 3600 + h)}.json" for h in (3, 4)]
+
+
+def test_failed_revalidation_is_logged_and_stale_entry_kept(tmp_path, caplog):
+    cache = ForecastCache(str(tmp_path), ttl_s=600, stale_s=600)
+    cache.get_or_fetch(40.0, -80.0, 24, CountingFetch(), now=HOUR)
+
+    def broken():
+        raise ConnectionError("upstream down")
+
+    stale = cache.get_or_fetch(40.0, -80.0, 24, broken, now=HOUR + 900)
+    cache.wait()
+    assert stale["version"] == 1
+    assert "upstream down" in caplog.text
+
+
+# ------------------------------------------------------------------
+# 2 · Geocode store -------------------------------------------------
+# ------------------------------------------------------------------
+import pytest
+
+from geocode import GeocodeStore
+
+
+def test_geocode_fetched_once_then_persisted(tmp_path):
+    db = str(tmp_path / "geo.sqlite3")
+    calls = []
+    fetch = lambda: calls.append(1) or (40.44, -79.99)
+
+    store = GeocodeStore(db)
+    assert store.lookup("Pittsburgh", "PA", "US", fetch) == (40.44, -79.99)
+    assert store.lookup(" pittsburgh", "pa", "us", fetch) == (40.44, -79.99)
+    assert len(calls) == 1
+
+    reopened = GeocodeStore(db)
+    assert reopened.lookup("Pittsburgh", "PA", "US") == (40.44, -79.99)
+
+
+def test_gazetteer_serves_offline_lookups(tmp_path):
+    gazetteer = tmp_path / "sites.csv"
+    gazetteer.write_text("city,state,country,lat,lon\n"
+                         "San Jose,CA,US,37.3382,-121.8863\n"
+                         "Accra,,GH,5.6037,-0.1870\n")
+    store = GeocodeStore(str(tmp_path / "geo.sqlite3"), maxsize=1)
+    assert store.load_gazetteer(str(gazetteer)) == 2
+
+    assert store.lookup("San Jose", "CA", "US") == (37.3382, -121.8863)
+    assert store.lookup("Accra", "", "GH") == (5.6037, -0.1870)
+    with pytest.raises(KeyError):
+        store.lookup("Nowhere", "", "US")
+
+
+# ------------------------------------------------------------------
+# 3 · Multi-site fetch ----------------------------------------------
+# ------------------------------------------------------------------
+import time
+from urllib.parse import urlparse, parse_qs
+
+from fetch import FetchSitesError, ForecastFetcher, Site, TokenBucket, _StubForecastHandler, serve_stub_forecast
+from GreenhouseEngine import GreenhouseConfig
+
+
+class FlakyHandler(_StubForecastHandler):
+    """Answers 503 on the first request for each latitude."""
+    seen: set = set()
+
+    def do_GET(self):
+        lat = parse_qs(urlparse(self.path).query)["lat"][0]
+        if lat not in FlakyHandler.seen:
+            FlakyHandler.seen.add(lat)
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+def test_fetch_sites_against_stub_server():
+    server, url = serve_stub_forecast(FlakyHandler)
+    try:
+        sites = [Site(f"site-{i}", 40 + i, -80.0, "US/Eastern") for i in range(6)]
+        fetcher = ForecastFetcher(max_workers=3, rate_per_s=1000, backoff_s=0.01,
+                                  use_cache=False, forecast_url=url, api_key="stub")
+        results = fetcher.fetch_sites(sites, GreenhouseConfig(40, -80), count=12)
+    finally:
+        server.shutdown()
+
+    assert sorted(results) == sorted(site.name for site in sites)
+    for df in results.values():
+        assert len(df) == 12
+        assert {"temp", "wind_speed", "Q_solar"} <= set(df.columns)
+
+
+class OneSiteDownHandler(_StubForecastHandler):
+    """Answers 404 for latitude 41, like a site the provider rejects."""
+    def do_GET(self):
+        if float(parse_qs(urlparse(self.path).query)["lat"][0]) == 41.0:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+def test_one_failing_site_keeps_the_others():
+    server, url = serve_stub_forecast(OneSiteDownHandler)
+    try:
+        sites = [Site(f"site-{i}", 40 + i, -80.0, "US/Eastern") for i in range(4)]
+        fetcher = ForecastFetcher(max_workers=2, rate_per_s=1000, retries=0,
+                                  use_cache=False, forecast_url=url, api_key="stub")
+        mixed = fetcher.fetch_sites(sites, GreenhouseConfig(40, -80), count=6, return_exceptions=True)
+        with pytest.raises(FetchSitesError) as failure:
+            fetcher.fetch_sites(sites, GreenhouseConfig(40, -80), count=6)
+    finally:
+        server.shutdown()
+
+    assert isinstance(mixed["site-1"], Exception)
+    assert all(len(mixed[f"site-{i}"]) == 6 for i in (0, 2, 3))
+    assert sorted(failure.value.results) == ["site-0", "site-2", "site-3"]
+    assert list(failure.value.errors) == ["site-1"]
+
+
+def test_cached_fetches_from_another_endpoint_keep_their_own_entries(tmp_path, monkeypatch):
+    import forecast
+    cache = ForecastCache(str(tmp_path))
+    monkeypatch.setattr(forecast, "_forecast_cache", cache)
+    site = Site("stub", 40.0, -80.0)
+    cache.get_or_fetch(site.lat, site.lon, 6, lambda: {"real": True})          # the real endpoint's entry
+
+    server, url = serve_stub_forecast()
+    try:
+        fetcher = ForecastFetcher(rate_per_s=1000, use_cache=True, forecast_url=url, api_key="stub")
+        payload = fetcher.fetch_payload(site, count=6)
+    finally:
+        server.shutdown()
+
+    assert "real" not in payload and len(payload["list"]) == 6
+    assert ForecastFetcher(forecast_url=forecast.FORECAST_BASE_URL, api_key="x").cache_source == ""
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2 and names[1].startswith(fetcher.cache_source + "_")
+    assert cache.get_or_fetch(site.lat, site.lon, 6, lambda: pytest.fail("refetched")) == {"real": True}
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate_per_s=50, capacity=1)
+    t0 = time.perf_counter()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.perf_counter() - t0 >= 0.18
+
+
+# ------------------------------------------------------------------
+# 4 · Solar table ---------------------------------------------------
+# ------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pvlib
+
+from solar_table import SolarTable
+
+
+def test_solar_table_matches_pvlib_in_other_years(tmp_path):
+    table = SolarTable.load(40.44, -79.99, directory=str(tmp_path))
+    assert isinstance(table.data, np.memmap)
+
+    times = pd.date_range("2025-03-01 00:00", periods=72, freq="h", tz="US/Eastern")
+    sol = pvlib.solarposition.get_solarposition(times.tz_convert("UTC"), 40.44, -79.99)
+    rows = table.rows(times)
+
+    np.testing.assert_allclose(rows[:, 0], sol["apparent_zenith"].to_numpy(), atol=0.5)
+    reopened = SolarTable.load(40.44, -79.99, directory=str(tmp_path))
+    np.testing.assert_array_equal(reopened.rows(times), rows)
+
+
+# ------------------------------------------------------------------
+# 5 · Streaming backtest --------------------------------------------
+# ------------------------------------------------------------------
+from backtest import backtest, read_weather_csv, summarize, with_solar
+from GreenhouseEngine import GreenhouseConfig, GreenhouseThermalEngine
+
+
+def test_backtest_chunks_match_single_run(tmp_path):
+    times = pd.date_range("2024-12-30", periods=24 * 5, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    pd.DataFrame({
+        "datetime": times,
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "humidity": 70.0,
+        "wind_speed": 3.0,
+        "cloud_cover": (hour * 4) % 100,
+    }).to_csv(tmp_path / "weather.csv", index=False)
+
+    cfg = GreenhouseConfig(40.44, -79.99)
+    whole = next(with_solar(read_weather_csv(tmp_path / "weather.csv", "US/Eastern", chunk_hours=10_000),
+                            cfg.latitude, cfg.longitude, cfg, use_table=False))
+    ref = GreenhouseThermalEngine(cfg, 15.0).simulate_step(15.0, 15.0, whole, steps=len(whole), horizon=12)
+
+    chunks = with_solar(read_weather_csv(tmp_path / "weather.csv", "US/Eastern", chunk_hours=25),
+                        cfg.latitude, cfg.longitude, cfg, use_table=False)
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40.44, -79.99), 15.0)
+    results = list(backtest(engine, chunks, 15.0, 15.0, horizon=12, integrator="euler"))
+    streamed = pd.concat(results)
+
+    assert len(results) == 6 and streamed.index.equals(ref.index)     # 5 chunks + the held-back tail
+    for col in ref.columns:
+        np.testing.assert_allclose(streamed[col].to_numpy(float), ref[col].to_numpy(float), rtol=1e-9)
+
+    *_, totals = summarize(results, cfg.coefficients())
+    assert totals.hours == totals.steps == len(ref)
+    assert totals.T_air_mean == pytest.approx(ref["T_air"].mean())
+
+
+def test_summarize_scales_energy_by_step_length():
+    cfg = GreenhouseConfig(40.44, -79.99)
+    times = pd.date_range("2025-01-06", periods=8, freq="3h", tz="UTC")
+    out = pd.DataFrame({"T_air": 15.0, "part_load": 1.0, "Q_heat": 9000.0, "vent_ach": 0.0}, index=times)
+
+    *_, hourly = summarize([out], cfg.coefficients())
+    *_, three_hourly = summarize([out], cfg.coefficients(), dt_hr=3.0)
+    assert three_hourly.heater_kwh == pytest.approx(3 * hourly.heater_kwh)
+    assert three_hourly.cost == pytest.approx(3 * hourly.cost)
+    assert three_hourly.hours == 24 and three_hourly.steps == 8
+    assert three_hourly.T_air_mean == pytest.approx(15.0)
+
+
+# ------------------------------------------------------------------
+# 6 · Weather files -------------------------------------------------
+# ------------------------------------------------------------------
+from weather_file import WeatherFile
+
+
+def write_epw(path, hours=48):
+    header = ["LOCATION,Pittsburgh,PA,USA,TMY3,725205,40.50,-80.22,-5.0,366.0"] + ["X"] * 7
+    rows = []
+    for i in range(hours):
+        day, hour = divmod(i, 24)
+        fields = ["0"] * 35
+        fields[:6] = ["1998" if day else "2004", "1", str(day + 1), str(hour + 1), "60", "A"]
+        fields[6] = "99.9" if i == 5 else f"{-3 + 0.5 * hour:.1f}"      # one missing dry bulb
+        fields[8] = "70"
+        fields[13], fields[14], fields[15] = (("400", "500", "100") if 8 <= hour <= 16 else ("0", "0", "0"))
+        fields[21], fields[22] = "3.5", "4"
+        rows.append(",".join(fields))
+    path.write_text("\n".join(header + rows) + "\n")
+
+
+def test_epw_parsed_once_and_sliced_zero_copy(tmp_path, monkeypatch):
+    write_epw(tmp_path / "site.epw")
+    wf = WeatherFile.open(str(tmp_path / "site.epw"), directory=str(tmp_path / "cache"))
+
+    assert len(wf) == 48 and isinstance(wf.times, np.memmap)
+    weather = wf.weather("2021-01-01 05:00", "2021-01-01 17:00")          # UTC bounds
+    assert weather.index[0] == pd.Timestamp("2021-01-01 00:00", tz="Etc/GMT+5")
+    assert weather["temp"].iloc[0] == pytest.approx(-3.0)
+    assert weather["temp"].iloc[5] == pytest.approx(-0.5)                 # interpolated across 99.9
+    assert weather["cloud_cover"].iloc[0] == pytest.approx(40.0)
+    assert np.shares_memory(weather["temp"].to_numpy(), wf.columns["temp"])
+
+    import weather_file
+    monkeypatch.setattr(weather_file, "parse_epw", lambda path: pytest.fail("re-parsed"))
+    again = WeatherFile.open(str(tmp_path / "site.epw"), directory=str(tmp_path / "cache"))
+    np.testing.assert_array_equal(again.columns["ghi"], wf.columns["ghi"])
+
+
+def test_weather_file_feeds_engine(tmp_path):
+    write_epw(tmp_path / "site.epw")
+    cfg = GreenhouseConfig(40.50, -80.22)
+    wf = WeatherFile.open(str(tmp_path / "site.epw"), timezone="US/Eastern", directory=str(tmp_path / "cache"))
+    forecast_df = wf.forecast(cfg, use_table=False)
+
+    for col in ("temp", "humidity", "wind_speed", "cloud_cover", "ghi", "dni", "dhi", "Q_solar"):
+        assert col in forecast_df.columns
+    assert forecast_df["Q_solar"].max() > 0 and forecast_df["Q_solar"].min() >= 0
+    out = GreenhouseThermalEngine(cfg, 15.0).simulate_step(15.0, 15.0, forecast_df, steps=36, horizon=12)
+    assert len(out) == 36 and out.index.tz is not None
+
+
+# ------------------------------------------------------------------
+# 7 · NumPy control models ------------------------------------------
+# ------------------------------------------------------------------
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)                    # control_models.py and twin.py live at the repo root
+from control_models import EXPORT_FILE, MODEL_FILES, MODELS_DIR, ControlModels
+
+MODELS_PATH = os.path.join(ROOT, MODELS_DIR)
+
+
+def test_exported_models_match_keras():
+    keras = pytest.importorskip("keras")
+    models = ControlModels.load(os.path.join(MODELS_PATH, EXPORT_FILE))
+    X = np.random.default_rng(0).normal(size=(256, len(models.features)))       # already scaled
+
+    for name in MODEL_FILES:
+        reference = keras.models.load_model(os.path.join(MODELS_PATH, MODEL_FILES[name]), compile=False)
+        np.testing.assert_allclose(getattr(models, name).predict(X), reference.predict(X, verbose=0),
+                                   rtol=1e-4, atol=1e-5)
+
+
+def test_batched_forecast_matches_per_site_loop():
+    from twin import forecast_n_hours_ahead, forecast_n_hours_ahead_batch
+
+    models = ControlModels.load(os.path.join(MODELS_PATH, EXPORT_FILE))
+    hours, rng = 12, np.random.default_rng(1)
+    start_temps, start_hums = np.array([2.0, 18.0, 34.0]), np.array([90.0, 55.0, 30.0])
+    ext_temps = np.array([-8.0, 12.0, 30.0])[:, None] + rng.normal(0, 2, (3, hours))
+    ext_hums = rng.uniform(30, 95, (3, hours))
+
+    batch = forecast_n_hours_ahead_batch(hours, start_temps, start_hums, ext_temps, ext_hums, models,
+                                         start_time="2025-01-01 06:20")
+    assert batch["datetime"].iloc[0] == pd.Timestamp("2025-01-01 07:00")
+    for site in range(3):
+        single = forecast_n_hours_ahead(hours, start_temps[site], start_hums[site], list(ext_temps[site]),
+                                        list(ext_hums[site]), models.heat, models.vent, models.scaler,
+                                        models.features)
+        rows = batch[batch["site"] == site]
+        np.testing.assert_allclose(rows["predicted_internal_temp"], single["predicted_internal_temp"], rtol=1e-12)
+        for column in ("predicted_heating", "predicted_venting"):
+            np.testing.assert_array_equal(rows[column], single[column])
+    assert 0 < batch["predicted_heating"].mean() < 1
@@ -0,0 +1,104 @@
+import os
+import csv
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+"""
+The GeocodeStore class remembers city → (lat, lon) lookups. Repeat
+lookups are answered from an in-memory LRU, misses fall back to a small
+SQLite file, and only then to the network. A gazetteer CSV can be bulk
+loaded so named sites resolve with no network at all.
+"""
+
+GEOCODE_DB_PATH = os.getenv("GEOCODE_DB_PATH",
+                            os.path.join(os.path.expanduser("~"), ".cache", "sankofa_twin", "geocode.sqlite3"))
+
+def _normalize(city: str, state: str, country: str) -> tuple[str, str, str]:
+    return (city.strip().casefold(), state.strip().casefold(), country.strip().casefold())
+
+class GeocodeStore:
+    def __init__(self, path: str = GEOCODE_DB_PATH, maxsize: int = 1024):
+        self.path = path
+        self.maxsize = maxsize
+        self._memory: OrderedDict[tuple[str, str, str], tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS geocode (
+                   city TEXT NOT NULL, state TEXT NOT NULL, country TEXT NOT NULL,
+                   lat REAL NOT NULL, lon REAL NOT NULL, source TEXT NOT NULL,
+                   PRIMARY KEY (city, state, country))"""
+        )
+        self._db.commit()
+
+    def _remember(self, key, latlon) -> None:
+        self._memory[key] = latlon
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, city: str, state: str, country: str) -> tuple[float, float] | None:
+        key = _normalize(city, state, country)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            row = self._db.execute(
+                "SELECT lat, lon FROM geocode WHERE city = ? AND state = ? AND country = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            latlon = (row[0], row[1])
+            self._remember(key, latlon)
+            return latlon
+
+    def put(self, city: str, state: str, country: str, lat: float, lon: float, source: str = "api") -> None:
+        key = _normalize(city, state, country)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+                             (*key, float(lat), float(lon), source))
+            self._db.commit()
+            self._remember(key, (float(lat), float(lon)))
+
+    def load_gazetteer(self, csv_path: str) -> int:
+        """
+        Bulk load a CSV with columns city, state, country, lat, lon.
+        Existing rows for the same place are replaced. Returns the row count.
+        """
+        with open(csv_path, newline="") as f:
+            rows = [(*_normalize(r["city"], r["state"], r["country"]), float(r["lat"]), float(r["lon"]), "gazetteer")
+                    for r in csv.DictReader(f)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            self._memory.clear()
+        return len(rows)
+
+    def lookup(self, city: str, state: str, country: str,
+               fetch: Callable[[], tuple[float, float]] | None = None) -> tuple[float, float]:
+        """
+        Cached coordinates, or `fetch()` on a miss (stored for next time).
+        With no `fetch`, a miss raises KeyError.
+        """
+        latlon = self.get(city, state, country)
+        if latlon is not None:
+            return latlon
+        if fetch is None:
+            raise KeyError(f"No offline geocode for {city}, {state}, {country}")
+        lat, lon = fetch()
+        self.put(city, state, country, lat, lon)
+        return (lat, lon)
+
+_geocode_store: GeocodeStore | None = None
+
+def get_geocode_store() -> GeocodeStore:
+    """Module-wide store at GEOCODE_DB_PATH."""
+    global _geocode_store
+    if _geocode_store is None:
+        _geocode_store = GeocodeStore()
+    return _geocode_store
@@ -33,6 +33,9 @@ def test_thermal_mass_cools_toward_air():
 # ------------------------------------------------------------------
 # 2 · Heat-loss -----------------------------------------------------
 # ------------------------------------------------------------------
+from GreenhouseEngine import EngineState
+
+
 class DummyCfg:
     """Minimal stub so we don't need full GreenhouseConfig."""
     wall_A = roof_A = floor_A = glazing_A = 1.0    
@@ -43,10 +46,21 @@ class DummyCfg:
 def make_engine(T_in=20):
     eng = GreenhouseThermalEngine.__new__(GreenhouseThermalEngine)
     eng.cfg = DummyCfg()        # use the 1 m² / 1 K W-1 stub
-    eng.air_temp = T_in
+    eng.state = EngineState(T_in, T_in)
     return eng
 
 
+def test_air_temp_property_on_stub_engine():
+    eng = make_engine(T_in=12)
+    assert eng.air_temp == eng.state.air_temp == 12
+    eng.air_temp = 15
+    assert eng.state.air_temp == 15 and eng.state.mass_temp == 12
+
+    bare = GreenhouseThermalEngine.__new__(GreenhouseThermalEngine)
+    with pytest.raises(AttributeError, match="no state"):
+        bare.air_temp = 15
+
+
 def test_heat_loss_zero_when_colder_outside_equal():
     eng = make_engine(T_in=20)
     assert eng.calculate_heat_loss(20, wind_m_s=0) == 0
@@ -87,3 +101,792 @@ def test_solar_gain_simple(monkeypatched_engine):
     expected = 500 * eng.cfg.glazing_A * eng.cfg.glazing_tau
     assert math.isclose(gain, expected, rel_tol=1e-6)
 
+
+
+# ------------------------------------------------------------------
+# 4 · Ensemble ------------------------------------------------------
+# ------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+def make_forecast(hours=36):
+    times = pd.date_range("2025-01-06 00:00", periods=hours, freq="h", tz="UTC")
+    hour = np.arange(hours) % 24
+    return pd.DataFrame(
+        {
+            "temp":       -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+            "wind_speed": 2.0 + (hour % 5),
+            "Q_solar":    np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+        },
+        index=times,
+    )
+
+
+def test_ensemble_matches_scalar_runs():
+    forecast = make_forecast()
+    starts = [12.0, 20.0, 30.0]
+
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 20.0)
+    configs = [GreenhouseConfig(40, -80) for _ in starts]
+    configs[2].controller.T_set = 22.0
+    ens = engine.simulate_ensemble(starts, starts, forecast, steps=24, horizon=12, configs=configs)
+    assert ens["T_air"].shape == (3, 24)
+
+    for i, T0 in enumerate(starts):
+        cfg = GreenhouseConfig(40, -80)
+        cfg.controller.T_set = configs[i].controller.T_set
+        ref = GreenhouseThermalEngine(cfg, T0).simulate_step(T0, T0, forecast, steps=24, horizon=12)
+        member = ens.member(i)
+        for col in ref.columns:
+            np.testing.assert_allclose(member[col].to_numpy(float), ref[col].to_numpy(float), rtol=1e-9)
+
+
+# ------------------------------------------------------------------
+# 5 · Exact integrator ----------------------------------------------
+# ------------------------------------------------------------------
+from GreenhouseEngine import SOLAR_TO_MASS_FRAC, exact_step_coefficients
+
+
+def advance_exact(air, mass, coeffs, Q_heat):
+    p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = coeffs
+    air_ss, mass_ss = air_free + Q_heat * g_air, mass_free + Q_heat * g_mass
+    d_air, d_mass = air - air_ss, mass - mass_ss
+    return air_ss + p11 * d_air + p12 * d_mass, mass_ss + p21 * d_air + p22 * d_mass
+
+
+def test_exact_step_independent_of_step_size():
+    cfg = GreenhouseConfig(40, -80)
+    C_mass = cfg.mass_kg * cfg.mass_c_p
+    one_hour = exact_step_coefficients(cfg.rho_cp_V, C_mass, 1500.0, 1000.0, 0.0, 5000.0, 3600)
+    three_hours = exact_step_coefficients(cfg.rho_cp_V, C_mass, 1500.0, 1000.0, 0.0, 5000.0, 3 * 3600)
+
+    air, mass = 20.0, 15.0
+    for _ in range(3):
+        air, mass = advance_exact(air, mass, one_hour, Q_heat=3000.0)
+    air3, mass3 = advance_exact(20.0, 15.0, three_hours, Q_heat=3000.0)
+
+    assert math.isclose(air, air3, rel_tol=1e-9)
+    assert math.isclose(mass, mass3, rel_tol=1e-9)
+
+
+def test_exact_integrator_stable_for_long_steps():
+    forecast = make_forecast(180).iloc[::3]        # 3-hourly rows
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 20.0)
+    sim = engine.simulate_step(20.0, 20.0, forecast, steps=48, horizon=12, integrator="exact", dt_hr=3.0)
+    assert np.isfinite(sim["T_air"]).all()
+    assert sim["T_air"].between(-30, 60).all()
+
+
+def test_step_length_must_match_forecast_spacing():
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 20.0)
+    with pytest.raises(ValueError, match="spacing"):
+        engine.simulate_step(20.0, 20.0, make_forecast(60), steps=48, integrator="exact", dt_hr=3.0)
+    with pytest.raises(ValueError, match="euler"):
+        engine.simulate_step(20.0, 20.0, make_forecast(180).iloc[::3], steps=48, dt_hr=3.0)
+
+
+def test_exact_step_matches_fine_euler_reference():
+    """The same two-node equations, integrated with 1 s explicit Euler steps."""
+    cfg = GreenhouseConfig(40, -80)
+    C_air, C_mass, h, G = cfg.rho_cp_V, cfg.mass_kg * cfg.mass_c_p, 1500.0, 1000.0
+    T_ext, Q_solar, Q_heat = -5.0, 5000.0, 3000.0
+    f = SOLAR_TO_MASS_FRAC
+
+    air, mass = 20.0, 15.0
+    for _ in range(3600):
+        d_air = ((1 - f) * Q_solar + Q_heat + h * (mass - air) - G * (air - T_ext)) / C_air
+        d_mass = (f * Q_solar + h * (air - mass)) / C_mass
+        air, mass = air + d_air, mass + d_mass
+
+    exact = exact_step_coefficients(C_air, C_mass, h, G, T_ext, Q_solar, 3600)
+    exact_air, exact_mass = advance_exact(20.0, 15.0, exact, Q_heat)
+    assert exact_air == pytest.approx(air, abs=1e-3)
+    assert exact_mass == pytest.approx(mass, abs=1e-3)
+
+
+# ------------------------------------------------------------------
+# 6 · Coefficient block ---------------------------------------------
+# ------------------------------------------------------------------
+def test_coefficients_are_hashable_and_shared():
+    cfg = GreenhouseConfig(40, -80)
+    coeffs = cfg.coefficients()
+    assert coeffs == GreenhouseConfig(40, -80).coefficients()
+    assert len({coeffs, cfg.coefficients()}) == 1
+
+    cfg.leak_ach = 0.6
+    assert cfg.coefficients().infiltration_W_K == pytest.approx(2 * coeffs.infiltration_W_K)
+    assert cfg.controller.U_W_K == pytest.approx(
+        coeffs.ua_envelope_W_K + coeffs.infiltration_W_K + coeffs.h_ma_W_K)
+
+
+# ------------------------------------------------------------------
+# 7 · Controller ----------------------------------------------------
+# ------------------------------------------------------------------
+def test_planned_decisions_match_horizon_loop():
+    forecast = make_forecast(30)
+    T_ext, Q_sol = forecast["temp"].to_numpy(), forecast["Q_solar"].to_numpy()
+    looped = GreenhouseConfig(40, -80).controller
+    planned = GreenhouseConfig(40, -80).controller
+    plan = planned.plan(T_ext, Q_sol, horizon=12)
+
+    for i, air in enumerate(np.linspace(10, 30, len(T_ext))):
+        window = {"temp": T_ext[i : i + 12], "Q_solar": Q_sol[i : i + 12]}
+        assert planned.decide_planned(air, i, plan) == looped.decide(air, window)
+
+
+# ------------------------------------------------------------------
+# 8 · Import cost ---------------------------------------------------
+# ------------------------------------------------------------------
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_S = 3.0       # pandas dominates; pvlib/requests/tensorflow must stay lazy
+
+def test_engine_import_is_lazy_and_fast():
+    probe = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        "import GreenhouseEngine, forecast\n"
+        "lazy = [m for m in ('pvlib', 'requests', 'tensorflow', 'dotenv') if m in sys.modules]\n"
+        "print(time.perf_counter() - t0, *lazy)\n"
+    )
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed, *loaded = out.stdout.split()
+    assert loaded == []
+    assert float(elapsed) < IMPORT_BUDGET_S
+
+
+# ------------------------------------------------------------------
+# 9 · Cost-optimal controller ---------------------------------------
+# ------------------------------------------------------------------
+from CostOptimal import CostOptimal
+
+
+def test_cost_optimal_precharges_before_peak():
+    ctl = CostOptimal.from_coefficients(GreenhouseConfig(40, -80).coefficients())
+    cheap_then_peak = np.array([0.05] * 4 + [1.0] * 8)
+    flat = np.full(12, 0.3)
+    T_ext, Q_sol = np.zeros(12), np.zeros(12)
+
+    part_tou, _, T_tou = ctl.solve(18.0, T_ext, Q_sol, cheap_then_peak)
+    part_flat, _, T_flat = ctl.solve(18.0, T_ext, Q_sol, flat)
+    assert part_tou[:4].sum() > part_flat[:4].sum()
+    assert T_tou[4] > T_flat[4]
+
+
+def test_cost_optimal_decide_prices_the_window_from_its_index():
+    ctl = CostOptimal.from_coefficients(GreenhouseConfig(40, -80).coefficients())
+    window = make_forecast(12).tz_convert("US/Eastern")[["temp", "Q_solar"]]
+    priced = window.assign(rate=ctl.tariff.rates_at(window.index))
+    assert ctl.fresh().decide(18.0, window) == ctl.fresh().decide(18.0, priced)
+
+    plan = ctl.plan(window["temp"], window["Q_solar"], 12, times=pd.RangeIndex(12))
+    np.testing.assert_array_equal(plan.rates, ctl.tariff.rates.mean())
+
+
+def test_cost_optimal_drives_engine():
+    forecast = make_forecast(24 + 48)
+    cfg = GreenhouseConfig(40, -80)
+    cfg.controller = CostOptimal.from_coefficients(cfg.coefficients())
+    out = GreenhouseThermalEngine(cfg, 18.0).simulate_step(18.0, 18.0, forecast, steps=24, horizon=48,
+                                                         integrator="exact")
+
+    assert np.array_equal(out["heater_on"].to_numpy(bool), out["part_load"].to_numpy() > 0)
+    assert set(out["part_load"]) <= set(cfg.controller.heat_levels)
+    assert (out["part_load"].iloc[:7] == 1.0).all()        # coldest hours: heater at capacity
+    assert (out["vent_ach"] == 0.0).all()
+
+
+def test_cost_optimal_fleet_in_ensemble_matches_single_runs():
+    forecast = make_forecast(24 + 24)
+    cfg = GreenhouseConfig(40, -80)
+    cfg.controller = CostOptimal.from_coefficients(cfg.coefficients())
+    engine = GreenhouseThermalEngine(cfg, 18.0)
+    fleet = engine.simulate_ensemble([14.0, 20.0], [14.0, 20.0], forecast, steps=24, horizon=24,
+                                     integrator="exact")
+
+    for i, start in enumerate([14.0, 20.0]):
+        single = GreenhouseThermalEngine(cfg, start).simulate_step(start, start, forecast, steps=24, horizon=24,
+                                                                   integrator="exact")
+        np.testing.assert_allclose(fleet["T_air"][i], single["T_air"].to_numpy(), rtol=1e-9)
+        np.testing.assert_array_equal(fleet["part_load"][i], single["part_load"].to_numpy())
+
+
+def test_tariff_reads_hours_on_its_own_clock():
+    from energy import DEFAULT_PLAN, get_rate
+
+    # without a clock of its own the plan reads the index's local hours, like get_rate
+    denver = pd.date_range("2025-01-06 00:00", periods=48, freq="h", tz="US/Mountain")
+    np.testing.assert_array_equal(DEFAULT_PLAN.rates_at(denver), [get_rate(dt)[1] for dt in denver])
+
+    eastern = DEFAULT_PLAN.in_timezone("US/Eastern")
+    utc = pd.date_range("2025-01-06 00:00", periods=48, freq="h", tz="UTC")
+    np.testing.assert_array_equal(eastern.rates_at(utc), DEFAULT_PLAN.rates_at(utc.tz_convert("US/Eastern")))
+    # 15:00 UTC on a Monday is peak on its own clock, 10:00 (off-peak) in Pittsburgh
+    assert DEFAULT_PLAN.period_names(utc[15:16])[0] == "peak"
+    assert eastern.period_names(utc[15:16])[0] == "off_peak"
+
+    ctl = CostOptimal.from_coefficients(GreenhouseConfig(40, -80).coefficients(), timezone="US/Eastern")
+    assert ctl.tariff.timezone == "US/Eastern" and DEFAULT_PLAN.timezone is None
+
+
+# ------------------------------------------------------------------
+# 10 · Scenario sweep -----------------------------------------------
+# ------------------------------------------------------------------
+from sweep import build_config, parameter_grid, run_scenario, run_sweep
+
+
+def test_build_config_applies_every_kind_of_parameter():
+    cfg = build_config(40, -80, {"num_footings": 16, "glazing_U": 1.6, "leak_ach": 0.6, "T_set": 16.0})
+    base = GreenhouseConfig(40, -80)
+    assert cfg.mass_kg > base.mass_kg
+    assert cfg.glazing_R == pytest.approx(1 / 1.6)
+    assert cfg.controller.T_set == 16.0
+    assert cfg.controller.U_W_K > base.controller.U_W_K          # rebuilt with the new leak rate
+    with pytest.raises(ValueError):
+        build_config(40, -80, {"glazing_colour": "green"})
+
+
+def test_build_config_rebuilds_or_rejects_derived_quantities():
+    base = GreenhouseConfig(40, -80)
+    looser = build_config(40, -80, {"soil_coupling": 0.6})
+    assert looser.mass_kg > base.mass_kg
+    assert looser.coefficients().C_mass_J_K > base.coefficients().C_mass_J_K
+
+    for name in ("volume_m3", "length", "width", "floor_A", "mass_kg"):
+        with pytest.raises(ValueError, match=name):
+            build_config(40, -80, {name: 1.0})
+
+
+def test_sweep_pool_matches_in_process_runs():
+    forecast = make_forecast(48)
+    grid = parameter_grid(leak_ach=[0.3, 0.6], T_set=[16.0, 18.0])
+    table = run_sweep(forecast, grid, 40, -80, steps=36, processes=2, chunksize=1)
+
+    assert list(table.columns[:2]) == ["leak_ach", "T_set"] and len(table) == 4
+    for row, params in zip(table.to_dict("records"), grid):
+        assert row == pytest.approx(run_scenario(forecast, 40, -80, params, steps=36))
+
+
+# ------------------------------------------------------------------
+# 11 · Calibration --------------------------------------------------
+# ------------------------------------------------------------------
+from calibration import calibrate, config_with, log_arrays, simulate_prescribed
+
+
+def test_prescribed_run_matches_engine():
+    forecast = make_forecast(36)
+    cfg = GreenhouseConfig(40, -80)
+    ref = GreenhouseThermalEngine(cfg, 12.0).simulate_step(12.0, 12.0, forecast, steps=24, integrator="exact")
+    log = forecast.iloc[:24].assign(part_load=ref["part_load"], vent_ach=ref["vent_ach"], T_air=ref["T_air"])
+
+    T_air = simulate_prescribed([cfg, cfg], log_arrays(log), 1.0, 12.0, 12.0)
+    np.testing.assert_allclose(T_air, np.vstack([ref["T_air"]] * 2), rtol=1e-9)
+
+    ref = GreenhouseThermalEngine(cfg, 12.0).simulate_step(12.0, 12.0, forecast, steps=24, integrator="euler")
+    log = forecast.iloc[:24].assign(part_load=ref["part_load"], vent_ach=ref["vent_ach"], T_air=ref["T_air"])
+    T_air = simulate_prescribed([cfg], log_arrays(log), 1.0, 12.0, 12.0, integrator="euler")
+    np.testing.assert_allclose(T_air[0], ref["T_air"], rtol=1e-9)
+    with pytest.raises(ValueError):
+        simulate_prescribed([cfg], log_arrays(log), 0.25, 12.0, 12.0, integrator="euler")
+
+
+def test_calibration_recovers_known_house():
+    times = pd.date_range("2025-01-06", periods=2 * 24 * 4, freq="15min", tz="UTC")
+    hour = (times.hour + times.minute / 60).to_numpy()
+    log = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "wind_speed": 3.0,
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+        "heater_on": (hour < 7) | (hour > 19),
+    }, index=times)
+    truth = {"h_ma_W_K": 900.0, "leak_ach": 0.6}
+    house = config_with(GreenhouseConfig(40, -80), truth)
+    log["T_air"] = simulate_prescribed([house], log_arrays(log.assign(T_air=0.0)), 0.25, 15.0, 15.0)[0]
+
+    result = calibrate(GreenhouseConfig(40, -80), log, parameters=tuple(truth), iterations=20)
+    assert result.rmse < 0.05
+    assert result.params["leak_ach"] == pytest.approx(0.6, rel=0.1)
+    assert result.params["h_ma_W_K"] == pytest.approx(900.0, rel=0.1)
+
+
+def test_calibrated_config_reproduces_log_under_its_integrator():
+    forecast = make_forecast(72)
+    house = config_with(GreenhouseConfig(40, -80), {"h_ma_W_K": 900.0, "leak_ach": 0.6})
+    ref = GreenhouseThermalEngine(house, 12.0).simulate_step(12.0, 12.0, forecast, steps=60, integrator="euler")
+    log = forecast.iloc[:60].assign(part_load=ref["part_load"], vent_ach=ref["vent_ach"], T_air=ref["T_air"])
+
+    result = calibrate(GreenhouseConfig(40, -80), log, parameters=("h_ma_W_K", "leak_ach"), iterations=20,
+                       integrator="euler")
+    assert result.integrator == "euler"
+    out = GreenhouseThermalEngine(result.config, 12.0).simulate_step(12.0, result.T_mass0, forecast, steps=60,
+                                                                     integrator="euler")
+    rmse = np.sqrt(np.mean((out["T_air"].to_numpy() - ref["T_air"].to_numpy()) ** 2))
+    assert rmse < 0.05
+
+
+# ------------------------------------------------------------------
+# 12 · Incremental step ---------------------------------------------
+# ------------------------------------------------------------------
+def step_through(engine, forecast, hours, offset=0):
+    T, W, Q = (forecast[c].to_numpy() for c in ("temp", "wind_speed", "Q_solar"))
+    return [engine.step({"temp": T[k], "wind_speed": W[k], "Q_solar": Q[k]},
+                        {"temp": T[k : k + 12], "Q_solar": Q[k : k + 12]})
+            for k in range(offset, offset + hours)]
+
+
+def test_step_matches_exact_simulation():
+    forecast = make_forecast(48)
+    ref = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 12.0).simulate_step(
+        12.0, 12.0, forecast, steps=24, integrator="exact")
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 12.0)
+    rows = pd.DataFrame(step_through(engine, forecast, 24), index=ref.index)
+
+    for col in ref.columns:
+        np.testing.assert_allclose(rows[col].to_numpy(float), ref[col].to_numpy(float), rtol=1e-9)
+    assert engine.air_temp == rows["T_air"].iloc[-1] and engine.state.steps == 24
+
+
+def test_snapshot_restore_replays_identically():
+    forecast = make_forecast(48)
+    engine = GreenhouseThermalEngine(GreenhouseConfig(40, -80), 12.0)
+    step_through(engine, forecast, 6)
+    snap = engine.snapshot()
+    first = step_through(engine, forecast, 12, offset=6)
+
+    engine.restore(snap)
+    assert engine.state == snap.state and engine.state is not snap.state
+    assert step_through(engine, forecast, 12, offset=6) == first
+
+
+# ------------------------------------------------------------------
+# 13 · Controller ownership & thread pool ---------------------------
+# ------------------------------------------------------------------
+from executor import SimulationExecutor
+
+
+def test_engines_sharing_a_config_do_not_share_timers():
+    cfg = GreenhouseConfig(40, -80)
+    first, second = GreenhouseThermalEngine(cfg, 10.0), GreenhouseThermalEngine(cfg, 10.0)
+    first.simulate_step(10.0, 10.0, make_forecast(), steps=12)
+
+    assert first.controller._on_timer + first.controller._off_timer > 0
+    assert second.controller == cfg.controller == cfg.controller.fresh()
+    assert "_on_timer" in {f for f in cfg.controller.__dataclass_fields__}
+
+
+def test_repeated_runs_start_from_fresh_controller_memory():
+    cfg = GreenhouseConfig(40, -80)
+    cfg.controller._on_timer = 5                # warm timers left on the config's controller
+    engine = GreenhouseThermalEngine(cfg, 10.0)
+    assert engine.controller == cfg.controller.fresh()
+
+    first = engine.simulate_step(10.0, 10.0, make_forecast(), steps=12)
+    second = engine.simulate_step(10.0, 10.0, make_forecast(), steps=12)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_thread_pool_runs_match_serial_runs():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(48)
+    starts = [8.0, 14.0, 20.0, 26.0] * 4
+    serial = [GreenhouseThermalEngine(cfg, T0).simulate_step(T0, T0, forecast, steps=36) for T0 in starts]
+
+    with SimulationExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cfg, forecast, T0, steps=36) for T0 in starts]
+        ensemble = executor.submit_ensemble(cfg, forecast, starts, steps=36).result()
+        threaded = [f.result() for f in futures]
+
+    for i, (a, b) in enumerate(zip(serial, threaded)):
+        pd.testing.assert_frame_equal(a, b)
+        np.testing.assert_allclose(ensemble["T_air"][i], a["T_air"].to_numpy(), rtol=1e-9)
+
+
+# ------------------------------------------------------------------
+# 14 · Synthetic training data ---------------------------------------
+# ------------------------------------------------------------------
+from synthetic import generate, read_shards, toy_next_conditions, write_shards
+
+
+def test_synthetic_rows_follow_the_toy_rules_and_do_not_depend_on_chunking():
+    whole = pd.DataFrame(next(generate(5, 48, seed=3, chunk_steps=48)))
+    chunked = pd.concat([pd.DataFrame(b) for b in generate(5, 48, seed=3, chunk_steps=7)])
+    chunked = chunked.sort_values(["trajectory", "step"], ignore_index=True)
+    pd.testing.assert_frame_equal(whole, chunked)
+
+    for _, rows in whole.groupby("trajectory"):
+        np.testing.assert_allclose(rows["internal_temp"].to_numpy()[1:], rows["next_internal_temp"].to_numpy()[:-1])
+        assert rows["datetime"].is_monotonic_increasing and rows["datetime"].is_unique
+    temp, hum = toy_next_conditions(whole["internal_temp"], whole["external_temp"], whole["internal_humidity"],
+                                    whole["external_humidity"], whole["heating"], whole["venting"])
+    np.testing.assert_allclose(temp, whole["next_internal_temp"])
+    np.testing.assert_allclose(hum, whole["next_internal_hum"])
+    assert (whole["heating"] == (whole["internal_temp"] < 65)).all()
+
+
+def test_synthetic_shards_round_trip(tmp_path):
+    manifest = write_shards(str(tmp_path), 10, 30, driver="physics", chunk_steps=12, batch_size=4, seed=1)
+    table = read_shards(str(tmp_path))
+
+    assert len(manifest["shards"]) == 3 * 3 and len(table) == 300
+    assert table["trajectory"].nunique() == 10 and table["step"].max() == 29
+    assert table["next_internal_temp"].between(-60, 160).all()
+
+
+# ------------------------------------------------------------------
+# 15 · Simulation cache ---------------------------------------------
+# ------------------------------------------------------------------
+from simcache import SimulationCache, simulation_key
+
+
+def test_cache_serves_identical_runs_and_replays_controller_memory():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(36)
+    cache = SimulationCache()
+
+    first_engine, second_engine = GreenhouseThermalEngine(cfg, 10.0), GreenhouseThermalEngine(cfg, 10.0)
+    first = cache.simulate_step(first_engine, 10.0, 10.0, forecast, steps=24)
+    second = cache.simulate_step(second_engine, 10.0, 10.0, forecast, steps=24)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, GreenhouseThermalEngine(cfg, 10.0).simulate_step(10.0, 10.0, forecast, steps=24))
+    assert second_engine.controller == first_engine.controller
+
+
+def test_cache_key_changes_with_every_input():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(36)
+    engine = GreenhouseThermalEngine(cfg, 10.0)
+    base = simulation_key(engine, 10.0, 10.0, forecast, steps=24)
+
+    changed = forecast.copy()
+    changed.iloc[30, changed.columns.get_loc("temp")] += 0.1     # inside the last look-ahead window
+    leaky = GreenhouseConfig(40, -80)
+    leaky.leak_ach *= 2
+    engine_set = GreenhouseThermalEngine(cfg, 10.0)
+    engine_set.controller.T_set += 1
+
+    assert simulation_key(engine, 10.0, 10.0, changed, steps=24) != base
+    assert simulation_key(engine, 10.0, 10.5, forecast, steps=24) != base
+    assert simulation_key(GreenhouseThermalEngine(leaky, 10.0), 10.0, 10.0, forecast, steps=24) != base
+    assert simulation_key(engine_set, 10.0, 10.0, forecast, steps=24) != base
+    assert simulation_key(engine, 10.0, 10.0, forecast.iloc[:35], steps=24) == base   # rows past the window
+
+
+def test_cache_evicts_least_recent_and_reads_disk_tier(tmp_path):
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(36)
+    cache = SimulationCache(maxsize=2, directory=str(tmp_path))
+    for T0 in (8.0, 12.0, 8.0, 16.0):
+        cache.simulate_step(GreenhouseThermalEngine(cfg, T0), T0, T0, forecast, steps=24)
+    assert len(cache) == 2 and cache.misses == 3 and cache.hits == 1
+
+    other = SimulationCache(directory=str(tmp_path))            # e.g. another worker process
+    out = other.simulate_step(GreenhouseThermalEngine(cfg, 12.0), 12.0, 12.0, forecast, steps=24)
+    assert (other.disk_hits, other.misses) == (1, 0)
+    pd.testing.assert_frame_equal(out, GreenhouseThermalEngine(cfg, 12.0).simulate_step(12.0, 12.0, forecast, steps=24))
+
+
+# ------------------------------------------------------------------
+# 16 · Incremental re-simulation -------------------------------------
+# ------------------------------------------------------------------
+from incremental import RollingSimulation
+
+
+def test_rolling_update_resumes_before_first_change_and_matches_full_run():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(60)
+    rolling = RollingSimulation(GreenhouseThermalEngine(cfg, 10.0), 10.0, 10.0, horizon=12)
+    rolling.update(forecast.iloc[:48])
+
+    revised = forecast.iloc[:48].copy()
+    revised.iloc[30, revised.columns.get_loc("temp")] -= 3.0
+    out = rolling.update(revised)
+    assert rolling.resumed_at == 30 - 11
+    full = GreenhouseThermalEngine(cfg, 10.0).simulate_step(10.0, 10.0, revised, steps=37, integrator="exact")
+    pd.testing.assert_frame_equal(out, full, rtol=1e-12)
+
+    windy = revised.copy()
+    windy.iloc[5, windy.columns.get_loc("wind_speed")] += 4.0
+    rolling.update(windy)
+    assert rolling.resumed_at == 5
+
+
+def test_rolling_update_continues_a_later_forecast():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(60)
+    rolling = RollingSimulation(GreenhouseThermalEngine(cfg, 10.0), 10.0, 10.0, horizon=12)
+    rolling.update(forecast.iloc[:48])
+    out = rolling.update(forecast.iloc[3:60])                   # three hours later, nine new hours
+
+    assert rolling.resumed_at == 48 - 3 - 11
+    full = GreenhouseThermalEngine(cfg, 10.0).simulate_step(10.0, 10.0, forecast, steps=49, integrator="exact")
+    pd.testing.assert_frame_equal(out, full.iloc[3:], rtol=1e-12)
+    with pytest.raises(ValueError):
+        rolling.update(forecast.iloc[50:])
+
+
+def test_rolling_update_with_unchanged_forecast_serves_previous_run():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(48)
+    rolling = RollingSimulation(GreenhouseThermalEngine(cfg, 10.0), 10.0, 10.0, horizon=12)
+    first = rolling.update(forecast)
+    memory = rolling.engine.snapshot().controller
+
+    again = rolling.update(forecast.copy())
+    assert (rolling.resumed_at, rolling.steps_simulated) == (37, 0)
+    pd.testing.assert_frame_equal(again, first)
+    assert rolling.engine.snapshot().controller == memory
+
+    shorter = rolling.update(forecast, steps=20)
+    pd.testing.assert_frame_equal(shorter, first.iloc[:20])
+    assert rolling.steps_simulated == 0
+
+
+# ------------------------------------------------------------------
+# 17 · Thermal network ----------------------------------------------
+# ------------------------------------------------------------------
+from GreenhouseEngine import HEATER_EFFICIENCY
+from ThermalNetwork import GLAZING_HEAT_J_M2_K, ThermalNetwork
+from Predictive import PredictiveBatch
+
+
+def test_two_node_network_converges_to_exact_engine():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(24)
+    heat = (np.arange(24) < 8).astype(float)
+    vent = (np.arange(24) == 14) * 2.0
+    arrays = {"temp": forecast["temp"].to_numpy(), "wind_speed": forecast["wind_speed"].to_numpy(),
+              "Q_solar": forecast["Q_solar"].to_numpy(), "part_load": heat, "vent_ach": vent}
+    exact = simulate_prescribed([cfg], arrays, 1.0, 12.0, 12.0)[0]
+
+    net = ThermalNetwork.two_node(cfg.coefficients())
+    result = net.simulate(forecast, 12.0, part_load=heat, vent_ach=vent, heater_W=cfg.heater_W, substeps=240)
+    np.testing.assert_allclose(result.T_air[:, 0], exact, atol=0.05)
+
+
+def test_network_from_config_matches_lumped_conductance_at_steady_state():
+    cfg = GreenhouseConfig(40, -80)
+    k = cfg.coefficients()
+    times = pd.date_range("2025-01-01", periods=24 * 20, freq="h", tz="UTC")
+    still = pd.DataFrame({"temp": 0.0, "wind_speed": 0.0, "Q_solar": 0.0}, index=times)
+
+    net = ThermalNetwork.from_config(cfg, zones=1, air_layers=1)
+    result = net.simulate(still, 0.0, part_load=np.ones(len(times)), heater_W=cfg.heater_W)
+    expected = cfg.heater_W * HEATER_EFFICIENCY / (k.ua_total_W_K + k.infiltration_W_K)
+    assert result.T_air[-1, 0] == pytest.approx(expected, rel=1e-3)
+
+    layered = ThermalNetwork.from_config(cfg, zones=3, air_layers=4)
+    C = sum(layered._compile()["C"])
+    assert len(layered) == 3 * (2 * 4 + 3)
+    assert C == pytest.approx(k.C_total_J_K + GLAZING_HEAT_J_M2_K * (cfg.wall_A + cfg.roof_A))
+
+
+def test_network_ensemble_members_match_single_runs():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(24)
+    net = ThermalNetwork.from_config(cfg, zones=2, air_layers=3)
+    vents = np.stack([(np.arange(24) % 3 == 0) * 2.0, np.zeros(24), np.full(24, 1.0)], axis=1)
+    starts = np.array([10.0, 15.0, 20.0])
+
+    batch = net.simulate(forecast, np.broadcast_to(starts, (len(net), 3)), part_load=0.5, vent_ach=vents,
+                         heater_W=cfg.heater_W)
+    for i, T0 in enumerate(starts):
+        single = net.simulate(forecast, T0, part_load=0.5, vent_ach=vents[:, i], heater_W=cfg.heater_W)
+        np.testing.assert_allclose(batch.T[:, :, i], single.T[:, :, 0], rtol=1e-10)
+
+    controlled = net.simulate(forecast, 5.0, controller=GreenhouseThermalEngine(cfg, 5.0).controller,
+                              heater_W=cfg.heater_W)
+    assert controlled.part_load[:6].mean() > 0.5 and list(controlled.frame().columns[-3:]) == ["T_air", "part_load", "vent_ach"]
+
+
+def test_network_with_varying_wind_reuses_grid_factorizations():
+    import scipy.sparse as sp
+    from scipy.sparse.linalg import spsolve
+    from GreenhouseEngine import WIND_COEFF
+
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(48).assign(wind_speed=np.abs(np.random.default_rng(0).normal(3, 1.5, 48)))
+    net = ThermalNetwork.from_config(cfg, zones=2, air_layers=3)
+    result = net.simulate(forecast, 10.0, steps=48, part_load=0.5, heater_W=cfg.heater_W, substeps=2)
+    assert len(net._factors) <= 1 + int(forecast["wind_speed"].max() + 0.5)      # one per grid wind speed
+
+    # plain backward Euler, factored afresh at every sub-step's exact wind
+    m, dt_s = net._compile(), 1800.0
+    T = np.full(len(net), 10.0)
+    for k in range(48):
+        row = forecast.iloc[k]
+        G_ext = m["G_wind"] * (1 + WIND_COEFF * row["wind_speed"])
+        A = (m["K"] + sp.diags(m["C"] / dt_s + G_ext)).tocsc()
+        for _ in range(2):
+            T = spsolve(A, m["C"] / dt_s * T + m["solar"] * row["Q_solar"] + G_ext * row["temp"]
+                        + m["heater"] * 0.5 * cfg.heater_W * HEATER_EFFICIENCY)
+    np.testing.assert_allclose(result.T[-1, :, 0], T, atol=1e-6)
+
+
+def test_network_ensemble_needs_a_batch_controller():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(24)
+    net = ThermalNetwork.from_config(cfg, zones=1, air_layers=1)
+    starts = np.broadcast_to([5.0, 15.0], (len(net), 2))
+
+    with pytest.raises(TypeError, match="PredictiveBatch"):
+        net.simulate(forecast, starts, controller=cfg.controller, heater_W=cfg.heater_W, steps=12)
+
+    batch = net.simulate(forecast, starts, controller=PredictiveBatch.from_controllers([cfg.controller.fresh()] * 2),
+                         heater_W=cfg.heater_W, steps=12)
+    for i, T0 in enumerate([5.0, 15.0]):
+        single = net.simulate(forecast, T0, controller=cfg.controller.fresh(), heater_W=cfg.heater_W, steps=12)
+        np.testing.assert_allclose(batch.T_air[:, i], single.T_air[:, 0], rtol=1e-10)
+
+
+def test_network_runs_start_from_fresh_controller_memory():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(24)
+    net = ThermalNetwork.from_config(cfg, zones=1, air_layers=1)
+    warm = PredictiveBatch.from_controllers([cfg.controller.fresh()] * 2)
+    warm.on_timer[:], warm.heater_state[:] = 3, True
+    starts = np.broadcast_to([5.0, 15.0], (len(net), 2))
+
+    first = net.simulate(forecast, starts, controller=warm, heater_W=cfg.heater_W, steps=12)
+    second = net.simulate(forecast, starts, controller=warm, heater_W=cfg.heater_W, steps=12)
+    reference = net.simulate(forecast, starts, controller=warm.fresh(), heater_W=cfg.heater_W, steps=12)
+    np.testing.assert_array_equal(first.T, second.T)
+    np.testing.assert_array_equal(first.T, reference.T)
+    assert (warm.on_timer == 3).all() and warm.heater_state.all()       # the caller's memory is untouched
+
+
+# ------------------------------------------------------------------
+# 18 · Layered ground -----------------------------------------------
+# ------------------------------------------------------------------
+from ThermalMass import LayeredGround, thomas_solve
+
+
+def test_thomas_solve_matches_dense_solve():
+    rng = np.random.default_rng(0)
+    lower, upper = rng.uniform(-1, 0, (2, 5, 9))
+    diag, rhs = rng.uniform(3, 4, (5, 9)), rng.normal(size=(5, 9))
+    x = thomas_solve(lower, diag, upper, rhs)
+    for i in range(5):
+        A = np.diag(diag[i]) + np.diag(lower[i, 1:], -1) + np.diag(upper[i, :-1], 1)
+        np.testing.assert_allclose(A @ x[i], rhs[i], rtol=1e-12)
+
+
+def test_single_insulated_layer_reproduces_lumped_mass():
+    cfg = GreenhouseConfig(40, -80)
+    lumped = LayeredGround(1.0, [1.0], conductivity=0.0, heat_J_m3_K=cfg.coefficients().C_mass_J_K)
+    engine = GreenhouseThermalEngine(cfg, 12.0)
+    exact = engine.simulate_ensemble([12.0, 20.0], [12.0, 20.0], make_forecast(60), steps=48, integrator="exact")
+    layered = engine.simulate_ensemble([12.0, 20.0], [12.0, 20.0], make_forecast(60), steps=48, ground=lumped)
+
+    np.testing.assert_allclose(layered["T_air"], exact["T_air"], atol=0.2)
+    np.testing.assert_allclose(layered["T_mass"], exact["T_mass"], atol=0.2)
+
+
+def test_layered_ground_ensemble_relaxes_to_deep_temperature():
+    cfg = GreenhouseConfig(40, -80)
+    ground = cfg.layered_ground(layers=16, depth_m=6.0, deep_temp_C=10.0)
+    assert len(ground) == 16 and ground.thicknesses.sum() == pytest.approx(6.0)
+    assert ground.thicknesses[0] < ground.thicknesses[-1]
+
+    forecast = make_forecast(72)
+    engine = GreenhouseThermalEngine(cfg, 15.0)
+    both = engine.simulate_ensemble([15.0, 25.0], [15.0, 25.0], forecast, steps=60, ground=ground)
+    single = engine.simulate_ensemble([25.0], [25.0], forecast, steps=60, ground=ground)
+    np.testing.assert_allclose(both["T_air"][1], single["T_air"][0], rtol=1e-12)
+
+    profile = both.ground_profile
+    assert profile.shape == (2, 16)
+    assert abs(profile[1, -1] - 10.0) < abs(profile[1, 0] - 10.0)     # deep layers stay near the boundary
+
+
+# ------------------------------------------------------------------
+# 19 · Coupled climate kernel ---------------------------------------
+# ------------------------------------------------------------------
+from Climate import (ClimateParams, ClimateState, absolute_humidity, climate_step, saturation_density,
+                     simulate_climate)
+from GreenhouseEngine import WIND_COEFF
+
+
+def test_climate_without_moisture_matches_exact_ensemble():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(60).assign(humidity=20.0)
+    dry = ClimateParams.from_configs([cfg, cfg], crop_cover=0.0)
+    climate = simulate_climate([cfg, cfg], forecast, ClimateState.from_rh([12.0, 20.0], [12.0, 20.0], 20.0),
+                               steps=48, rh_max=None, params=dry)
+    exact = GreenhouseThermalEngine(cfg, 12.0).simulate_ensemble([12.0, 20.0], [12.0, 20.0], forecast,
+                                                                 steps=48, integrator="exact")
+
+    assert climate["condensation_kg_h"].max() == 0.0
+    np.testing.assert_allclose(climate["T_air"], exact["T_air"], rtol=1e-12)
+    np.testing.assert_array_equal(climate["heater_on"], exact["heater_on"])
+
+
+def test_vapour_and_co2_relax_to_exterior_at_the_exchange_rate():
+    cfg = GreenhouseConfig(40, -80)
+    p = ClimateParams.from_configs([cfg], crop_cover=0.0)
+    state = ClimateState.from_rh(20.0, 20.0, 90.0, co2_ppm=1000.0)
+    abs_ext = absolute_humidity(40.0, 20.0)
+
+    new, flux = climate_step(state, p, T_ext=20.0, abs_ext=abs_ext, co2_ext=420.0, wind=2.0, Q_solar=0.0,
+                             Q_heat=0.0, vent_ach=1.5, dt_s=3600)
+    decay = np.exp(-(cfg.leak_ach * (1 + WIND_COEFF * 2.0) + 1.5))
+    np.testing.assert_allclose(new.abs_humidity, abs_ext + (state.abs_humidity - abs_ext) * decay, rtol=1e-12)
+    np.testing.assert_allclose(new.co2_ppm, 420.0 + 580.0 * decay, rtol=1e-12)
+    np.testing.assert_allclose(new.T_air, 20.0)
+    assert flux["transpiration"] == 0.0 and flux["condensation"] == 0.0
+
+
+def test_crop_and_cold_glazing_drive_humidity_and_co2():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(72).assign(humidity=80.0)
+    result = simulate_climate(cfg, forecast, ClimateState.from_rh(15.0, 15.0, 70.0), steps=48, rh_max=None)
+    hour = forecast.index.hour[:48]
+    noon, night = (hour >= 11) & (hour <= 14), (hour <= 3)
+
+    assert result["transpiration_kg_h"][0, noon].mean() > 5 * result["transpiration_kg_h"][0, night].mean()
+    assert result["condensation_kg_h"].sum() > 0               # glazing below the dew point in a frosty week
+    assert result["RH"].max() <= 100.0 + 1e-9
+    assert result["CO2_ppm"][0, noon].mean() < 420.0 < result["CO2_ppm"][0, night].mean()
+
+    # supersaturated air is condensed back to the dew point
+    assert result["abs_humidity"].min() > 0
+    assert np.all(saturation_density(result["T_air"]) >= result["abs_humidity"] - 1e-12)
+
+
+def test_rh_aware_control_vents_to_dehumidify():
+    cfg = GreenhouseConfig(40, -80)
+    forecast = make_forecast(60).assign(humidity=90.0)
+    forecast["temp"] += 15.0
+    start = ClimateState.from_rh(18.0, 18.0, 80.0)
+    plain = simulate_climate(cfg, forecast, start, steps=48, rh_max=None)
+    aware = simulate_climate(cfg, forecast, start, steps=48, rh_max=75.0)
+
+    assert aware["vent_ach"].sum() > plain["vent_ach"].sum()
+    assert aware["RH"].mean() < plain["RH"].mean()
+
+
+def test_time_blocks_and_members_match_serial_runs():
+    configs = [GreenhouseConfig(40, -80), GreenhouseConfig(40, -80, num_footings=16)]
+    forecast = make_forecast(24 * 6 + 12).assign(humidity=75.0)
+    start = ClimateState.from_rh(15.0, 15.0, 70.0)
+    prescribed = dict(part_load=np.tile([1.0, 1.0, 0.0], len(forecast) // 3 + 1)[: len(forecast)],
+                      vent_ach=0.5)
+
+    serial = simulate_climate(configs, forecast, start, steps=24 * 6, **prescribed)
+    single = simulate_climate(configs[1], forecast, start, steps=24 * 6, **prescribed)
+    np.testing.assert_allclose(serial["T_air"][1], single["T_air"][0], rtol=1e-12)
+    np.testing.assert_allclose(serial["CO2_ppm"][1], single["CO2_ppm"][0], rtol=1e-12)
+
+    blocked = simulate_climate(configs, forecast, start, steps=24 * 6, blocks=3, spinup=36, **prescribed)
+    assert blocked["T_air"].shape == serial["T_air"].shape
+    np.testing.assert_allclose(blocked["T_air"][:, :48], serial["T_air"][:, :48], rtol=1e-12)
+    np.testing.assert_allclose(blocked["T_air"], serial["T_air"], atol=0.05)
+    np.testing.assert_allclose(blocked["RH"], serial["RH"], atol=0.5)
+
+    with pytest.raises(ValueError):
+        simulate_climate(configs, forecast, start, steps=24 * 6, blocks=5)
@@ -0,0 +1,150 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from GreenhouseEngine import GreenhouseThermalEngine
+
+"""
+Incremental re-simulation for rolling forecasts. The forecast is
+refetched every hour and most of it barely changes, so instead of
+re-running the whole horizon, `RollingSimulation` keeps the state
+(air/mass temperature and controller memory) at every simulated hour
+and, given the new forecast, resumes from the last hour whose result
+cannot have changed.
+
+Step k reads temp, wind_speed and Q_solar of row k, and its decision
+reads temp and Q_solar (and, for tariff-aware controllers, the
+timestamps) of rows k … k+H-1. So when row d is the first to differ
+beyond tolerance, steps before max(0, d - (H-1)) are reused as they
+are, or before d when only wind changed.
+"""
+
+# largest change that still counts as the same forecast value
+TOLERANCES = {"temp": 0.01, "wind_speed": 0.01, "Q_solar": 1.0}    # °C, m s⁻¹, W
+LOOKAHEAD_COLUMNS = ("temp", "Q_solar")
+
+def first_difference(old: dict[str, np.ndarray], new: dict[str, np.ndarray], tolerances: dict = TOLERANCES) -> dict:
+    """First row per column where `new` departs from `old`; rows past the shorter of the two count as changed."""
+    firsts = {}
+    for name, tol in tolerances.items():
+        n = min(len(old[name]), len(new[name]))
+        changed = np.flatnonzero(np.abs(new[name][:n] - old[name][:n]) > tol)
+        firsts[name] = int(changed[0]) if changed.size else n
+    return firsts
+
+class RollingSimulation:
+    """
+    One greenhouse followed along a refreshed forecast. `update` takes
+    each new forecast (same columns and hourly index as
+    `get_hourly_forecast`) and returns the full `simulate_step` frame,
+    recomputing only the hours the change can reach. The forecast may
+    start later than the previous one, as long as it starts at or
+    before the end of the previous run, whose state it continues from.
+    """
+    def __init__(self, engine: GreenhouseThermalEngine, initial_air_temp: float, initial_mass_temp: float,
+                 horizon: int = 12, integrator: str = "exact", dt_hr: float = 1.0, tolerances: dict = TOLERANCES):
+        self.engine = engine
+        self.horizon = horizon
+        self.integrator = integrator
+        self.dt_hr = dt_hr
+        self.tolerances = tolerances
+        self.initial_state = (initial_air_temp, initial_mass_temp, dict(engine.snapshot().controller))
+        self.forecast: pd.DataFrame | None = None
+        self.arrays: dict[str, np.ndarray] = {}      # result columns of the current run
+        self.checkpoints: list = []        # state before each step, plus the state after the last
+        self.resumed_at = 0                # step the last update restarted from
+        self.steps_simulated = 0           # steps the last update actually ran
+        self.elapsed_s = 0.0
+
+    def reset(self, air_temp: float, mass_temp: float) -> None:
+        """Drop the history, e.g. after a measured state replaces the simulated one."""
+        self.initial_state = (air_temp, mass_temp, dict(self.engine.snapshot().controller))
+        self.forecast, self.arrays, self.checkpoints = None, {}, []
+
+    def update(self, forecast_df: pd.DataFrame, steps: int | None = None) -> pd.DataFrame:
+        """
+        Simulation over `forecast_df` (default: every row with a full
+        look-ahead), reusing the previous run where it still holds.
+        """
+        t0 = time.perf_counter()
+        steps = len(forecast_df) - (self.horizon - 1) if steps is None else steps
+        if steps <= 0:
+            raise ValueError(f"Forecast of {len(forecast_df)} rows is shorter than the horizon {self.horizon}")
+
+        offset, resume = 0, 0
+        start_state = self.initial_state
+        if self.forecast is not None:
+            old_times, new_times = self.forecast.index.asi8, forecast_df.index.asi8
+            offset = int(np.searchsorted(old_times, new_times[0]))
+            if offset >= min(len(self.checkpoints), len(old_times)) or old_times[offset] != new_times[0]:
+                raise ValueError(f"Forecast starting {forecast_df.index[0]} does not continue the previous run; "
+                                 f"call reset() with the current state")
+            old = {name: self.forecast[name].to_numpy(dtype=float)[offset:] for name in self.tolerances}
+            new = {name: forecast_df[name].to_numpy(dtype=float) for name in self.tolerances}
+            n = min(len(old_times) - offset, len(new_times))
+            moved = np.flatnonzero(old_times[offset : offset + n] != new_times[:n])
+            firsts = first_difference(old, new, self.tolerances)
+            first_any = min(firsts.values())
+            first_lookahead = min([firsts[c] for c in LOOKAHEAD_COLUMNS if c in firsts] + [int(moved[0]) if moved.size else n])
+            resume = min(max(0, first_lookahead - (self.horizon - 1)), first_any,
+                         len(self.checkpoints) - 1 - offset, steps)
+            start_state = self.checkpoints[offset + resume]
+
+        if resume >= steps:
+            # nothing that changed reaches the requested hours: serve the previous run
+            arrays = {name: values[offset : offset + steps] for name, values in self.arrays.items()}
+            checkpoints = self.checkpoints[offset : offset + steps + 1]
+            for name, value in checkpoints[-1][2].items():
+                setattr(self.engine.controller, name, value)
+        else:
+            air_temp, mass_temp, memory = start_state
+            for name, value in memory.items():
+                setattr(self.engine.controller, name, value)
+            checkpoints = []
+            arrays = self.engine.simulate_arrays(air_temp, mass_temp, forecast_df, start_i=resume, steps=steps - resume,
+                                                 horizon=self.horizon, integrator=self.integrator, dt_hr=self.dt_hr,
+                                                 checkpoints=checkpoints, carry_controller=True)
+            if resume:
+                arrays = {name: np.concatenate([self.arrays[name][offset : offset + resume], values])
+                          for name, values in arrays.items()}
+                checkpoints = self.checkpoints[offset : offset + resume] + checkpoints
+        self.arrays, self.checkpoints, self.forecast = arrays, checkpoints, forecast_df
+        self.initial_state = checkpoints[0]
+        self.resumed_at, self.steps_simulated = resume, steps - resume
+
+        result = pd.DataFrame(arrays, index=forecast_df.index[:steps])
+        result.index.name = "datetime"
+        self.elapsed_s = time.perf_counter() - t0
+        return result
+
+
+if __name__ == "__main__":
+    from GreenhouseEngine import GreenhouseConfig
+
+    hours, horizon, updates = 48, 12, 24
+    times = pd.date_range("2025-01-01", periods=hours + horizon - 1 + updates, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    rng = np.random.default_rng(0)
+    truth = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "wind_speed": 3.0,
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+    }, index=times)
+
+    cfg = GreenhouseConfig(40.44, -79.99)
+    rolling = RollingSimulation(GreenhouseThermalEngine(cfg, 18.0), 18.0, 18.0, horizon=horizon)
+    full_s = incremental_s = 0.0
+    for u in range(updates):
+        # each refresh starts an hour later and revises only the last few hours
+        forecast_df = truth.iloc[u : u + hours + horizon - 1].copy()
+        forecast_df.iloc[-6:, 0] += rng.normal(0, 1.0, 6)
+        rolling.update(forecast_df)
+        incremental_s += rolling.elapsed_s
+
+        engine = GreenhouseThermalEngine(cfg, 18.0)
+        t0 = time.perf_counter()
+        engine.simulate_step(18.0, 18.0, forecast_df, steps=hours, horizon=horizon, integrator="exact")
+        full_s += time.perf_counter() - t0
+    print(f"{updates} updates of a {hours} h horizon: full re-runs {full_s * 1e3:.1f} ms, "
+          f"incremental {incremental_s * 1e3:.1f} ms (last resumed at step {rolling.resumed_at})")
@@ -1,23 +1,40 @@
+import os
 import streamlit as st
 import pandas as pd
 import altair as alt
 from GreenhouseEngine import GreenhouseConfig, GreenhouseThermalEngine
 from forecast import get_geocode, get_hourly_forecast
 from energy import get_rate, estimate_energy
+from simcache import SimulationCache
 
 # -----------------------------------------------------------------------------
 # Cached simulation helper (returns sim + raw forecast) ------------------------
 # -----------------------------------------------------------------------------
-@st.cache_data(show_spinner=True)
-def run_sim(city: str, state: str, country: str, hrs: int = 24):
-    """Fetch forecast, run engine, return (sim_df, forecast_df)."""
-    lat, lon = get_geocode(city, state, country)
+@st.cache_resource
+def simulation_cache() -> SimulationCache:
+    """One result cache per server process, shared by every session."""
+    return SimulationCache(maxsize=512, directory=os.getenv("SIM_CACHE_DIR"))
+
+@st.cache_data(show_spinner=False)
+def geocode(city: str, state: str, country: str):
+    return get_geocode(city, state, country)
+
+def run_sim(city: str, state: str, country: str, hrs: int = 24, timezone: str = "UTC"):
+    """
+    Fetch forecast, run engine, return (sim_df, forecast_df). The
+    forecast is fetched every time; the simulation is cached on its
+    content, so a new forecast always gets fresh physics. `timezone` is
+    the site's; results are indexed on its clock, which is the one
+    tariffs read them on.
+    """
+    lat, lon = geocode(city, state, country)
     cfg      = GreenhouseConfig(lat, lon)
     engine   = GreenhouseThermalEngine(cfg, air_temp_init_C=20.0)
 
-    forecast_df = get_hourly_forecast(lat, lon, cfg, timezone="UTC").iloc[: hrs + 12]
+    forecast_df = get_hourly_forecast(lat, lon, cfg, timezone=timezone).iloc[: hrs + 12]
 
-    sim_df = engine.simulate_step(
+    sim_df = simulation_cache().simulate_step(
+        engine,
         initial_air_temp = 20.0,
         initial_mass_temp = 20.0,
         forecast_df = forecast_df,
@@ -47,11 +64,12 @@ st.sidebar.header("Location & options")
 city    = st.sidebar.text_input("City", "Pittsburgh")
 state   = st.sidebar.text_input("State / Province", "PA")
 country = st.sidebar.text_input("Country code", "US")
+timezone = st.sidebar.text_input("Site timezone", "US/Eastern")
 hrs     = st.sidebar.slider("Hours to simulate", 6, 48, 24, step=6)
 
 if st.sidebar.button("Run simulation"):
     with st.spinner("Fetching forecast & running engine …"):
-        sim_df, fc_df = run_sim(city, state, country, hrs)
+        sim_df, fc_df = run_sim(city, state, country, hrs, timezone)
 
     st.success("Simulation complete")
 
@@ -0,0 +1,169 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+import dataclasses
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from GreenhouseEngine import CONTROLLER_STATE, GreenhouseThermalEngine
+
+"""
+Content-addressed cache for `GreenhouseThermalEngine.simulate_step`.
+A run is identified by what determines its result: the engine's
+coefficients, the controller's settings and memory, the forecast rows
+the run reads (values and timestamps), the initial air/mass temperatures
+and the step arguments. Those are hashed into a key, so a new forecast
+or an edited config is a new key and a stale result is never served,
+while identical requests from any caller share one computation.
+
+Results live in an in-memory LRU and, optionally, in a directory of
+pickles shared between processes. A hit also replays the controller
+memory the run left behind, so the engine ends up exactly as if it had
+simulated.
+"""
+
+FORECAST_COLUMNS = ("temp", "wind_speed", "Q_solar")
+KEY_VERSION = 1
+
+def _feed(h, value) -> None:
+    """Hash `value` into `h` with its type, recursing through dataclasses and containers."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        h.update(type(value).__qualname__.encode())
+        for f in dataclasses.fields(value):
+            if f.init:                      # init=False fields are derived from the others
+                h.update(f.name.encode())
+                _feed(h, getattr(value, f.name))
+    elif isinstance(value, np.ndarray):
+        h.update(f"{value.dtype.str}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=repr):
+            _feed(h, k)
+            _feed(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _feed(h, item)
+    else:
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+
+def simulation_key(engine: GreenhouseThermalEngine, initial_air_temp, initial_mass_temp, forecast_df: pd.DataFrame,
+                   start_i: int = 0, steps: int = 12, horizon: int = 12, integrator: str = "euler",
+                   dt_hr: float = 1.0) -> str:
+    """Hex digest naming the result of `engine.simulate_step` with these arguments."""
+    h = hashlib.sha256()
+    _feed(h, KEY_VERSION)
+    _feed(h, engine.cfg.coefficients())
+    _feed(h, engine.controller.fresh())      # runs start from reset controller memory
+    _feed(h, (float(initial_air_temp), float(initial_mass_temp), steps, horizon, integrator, float(dt_hr)))
+
+    rows = slice(start_i, start_i + steps + horizon - 1)
+    for name in FORECAST_COLUMNS:
+        _feed(h, forecast_df[name].to_numpy(dtype=float)[rows])
+    index = forecast_df.index[rows]
+    if isinstance(index, pd.DatetimeIndex):
+        _feed(h, (str(index.tz), index.asi8))
+    else:
+        _feed(h, list(index))
+    return h.hexdigest()
+
+class SimulationCache:
+    def __init__(self, maxsize: int = 256, directory: str | None = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries: OrderedDict[str, tuple[pd.DataFrame, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> tuple[pd.DataFrame, dict] | None:
+        """(result, controller memory) for a key, from memory or disk; None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.directory and os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as f:
+                entry = pickle.load(f)
+            self._remember(key, entry)
+            with self._lock:
+                self.disk_hits += 1
+            return entry
+        return None
+
+    def put(self, key: str, result: pd.DataFrame, controller_memory: dict) -> None:
+        entry = (result, controller_memory)
+        self._remember(key, entry)
+        if self.directory:
+            # write beside the final name, then rename into place
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+
+    def _remember(self, key: str, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def simulate_step(self, engine: GreenhouseThermalEngine, initial_air_temp, initial_mass_temp,
+                      forecast_df: pd.DataFrame, start_i: int = 0, steps: int = 12, horizon: int = 12,
+                      integrator: str = "euler", dt_hr: float = 1.0) -> pd.DataFrame:
+        """`engine.simulate_step(...)`, served from the cache when the same run was seen before."""
+        args = dict(start_i=start_i, steps=steps, horizon=horizon, integrator=integrator, dt_hr=dt_hr)
+        key = simulation_key(engine, initial_air_temp, initial_mass_temp, forecast_df, **args)
+        entry = self.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            result = engine.simulate_step(initial_air_temp, initial_mass_temp, forecast_df, **args)
+            memory = {name: getattr(engine.controller, name) for name in CONTROLLER_STATE
+                      if hasattr(engine.controller, name)}
+            self.put(key, result, memory)
+            return result.copy()
+
+        result, memory = entry
+        engine.coeffs = engine.cfg.coefficients()
+        for name, value in memory.items():
+            setattr(engine.controller, name, value)
+        return result.copy()
+
+
+if __name__ == "__main__":
+    import time
+
+    from GreenhouseEngine import GreenhouseConfig
+
+    hours = 48
+    times = pd.date_range("2025-01-01", periods=hours + 12, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    forecast_df = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "wind_speed": 3.0,
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+    }, index=times)
+    cfg = GreenhouseConfig(40.44, -79.99)
+    cache = SimulationCache()
+
+    for label in ("cold", "warm"):
+        t0 = time.perf_counter()
+        cache.simulate_step(GreenhouseThermalEngine(cfg, 20.0), 20.0, 20.0, forecast_df, steps=hours)
+        print(f"{label}: {(time.perf_counter() - t0) * 1e3:.2f} ms")
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from functools import lru_cache
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+"""
+The SolarTable class precomputes a site's solar geometry and clear-sky
+irradiance for a whole reference year and keeps it in a memory-mapped
+.npy file. Forecast-time solar prep then only slices rows by hour of
+year; the cloud correction and transposition still run per forecast.
+
+The reference year is a leap year, and dates from other years map onto
+it by month/day/time. Sun position drifts by well under a degree
+between years, which is negligible next to forecast cloud error.
+"""
+
+SOLAR_TABLE_DIR = os.getenv("SOLAR_TABLE_DIR",
+                            os.path.join(os.path.expanduser("~"), ".cache", "sankofa_twin", "solar"))
+REFERENCE_YEAR = 2024
+COLUMNS = ("apparent_zenith", "azimuth", "ghi", "dni", "dhi")
+MINUTES_PER_YEAR = 366 * 24 * 60
+
+class SolarTable:
+    def __init__(self, data: np.ndarray, resolution_min: int):
+        self.data = data                       # (rows, len(COLUMNS)), usually a memmap
+        self.resolution_min = resolution_min
+
+    @staticmethod
+    def path_for(lat: float, lon: float, altitude: float, resolution_min: int,
+                 directory: str = SOLAR_TABLE_DIR) -> str:
+        return os.path.join(directory, f"solar_{lat:.2f}_{lon:.2f}_{altitude:.0f}m_{resolution_min}min.npy")
+
+    @classmethod
+    def compute(cls, lat: float, lon: float, altitude: float = 250, resolution_min: int = 60) -> np.ndarray:
+        """Solar position and clear-sky GHI/DNI/DHI for every step of the reference year."""
+        import pvlib
+
+        times = pd.date_range(f"{REFERENCE_YEAR}-01-01", periods=MINUTES_PER_YEAR // resolution_min,
+                              freq=f"{resolution_min}min", tz="UTC")
+        sol = cast(pd.DataFrame, pvlib.solarposition.get_solarposition(times, lat, lon))
+        site = pvlib.location.Location(lat, lon, tz="UTC", altitude=altitude)
+        sky = cast(pd.DataFrame, site.get_clearsky(times))
+        return np.column_stack([
+            sol["apparent_zenith"].to_numpy(),
+            sol["azimuth"].to_numpy() % 360,
+            sky["ghi"].to_numpy(),
+            sky["dni"].to_numpy(),
+            sky["dhi"].to_numpy(),
+        ])
+
+    @classmethod
+    def load(cls, lat: float, lon: float, altitude: float = 250, resolution_min: int = 60,
+             directory: str = SOLAR_TABLE_DIR) -> "SolarTable":
+        """Open the site's table, building and saving it on first use."""
+        lat, lon = round(lat, 2), round(lon, 2)
+        path = cls.path_for(lat, lon, altitude, resolution_min, directory)
+        if not os.path.exists(path):
+            data = cls.compute(lat, lon, altitude, resolution_min)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".npy")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp_path, path)
+        return cls(np.load(path, mmap_mode="r"), resolution_min)
+
+    def rows(self, times: pd.DatetimeIndex) -> np.ndarray:
+        """Table rows at `times` (any year, any timezone)."""
+        utc = times.tz_convert("UTC") if times.tz is not None else times
+        day = utc.dayofyear.to_numpy() - 1
+        day += (~utc.is_leap_year & (utc.month > 2)).astype(int)     # skip Feb 29 outside leap years
+        minute = day * 1440 + utc.hour.to_numpy() * 60 + utc.minute.to_numpy()
+        return np.take(self.data, minute // self.resolution_min, axis=0, mode="wrap")
+
+    def frame(self, times: pd.DatetimeIndex) -> pd.DataFrame:
+        return pd.DataFrame(self.rows(times), index=times, columns=list(COLUMNS))
+
+@lru_cache(maxsize=64)
+def get_solar_table(lat: float, lon: float, altitude: float = 250, resolution_min: int = 60) -> SolarTable:
+    """Process-wide handle on a site's table (see `SolarTable.load`)."""
+    return SolarTable.load(lat, lon, altitude, resolution_min)
@@ -0,0 +1,184 @@
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import BacktestTotals
+from energy import DEFAULT_PLAN
+from GreenhouseEngine import GreenhouseConfig, GreenhouseThermalEngine
+
+"""
+Scenario sweeps. A parameter grid (footings, design ΔT, glazing U, leak
+rate, controller set-points, …) becomes one GreenhouseConfig per point,
+and the points run across a process pool against one forecast. The
+forecast columns live in a shared-memory block that every worker maps,
+so nothing but the scenario parameters and the summary row is pickled.
+Results come back as one tidy table: a row per scenario with its
+parameters and the `BacktestTotals` metrics.
+"""
+
+FORECAST_COLUMNS = ("temp", "wind_speed", "Q_solar")
+CONSTRUCTOR_PARAMS = ("num_footings", "design_temp_diff_C")
+# attributes that `coefficients()` reads directly, or that the mass is rebuilt from;
+# geometry is not here, since the areas, volume and air capacity are derived once in __init__
+CONFIG_PARAMS = ("wall_R", "roof_R", "floor_R", "glazing_R", "leak_ach", "design_vent_ach",
+                 "h_ma_W_K", "mass_c_p", "soil_coupling", "heater_W")
+CONTROLLER_PARAMS = ("T_set", "deadband", "safety_margin", "min_on_steps", "min_off_steps")
+
+def parameter_grid(**values) -> list[dict]:
+    """Every combination of the given values: parameter_grid(leak_ach=[0.3, 0.6], T_set=[16, 18])."""
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values.values())]
+
+def build_config(latitude: float, longitude: float, params: dict) -> GreenhouseConfig:
+    """
+    GreenhouseConfig for one scenario. `glazing_U` (W m⁻² K⁻¹) sets the
+    glazing R-value, CONFIG_PARAMS are set on the config before the mass
+    and controller are rebuilt (as `calibration.config_with` does), and
+    controller settings go to the rebuilt controller. Anything else,
+    geometry included, is rejected rather than silently ignored.
+    """
+    cfg = GreenhouseConfig(latitude, longitude, **{k: v for k, v in params.items() if k in CONSTRUCTOR_PARAMS})
+    for name, value in params.items():
+        if name in CONSTRUCTOR_PARAMS or name in CONTROLLER_PARAMS:
+            continue
+        if name == "glazing_U":
+            cfg.glazing_R = 1 / value
+        elif name in CONFIG_PARAMS:
+            setattr(cfg, name, value)
+        else:
+            raise ValueError(f"Sweep parameter {name!r} is not supported; expected one of "
+                             f"{CONSTRUCTOR_PARAMS + CONFIG_PARAMS + CONTROLLER_PARAMS + ('glazing_U',)}")
+
+    cfg.mass_kg = cfg._build_thermal_mass_KG(cfg.num_footings)
+    cfg.controller = cfg._build_controller()
+    for name in CONTROLLER_PARAMS:
+        if name in params:
+            setattr(cfg.controller, name, params[name])
+    return cfg
+
+# ────────────── SHARED FORECAST ────────────────────────────────────────
+class SharedForecast:
+    """
+    Forecast columns and UTC index in one shared-memory block. The
+    owner creates it from a DataFrame; workers `attach` by name and get
+    a DataFrame whose columns are views into the block.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, length: int, timezone: str | None, owner: bool):
+        self.shm = shm
+        self.length = length
+        self.timezone = timezone
+        self.owner = owner
+
+    @classmethod
+    def create(cls, forecast_df: pd.DataFrame) -> "SharedForecast":
+        n = len(forecast_df)
+        shm = shared_memory.SharedMemory(create=True, size=8 * n * (len(FORECAST_COLUMNS) + 1))
+        shared = cls(shm, n, str(forecast_df.index.tz) if forecast_df.index.tz is not None else None, owner=True)
+        values, stamps = shared._arrays()
+        for row, name in enumerate(FORECAST_COLUMNS):
+            values[row] = forecast_df[name].to_numpy(dtype=float)
+        stamps[:] = forecast_df.index.asi8
+        return shared
+
+    @classmethod
+    def attach(cls, name: str, length: int, timezone: str | None) -> "SharedForecast":
+        return cls(shared_memory.SharedMemory(name=name), length, timezone, owner=False)
+
+    def _arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        values = np.ndarray((len(FORECAST_COLUMNS), self.length), dtype=float, buffer=self.shm.buf)
+        stamps = np.ndarray((self.length,), dtype=np.int64, buffer=self.shm.buf,
+                            offset=8 * self.length * len(FORECAST_COLUMNS))
+        return values, stamps
+
+    def frame(self) -> pd.DataFrame:
+        values, stamps = self._arrays()
+        index = pd.DatetimeIndex(stamps.view("datetime64[ns]"), tz="UTC" if self.timezone else None)
+        if self.timezone:
+            index = index.tz_convert(self.timezone)
+        return pd.DataFrame(dict(zip(FORECAST_COLUMNS, values)), index=index.rename("datetime"), copy=False)
+
+    @property
+    def handle(self) -> tuple:
+        return (self.shm.name, self.length, self.timezone)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# ────────────── WORKERS ─────────────────────────────────────────────────
+_worker_forecast: pd.DataFrame | None = None
+_worker_shared: SharedForecast | None = None
+
+def _attach_worker(handle: tuple) -> None:
+    global _worker_forecast, _worker_shared
+    _worker_shared = SharedForecast.attach(*handle)
+    _worker_forecast = _worker_shared.frame()
+
+def run_scenario(forecast_df: pd.DataFrame, latitude: float, longitude: float, params: dict,
+                 start_i: int = 0, steps: int | None = None, horizon: int = 12,
+                 integrator: str = "exact", initial_temp: float = 18.0, plan=DEFAULT_PLAN) -> dict:
+    """Simulate one scenario and summarize it as a flat dict (parameters + totals)."""
+    cfg = build_config(latitude, longitude, params)
+    steps = len(forecast_df) - start_i if steps is None else steps
+    engine = GreenhouseThermalEngine(cfg, initial_temp)
+    arrays = engine.simulate_arrays(initial_temp, initial_temp, forecast_df, start_i=start_i, steps=steps,
+                                    horizon=horizon, integrator=integrator)
+    out = pd.DataFrame(arrays, index=forecast_df.index[start_i : start_i + steps])
+
+    totals = BacktestTotals()
+    controller = cfg.controller
+    T_min = controller.T_set - controller.deadband / 2
+    T_max = controller.T_set + controller.deadband / 2 + 5
+    totals.update(out, cfg.coefficients(), plan, T_min, T_max)
+    row = {**params, **asdict(totals), "T_air_mean": totals.T_air_mean}
+    for name in ("T_air_sum", "end", "steps"):
+        row.pop(name)
+    return row
+
+def _run_in_worker(args) -> dict:
+    return run_scenario(_worker_forecast, *args)
+
+def run_sweep(forecast_df: pd.DataFrame, grid: list[dict], latitude: float, longitude: float,
+              start_i: int = 0, steps: int | None = None, horizon: int = 12, integrator: str = "exact",
+              initial_temp: float = 18.0, processes: int | None = None, chunksize: int = 4) -> pd.DataFrame:
+    """
+    Run every scenario in `grid` over `forecast_df` on a process pool
+    (`processes` workers, default one per core) and return one row per
+    scenario, in grid order.
+    """
+    shared = SharedForecast.create(forecast_df)
+    try:
+        jobs = [(latitude, longitude, params, start_i, steps, horizon, integrator, initial_temp) for params in grid]
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                 initializer=_attach_worker, initargs=(shared.handle,)) as pool:
+            rows = list(pool.map(_run_in_worker, jobs, chunksize=chunksize))
+    finally:
+        shared.close()
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    hours = 24 * 90
+    times = pd.date_range("2025-01-01", periods=hours, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    forecast_df = pd.DataFrame({
+        "temp": -2 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi),
+        "wind_speed": 3.0,
+        "Q_solar": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 20_000,
+    }, index=times)
+    grid = parameter_grid(num_footings=[4, 8, 16], glazing_U=[1.8, 3.2, 5.8],
+                          leak_ach=[0.3, 0.6], T_set=[16.0, 18.0])
+
+    for processes in sorted({1, os.cpu_count() or 1}):
+        t0 = time.perf_counter()
+        table = run_sweep(forecast_df, grid, 40.44, -79.99, processes=processes)
+        elapsed = time.perf_counter() - t0
+        print(f"{len(table)} scenarios x {hours} h on {processes} process(es): {elapsed:.2f} s")
+    print(table.sort_values("cost").head())
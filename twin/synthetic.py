@@ -0,0 +1,232 @@
+import os
+import json
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from GreenhouseEngine import GreenhouseConfig, HEATER_EFFICIENCY, WIND_COEFF, exact_step_coefficients
+
+"""
+Synthetic training data for the control models. Many independent
+trajectories advance together as NumPy arrays, one vectorized update
+per hour, and the rows are written in columnar shards: a folder of
+per-column .npy files (or a Parquet file) per block of trajectories and
+hours. The columns match notebooks/data/synthetic_greenhouse_data.csv,
+plus `trajectory` and `step`, and every row carries its own hourly
+timestamp.
+
+Two drivers move the interior state. "toy" is the rule set of
+notebooks/generate_synthetic_data.ipynb. "physics" advances air
+temperature with the engine's exact air/mass update for a
+GreenhouseConfig and keeps the toy humidity rule, since the engine has
+no moisture balance. Output temperatures are in °F either way, like the
+notebook data the models are trained on.
+
+Random numbers are drawn one hour at a time from one stream per
+trajectory batch. A seed gives the same rows whatever `chunk_steps`,
+but the batches own the streams, so changing `batch_size` changes the
+rows; keep it fixed (it is recorded in the manifest when given) to
+reproduce a data set.
+"""
+
+COLUMNS = ("datetime", "trajectory", "step", "next_internal_temp", "next_internal_hum", "external_temp",
+           "internal_temp", "external_humidity", "internal_humidity", "heating", "venting")
+DRIVERS = ("toy", "physics")
+
+# weather and thermostat of the notebook (°F, %RH)
+EXT_TEMP_MEAN_F = 80.0
+EXT_TEMP_SD_F   = 40.0
+EXT_HUM_LOW     = 50.0
+EXT_HUM_HIGH    = 90.0
+HEAT_BELOW_F    = 65.0
+VENT_ABOVE_F    = 72.0
+START_TEMP_F    = (60.0, 80.0)
+START_HUM       = (60.0, 80.0)
+
+# extra weather for the physics driver
+WIND_MEAN_M_S   = 3.0
+WIND_SD_M_S     = 1.5
+SOLAR_PEAK_W    = 20_000.0
+
+def f_to_c(temp_f):
+    return (temp_f - 32.0) * 5.0 / 9.0
+
+def c_to_f(temp_c):
+    return temp_c * 9.0 / 5.0 + 32.0
+
+def toy_next_conditions(internal_temp, external_temp, internal_humidity, external_humidity, heating, venting):
+    """The notebook's `simulate_next_conditions` on arrays (heating/venting 0/1 arrays)."""
+    heating = np.asarray(heating, dtype=bool)
+    venting = np.asarray(venting, dtype=bool)
+    idle = ~(heating | venting)
+
+    temp = internal_temp + np.where(idle, 0.15, 0.05) * (external_temp - internal_temp)
+    humidity = internal_humidity + np.where(idle, 0.10, 0.03) * (external_humidity - internal_humidity)
+
+    temp = np.where(heating, temp + 2.0, temp)
+    humidity = np.where(heating, np.maximum(0.0, humidity - np.minimum(4.0, humidity * 0.3)), humidity)
+
+    temp = np.where(venting, temp + 0.4 * (external_temp - temp), temp)
+    humidity = np.where(venting, humidity + 0.35 * (external_humidity - humidity), humidity)
+
+    passive_gain = np.where(humidity < 85, 0.08 * (85 - humidity), 0.02)
+    humidity = np.where(~venting & (humidity < 90), humidity + passive_gain, humidity)
+
+    return temp, np.clip(humidity, 0.0, 100.0)
+
+class PhysicsDriver:
+    """
+    Interior air temperature from the engine's exact air/mass update
+    for one GreenhouseConfig: the heater runs at full power while
+    heating and the vents open to `vent_max_ach` while venting.
+    """
+    def __init__(self, cfg: GreenhouseConfig):
+        k = cfg.coefficients()
+        self.C_air, self.C_mass, self.h_ma = k.C_air_J_K, k.C_mass_J_K, k.h_ma_W_K
+        self.G_leak = k.ua_total_W_K + k.infiltration_W_K
+        self.G_vent = k.vent_W_K_per_ach * k.vent_max_ach
+        self.Q_heat = k.heater_W * HEATER_EFFICIENCY
+
+    def advance(self, air_c, mass_c, ext_c, wind, Q_solar, heating, venting, dt_hr=1.0):
+        G = self.G_leak * (1 + WIND_COEFF * wind) + np.where(venting, self.G_vent, 0.0)
+        p11, p12, p21, p22, air_free, mass_free, g_air, g_mass = exact_step_coefficients(
+            self.C_air, self.C_mass, self.h_ma, G, ext_c, Q_solar, dt_hr * 3600)
+        Q_heat = np.where(heating, self.Q_heat, 0.0)
+        air_ss, mass_ss = air_free + Q_heat * g_air, mass_free + Q_heat * g_mass
+        d_air, d_mass = air_c - air_ss, mass_c - mass_ss
+        return air_ss + p11 * d_air + p12 * d_mass, mass_ss + p21 * d_air + p22 * d_mass
+
+def generate(n_trajectories: int, n_steps: int, seed: int | None = 0, driver: str = "toy",
+             cfg: GreenhouseConfig | None = None, start="2025-01-01", chunk_steps: int = 24 * 7,
+             batch_size: int = 100_000, weather_corr: float = 0.0) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Yield blocks of rows as column arrays, one block per `batch_size`
+    trajectories x `chunk_steps` hours, rows trajectory-major within a
+    block. Hourly exterior temperature and humidity have the notebook's
+    marginals; `weather_corr` is their hour-to-hour AR(1) correlation
+    (0 reproduces the notebook's independent draws). The rows depend on
+    `seed` and `batch_size`, not on `chunk_steps`.
+    """
+    if driver not in DRIVERS:
+        raise ValueError(f"Unknown driver {driver!r}; expected one of {DRIVERS}")
+    physics = PhysicsDriver(cfg or GreenhouseConfig(40.44, -79.99)) if driver == "physics" else None
+    start_ns, start_hour = pd.Timestamp(start).value, pd.Timestamp(start).hour
+    hour_ns = 3_600_000_000_000
+    hum_mid, hum_half = (EXT_HUM_LOW + EXT_HUM_HIGH) / 2, (EXT_HUM_HIGH - EXT_HUM_LOW) / 2
+    innovation = np.sqrt(1 - weather_corr ** 2)
+
+    streams = np.random.SeedSequence(seed).spawn(-(-n_trajectories // batch_size))
+    for b, stream in enumerate(streams):
+        rng = np.random.default_rng(stream)
+        lo = b * batch_size
+        n = min(batch_size, n_trajectories - lo)
+        trajectory = np.arange(lo, lo + n)
+        temp = rng.uniform(*START_TEMP_F, n)
+        hum = rng.uniform(*START_HUM, n)
+        z_temp, z_hum = rng.standard_normal(n), rng.standard_normal(n)
+        mass_c = f_to_c(temp) if physics else None
+
+        for c0 in range(0, n_steps, chunk_steps):
+            steps = min(chunk_steps, n_steps - c0)
+            # filled hour by hour as contiguous rows, transposed once per block
+            block = {name: np.empty((steps, n)) for name in COLUMNS[3:9]}
+            block["heating"] = np.empty((steps, n), dtype=np.int8)
+            block["venting"] = np.empty((steps, n), dtype=np.int8)
+
+            for j, k in enumerate(range(c0, c0 + steps)):
+                if k:
+                    z_temp = weather_corr * z_temp + innovation * rng.standard_normal(n)
+                    z_hum = weather_corr * z_hum + innovation * rng.standard_normal(n)
+                ext_temp = EXT_TEMP_MEAN_F + EXT_TEMP_SD_F * z_temp
+                # uniform marginal from a standard normal: Φ(z) ≈ ½(1 + tanh(√(2/π)·(z + 0.044715 z³)))
+                ext_hum = hum_mid + hum_half * np.tanh(0.7978845608 * (z_hum + 0.044715 * z_hum ** 3))
+
+                heating = temp < HEAT_BELOW_F
+                venting = temp > VENT_ABOVE_F
+                if physics:
+                    hour = (k + start_hour) % 24
+                    wind = np.abs(WIND_MEAN_M_S + WIND_SD_M_S * rng.standard_normal(n))
+                    Q_solar = SOLAR_PEAK_W * max(np.sin((hour - 6) / 12 * np.pi), 0.0) * rng.uniform(0.25, 1.0, n)
+                    air_c, mass_c = physics.advance(f_to_c(temp), mass_c, f_to_c(ext_temp), wind, Q_solar,
+                                                    heating, venting)
+                    next_temp = c_to_f(air_c)
+                    _, next_hum = toy_next_conditions(temp, ext_temp, hum, ext_hum, heating, venting)
+                else:
+                    next_temp, next_hum = toy_next_conditions(temp, ext_temp, hum, ext_hum, heating, venting)
+
+                block["next_internal_temp"][j] = next_temp
+                block["next_internal_hum"][j] = next_hum
+                block["external_temp"][j] = ext_temp
+                block["internal_temp"][j] = temp
+                block["external_humidity"][j] = ext_hum
+                block["internal_humidity"][j] = hum
+                block["heating"][j] = heating
+                block["venting"][j] = venting
+                temp, hum = next_temp, next_hum
+
+            step = np.arange(c0, c0 + steps)
+            rows = {
+                "datetime": np.tile(start_ns + step * hour_ns, n).view("datetime64[ns]"),
+                "trajectory": np.repeat(trajectory, steps),
+                "step": np.tile(step, n),
+            }
+            rows.update({name: np.ascontiguousarray(values.T).ravel() for name, values in block.items()})
+            yield rows
+
+def write_shards(directory: str, n_trajectories: int, n_steps: int, fmt: str = "npy", **kwargs) -> dict:
+    """
+    Generate (see `generate`) straight to `directory`: one shard per
+    block, as part-NNNNN/<column>.npy or part-NNNNN.parquet, plus a
+    manifest.json. Returns the manifest.
+    """
+    if fmt not in ("npy", "parquet"):
+        raise ValueError(f"Unknown shard format {fmt!r}; expected 'npy' or 'parquet'")
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    for i, rows in enumerate(generate(n_trajectories, n_steps, **kwargs)):
+        name = f"part-{i:05d}"
+        if fmt == "parquet":
+            name += ".parquet"
+            pd.DataFrame(rows, copy=False).to_parquet(os.path.join(directory, name), index=False)
+        else:
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            for column, values in rows.items():
+                np.save(os.path.join(directory, name, f"{column}.npy"), values)
+        shards.append({"name": name, "rows": len(rows["step"])})
+
+    manifest = {"format": fmt, "columns": list(COLUMNS), "n_trajectories": n_trajectories, "n_steps": n_steps,
+                "units": {"temp": "°F", "humidity": "%RH"}, "shards": shards,
+                **{k: v for k, v in kwargs.items() if k != "cfg"}}
+    manifest["start"] = str(kwargs.get("start", "2025-01-01"))
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def read_shards(directory: str, columns=None) -> pd.DataFrame:
+    """Load shards written by `write_shards` into one DataFrame (npy columns are memory-mapped)."""
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    columns = list(columns or manifest["columns"])
+    frames = []
+    for shard in manifest["shards"]:
+        path = os.path.join(directory, shard["name"])
+        if manifest["format"] == "parquet":
+            frames.append(pd.read_parquet(path, columns=columns))
+        else:
+            frames.append(pd.DataFrame({c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r") for c in columns},
+                                       copy=False))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    for driver in DRIVERS:
+        directory = tempfile.mkdtemp()
+        t0 = time.perf_counter()
+        manifest = write_shards(directory, 100_000, 24 * 30, driver=driver, weather_corr=0.9)
+        elapsed = time.perf_counter() - t0
+        rows = sum(s["rows"] for s in manifest["shards"])
+        print(f"{driver}: {rows:,} rows in {elapsed:.1f} s ({rows / elapsed / 1e6:.1f} M rows/s)")
@@ -0,0 +1,212 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import datetime as dt
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from forecast import solar_gain
+
+"""
+The WeatherFile class reads EPW/TMY or CSV climate files for offline
+studies. The text is parsed once into a columnar cache: one .npy file
+per column plus the UTC timestamps, memory-mapped on every later open.
+Time-range slices are views into those maps, and `forecast` returns
+them with the column names `get_hourly_forecast` uses, so the engine
+consumes a weather file exactly like a live forecast.
+"""
+
+WEATHER_CACHE_DIR = os.getenv("WEATHER_CACHE_DIR",
+                              os.path.join(os.path.expanduser("~"), ".cache", "sankofa_twin", "weather"))
+COLUMNS = ("temp", "humidity", "wind_speed", "cloud_cover", "ghi", "dni", "dhi")
+TMY_YEAR = 2021                  # TMY months come from different years; put them on one
+
+# EPW data field -> (column, missing-value code, scale)
+EPW_FIELDS = {
+    6:  ("temp", 99.9, 1.0),          # dry bulb [°C]
+    8:  ("humidity", 999, 1.0),       # relative humidity [%]
+    13: ("ghi", 9999, 1.0),           # [W m⁻²]
+    14: ("dni", 9999, 1.0),
+    15: ("dhi", 9999, 1.0),
+    21: ("wind_speed", 999, 1.0),     # [m s⁻¹]
+    22: ("cloud_cover", 99, 10.0),    # total sky cover, tenths -> %
+}
+
+def _fill_missing(values: np.ndarray, missing: float) -> np.ndarray:
+    """Linear interpolation across missing-value codes (edges held)."""
+    values = values.astype(float)
+    bad = values >= missing
+    if bad.any() and not bad.all():
+        idx = np.arange(len(values))
+        values[bad] = np.interp(idx[bad], idx[~bad], values[~bad])
+    return values
+
+def parse_epw(path: str) -> tuple[pd.DatetimeIndex, dict, dict]:
+    """
+    Parse an EPW file into (UTC times, columns, site). EPW hours are
+    1-24, hour-ending, in local standard time; the site's latitude,
+    longitude and UTC offset come from the LOCATION header line.
+    """
+    with open(path, encoding="latin-1") as f:
+        location = f.readline().strip().split(",")
+    lat, lon, tz_hours = float(location[6]), float(location[7]), float(location[8])
+
+    fields = sorted(EPW_FIELDS)
+    raw = pd.read_csv(path, skiprows=8, header=None, usecols=[0, 1, 2, 3, *fields],
+                      encoding="latin-1").to_numpy()
+    def local_times(year):
+        stamps = pd.to_datetime({"year": year, "month": raw[:, 1].astype(int), "day": raw[:, 2].astype(int)})
+        return pd.DatetimeIndex(stamps) + pd.to_timedelta(raw[:, 3].astype(int) - 1, unit="h")
+
+    local = local_times(raw[:, 0].astype(int))
+    if len(local) > 1 and not (np.diff(local.asi8) == 3_600_000_000_000).all():
+        local = local_times(np.full(len(raw), TMY_YEAR))     # typical year spliced from many
+    times = (local - pd.Timedelta(hours=tz_hours)).tz_localize("UTC")
+
+    columns = {}
+    for j, field in enumerate(fields, start=4):
+        name, missing, scale = EPW_FIELDS[field]
+        columns[name] = _fill_missing(raw[:, j], missing) * scale
+    return times, columns, {"lat": lat, "lon": lon, "utc_offset_h": tz_hours}
+
+def parse_csv(path: str) -> tuple[pd.DatetimeIndex, dict, dict]:
+    """
+    Parse a CSV with a `datetime` column (UTC, or with an offset) and
+    any of COLUMNS; temp, humidity, wind_speed and cloud_cover are
+    required, irradiance is optional.
+    """
+    df = pd.read_csv(path)
+    times = pd.DatetimeIndex(pd.to_datetime(df["datetime"], utc=True))
+    columns = {name: df[name].to_numpy(dtype=float) for name in COLUMNS if name in df.columns}
+    return times, columns, {}
+
+class WeatherFile:
+    def __init__(self, times: np.ndarray, columns: dict, meta: dict):
+        self.times = times               # int64 ns since epoch (UTC), usually a memmap
+        self.columns = columns           # name -> float64 memmap
+        self.meta = meta                 # source, timezone, lat/lon when known
+
+    @staticmethod
+    def cache_path_for(path: str, directory: str = WEATHER_CACHE_DIR) -> str:
+        """Cache folder for a source file, keyed by its path, size and mtime."""
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(directory, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}")
+
+    @classmethod
+    def open(cls, path: str, timezone: str | None = None, lat: float | None = None, lon: float | None = None,
+             directory: str = WEATHER_CACHE_DIR) -> "WeatherFile":
+        """
+        Open a weather file through its cache, parsing it on first use.
+        `timezone` sets the local time of returned frames (EPW files
+        default to their fixed standard-time offset, CSVs to UTC);
+        `lat`/`lon` override or supply the site for solar gain.
+        """
+        folder = cls.cache_path_for(path, directory)
+        if not os.path.exists(os.path.join(folder, "meta.json")):
+            cls._build_cache(path, folder)
+        with open(os.path.join(folder, "meta.json")) as f:
+            meta = json.load(f)
+
+        if timezone is not None:
+            meta["timezone"] = timezone
+        if lat is not None:
+            meta["lat"] = lat
+        if lon is not None:
+            meta["lon"] = lon
+        times = np.load(os.path.join(folder, "time.npy"), mmap_mode="r")
+        columns = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r") for name in meta["columns"]}
+        return cls(times, columns, meta)
+
+    @staticmethod
+    def _build_cache(path: str, folder: str) -> None:
+        is_epw = path.lower().endswith(".epw")
+        times, columns, site = parse_epw(path) if is_epw else parse_csv(path)
+        order = np.argsort(times.asi8, kind="stable")
+
+        meta = {"source": os.path.abspath(path), "columns": list(columns),
+                "timezone": None if "utc_offset_h" in site else "UTC",
+                "utc_offset_h": site.get("utc_offset_h"), "lat": site.get("lat"), "lon": site.get("lon")}
+
+        # build beside the final folder, then rename into place
+        parent = os.path.dirname(folder)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        np.save(os.path.join(tmp, "time.npy"), times.asi8[order])
+        for name, values in columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(values[order], dtype=float))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp, folder)
+        except OSError:              # another process finished first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def timezone(self):
+        """Local time of returned frames: the override, else the file's standard time."""
+        if self.meta.get("timezone"):
+            return self.meta["timezone"]
+        return dt.timezone(dt.timedelta(hours=self.meta.get("utc_offset_h") or 0.0))
+
+    def span(self, start=None, end=None) -> slice:
+        """Row range for start <= time < end (timestamps or strings; naive means UTC)."""
+        def ns(t):
+            t = pd.Timestamp(t)
+            return (t.tz_localize("UTC") if t.tz is None else t).value
+
+        lo = 0 if start is None else int(np.searchsorted(self.times, ns(start), side="left"))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, ns(end), side="left"))
+        return slice(lo, hi)
+
+    def arrays(self, start=None, end=None) -> dict[str, np.ndarray]:
+        """Zero-copy column views for a time range."""
+        rows = self.span(start, end)
+        return {name: values[rows] for name, values in self.columns.items()}
+
+    def index(self, start=None, end=None) -> pd.DatetimeIndex:
+        return self._index(self.span(start, end))
+
+    def _index(self, rows: slice) -> pd.DatetimeIndex:
+        utc = pd.DatetimeIndex(self.times[rows].astype("datetime64[ns]"), tz="UTC")
+        return utc.tz_convert(self.timezone).rename("datetime")
+
+    def weather(self, start=None, end=None) -> pd.DataFrame:
+        """Weather columns over a range, indexed like `get_hourly_weather(...).set_index("datetime")`."""
+        return self._weather(self.span(start, end))
+
+    def _weather(self, rows: slice) -> pd.DataFrame:
+        arrays = {name: values[rows] for name, values in self.columns.items()}
+        return pd.DataFrame(arrays, index=self._index(rows), copy=False)
+
+    def forecast(self, cfg, start=None, end=None, use_table: bool = True) -> pd.DataFrame:
+        """
+        Weather plus solar gain over a range, with the columns of
+        `get_hourly_forecast`. Measured irradiance is used when the file
+        has it; otherwise clear-sky is corrected by cloud cover.
+        """
+        return self._forecast(cfg, self.span(start, end), use_table)
+
+    def _forecast(self, cfg, rows: slice, use_table: bool) -> pd.DataFrame:
+        if self.meta.get("lat") is None or self.meta.get("lon") is None:
+            raise ValueError("Weather file has no site coordinates; pass lat/lon to WeatherFile.open")
+        weather = self._weather(rows)
+        irradiance = None
+        if all(name in weather.columns for name in ("ghi", "dni", "dhi")):
+            irradiance = (weather.pop("ghi"), weather.pop("dni"), weather.pop("dhi"))
+        solar = solar_gain(self.meta["lat"], self.meta["lon"], weather.index, weather["cloud_cover"],
+                           cfg, use_table, irradiance)
+        return weather.join(solar, how="left")
+
+    def chunks(self, cfg, hours: int = 8760, use_table: bool = True) -> Iterator[pd.DataFrame]:
+        """`forecast` frames of `hours` rows each, for `backtest.backtest`."""
+        for lo in range(0, len(self.times), hours):
+            yield self._forecast(cfg, slice(lo, lo + hours), use_table)